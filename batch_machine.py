@@ -0,0 +1,433 @@
+"""
+Many copies of one machine run in lockstep -- for sweeps like the teleporter's, where
+thousands of runs share a program and differ only in a register or two.
+
+Registers, pointers, stacks, input positions and output of every instance are numpy
+arrays.  Each round the running instances are grouped by the address they're on, and
+every group runs its instruction once as a handful of array operations.  Operands are
+still read per instance, so instances whose registers or memory differ come out
+right, and instances that branch apart just make more groups until their pointers
+meet again.
+
+Memory is copy on write by page: every instance starts out on the pages of the
+machine it was copied from, and gets a page of its own the first time it writes to
+it.  Calls to the confirmation routine are answered natively, as they are by Machine.
+Nothing else is -- there are no intrinsics, triggers or hacks in here.
+
+    python batch_machine.py --batch-size 4096      sweep register 8 for the teleporter
+"""
+
+import argparse
+import itertools
+import time
+
+from typing import Callable, List, Optional, Tuple
+
+from calibration import (
+    FAILED,
+    TELEPORTER,
+    HeadlessMachine,
+    attempt,
+    teleporter_snapshot,
+)
+from confirmation import confirmation
+from synacore_challenge import (
+    MEMORY_SIZE,
+    PAGE_COUNT,
+    PAGE_SHIFT,
+    PAGE_SIZE,
+    Machine,
+    Status,
+    create_route,
+    input_code,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Candidates run together by the batched sweep
+DEFAULT_BATCH_SIZE = 4096
+
+# Where each instance is at -- anything not running stopped with a Status
+_RUNNING, _HALTED, _NEEDS_INPUT = range(3)
+_STATUSES = {
+    _RUNNING: Status.BUDGET_EXHAUSTED,
+    _HALTED: Status.HALTED,
+    _NEEDS_INPUT: Status.NEEDS_INPUT,
+}
+
+# Handlers take the instances in a group and the address they're all on
+Handler = Callable[["numpy.ndarray", int], None]
+
+
+class BatchMachine:
+    def __init__(self, machine: Machine, count: int):
+        """count copies of the machine as it stands.  Registers (registers[r] holds
+        register r for every instance) or memory, with poke, can be set per instance
+        before running."""
+        if numpy is None:
+            raise RuntimeError("BatchMachine needs numpy")
+        self.count = count
+
+        # pages[instance, page] is the row of the pool holding that page, and owned
+        # marks the rows an instance may write to without copying them first
+        self.pool = (
+            numpy.frombuffer(machine.stream, dtype=numpy.uint16)
+            .reshape(PAGE_COUNT, PAGE_SIZE)
+            .copy()
+        )
+        self.pool_used = PAGE_COUNT
+        self.pages = numpy.tile(numpy.arange(PAGE_COUNT, dtype=numpy.int64), (count, 1))
+        self.owned = numpy.zeros((count, PAGE_COUNT), dtype=bool)
+        # Per page, how many instances have their own copy -- while none do, a word
+        # is read once for everyone
+        self.page_owners = numpy.zeros(PAGE_COUNT, dtype=numpy.int64)
+
+        # registers[register, instance]
+        self.registers = numpy.tile(
+            numpy.array(machine.register_file, dtype=numpy.int64)[:, None], (1, count)
+        )
+        # Address of the next instruction, i.e. Machine.pointer + 1
+        self.pointers = numpy.full(count, machine.pointer + 1, dtype=numpy.int64)
+
+        depth = len(machine.stack)
+        # stack[depth, instance], like the registers
+        self.stack = numpy.zeros((max(64, 2 * depth), count), dtype=numpy.int64)
+        self.stack[:depth] = numpy.array(machine.stack, dtype=numpy.int64)[:, None]
+        self.depth = numpy.full(count, depth, dtype=numpy.int64)
+
+        # Input is shared, but each instance reads it at its own pace
+        self.input = numpy.array(
+            [input_code(character) for character in machine.character_input],
+            dtype=numpy.int64,
+        )
+        self.read = numpy.zeros(count, dtype=numpy.int64)
+
+        self.output = numpy.zeros((256, count), dtype=numpy.uint16)
+        self.written = numpy.zeros(count, dtype=numpy.int64)
+
+        self.status = numpy.full(count, _RUNNING, dtype=numpy.int8)
+        self.exit_codes = numpy.zeros(count, dtype=numpy.int64)
+        # Rounds run so far -- every running instance runs one instruction a round
+        self.rounds = 0
+
+        self.confirmation_routine = machine.confirmation_routine
+        self.handlers = self.build_handlers()
+
+    def build_handlers(self) -> List[Handler]:
+        """One handler per op_code, mirroring Machine.build_handlers."""
+        registers = self.registers
+        pointers = self.pointers
+        register = self.register
+        operand = self.operand
+
+        def halt(members, address):
+            self.stop(members, _HALTED, 0)
+
+        def set_(members, address):
+            registers[register(members, address + 1), members] = operand(
+                members, address + 2
+            )
+            pointers[members] = address + 3
+
+        def push(members, address):
+            self.push(members, operand(members, address + 1))
+            pointers[members] = address + 2
+
+        def pop(members, address):
+            empty = self.depth[members] == 0
+            if empty.any():
+                self.stop(members[empty], _HALTED, 1)
+                members = members[~empty]
+            registers[register(members, address + 1), members] = self.pop(members)
+            pointers[members] = address + 2
+
+        def binary(function):
+            def handler(members, address):
+                a = register(members, address + 1)
+                b = operand(members, address + 2)
+                c = operand(members, address + 3)
+                registers[a, members] = function(b, c)
+                pointers[members] = address + 4
+
+            return handler
+
+        def not_(members, address):
+            a = register(members, address + 1)
+            registers[a, members] = ~operand(members, address + 2) & 0x7FFF
+            pointers[members] = address + 3
+
+        def jmp(members, address):
+            pointers[members] = operand(members, address + 1)
+
+        def jt(members, address):
+            a = operand(members, address + 1)
+            b = operand(members, address + 2)
+            pointers[members] = numpy.where(a != 0, b, address + 3)
+
+        def jf(members, address):
+            a = operand(members, address + 1)
+            b = operand(members, address + 2)
+            pointers[members] = numpy.where(a == 0, b, address + 3)
+
+        def rmem(members, address):
+            a = register(members, address + 1)
+            registers[a, members] = self.peek(members, operand(members, address + 2))
+            pointers[members] = address + 3
+
+        def wmem(members, address):
+            a = operand(members, address + 1)
+            self.poke(members, a, operand(members, address + 2))
+            pointers[members] = address + 3
+
+        def call(members, address):
+            target = numpy.broadcast_to(operand(members, address + 1), members.shape)
+            pointers[members] = address + 2
+            if self.confirmation_routine is not None:
+                native = target == self.confirmation_routine
+                if native.any():
+                    self.confirm(members[native])
+                    members, target = members[~native], target[~native]
+            self.push(members, numpy.full(len(members), address + 2))
+            pointers[members] = target
+
+        def ret(members, address):
+            empty = self.depth[members] == 0
+            if empty.any():
+                self.stop(members[empty], _HALTED, 1)
+                members = members[~empty]
+            pointers[members] = self.pop(members)
+
+        def out(members, address):
+            written = self.written[members]
+            if written.max() >= len(self.output):
+                self.output = numpy.concatenate(
+                    [self.output, numpy.zeros_like(self.output)]
+                )
+            self.output[written, members] = operand(members, address + 1)
+            self.written[members] = written + 1
+            pointers[members] = address + 2
+
+        def in_(members, address):
+            read = self.read[members]
+            waiting = read >= len(self.input)
+            if waiting.any():
+                # Stays on this op_code, to read once fed
+                self.stop(members[waiting], _NEEDS_INPUT, 0)
+                members, read = members[~waiting], read[~waiting]
+            registers[register(members, address + 1), members] = self.input[read]
+            self.read[members] = read + 1
+            pointers[members] = address + 2
+
+        def noop(members, address):
+            pointers[members] = address + 1
+
+        return [
+            halt,
+            set_,
+            push,
+            pop,
+            binary(lambda b, c: b == c),
+            binary(lambda b, c: b > c),
+            jmp,
+            jt,
+            jf,
+            binary(lambda b, c: (b + c) & 0x7FFF),
+            binary(lambda b, c: (b * c) & 0x7FFF),
+            binary(lambda b, c: b % c),
+            binary(lambda b, c: b & c),
+            binary(lambda b, c: b | c),
+            not_,
+            rmem,
+            wmem,
+            call,
+            ret,
+            out,
+            in_,
+            noop,
+        ]
+
+    def peek(self, members: "numpy.ndarray", addresses):
+        """The word at addresses (one for all, or one each) in each member's memory
+        -- just an int when it's the same for all of them."""
+        if isinstance(addresses, int) and not self.page_owners[addresses >> PAGE_SHIFT]:
+            return int(self.pool[addresses >> PAGE_SHIFT, addresses & (PAGE_SIZE - 1)])
+        rows = self.pages[members, addresses >> PAGE_SHIFT]
+        return self.pool[rows, addresses & (PAGE_SIZE - 1)].astype(numpy.int64)
+
+    def poke(self, members: "numpy.ndarray", addresses, values):
+        pages = numpy.broadcast_to(addresses >> PAGE_SHIFT, members.shape)
+        shared = ~self.owned[members, pages]
+        if shared.any():
+            self.copy_pages(members[shared], pages[shared])
+        self.pool[self.pages[members, pages], addresses & (PAGE_SIZE - 1)] = values
+
+    def copy_pages(self, members: "numpy.ndarray", pages: "numpy.ndarray"):
+        """Give each member a page of its own to write to."""
+        needed = self.pool_used + len(members)
+        if needed > len(self.pool):
+            size = max(needed, 2 * len(self.pool))
+            grown = numpy.zeros((size, PAGE_SIZE), dtype=numpy.uint16)
+            grown[: self.pool_used] = self.pool[: self.pool_used]
+            self.pool = grown
+        rows = numpy.arange(self.pool_used, needed)
+        self.pool[rows] = self.pool[self.pages[members, pages]]
+        self.pages[members, pages] = rows
+        self.owned[members, pages] = True
+        self.page_owners += numpy.bincount(pages, minlength=PAGE_COUNT)
+        self.pool_used = needed
+
+    def register(self, members: "numpy.ndarray", address: int):
+        """The register each member's word at address names."""
+        return self.peek(members, address) - MEMORY_SIZE
+
+    def operand(self, members: "numpy.ndarray", address: int):
+        """Each member's word at address, read from its register if it names one."""
+        words = self.peek(members, address)
+        if isinstance(words, int):
+            if words < MEMORY_SIZE:
+                return words
+            return self.registers[words - MEMORY_SIZE, members]
+        named = words >= MEMORY_SIZE
+        if not named.any():
+            return words
+        return numpy.where(named, self.registers[words & 7, members], words)
+
+    def push(self, members: "numpy.ndarray", values: "numpy.ndarray"):
+        depth = self.depth[members]
+        if len(depth) and depth.max() >= len(self.stack):
+            self.stack = numpy.concatenate([self.stack, numpy.zeros_like(self.stack)])
+        self.stack[depth, members] = values
+        self.depth[members] = depth + 1
+
+    def pop(self, members: "numpy.ndarray") -> "numpy.ndarray":
+        depth = self.depth[members] - 1
+        self.depth[members] = depth
+        return self.stack[depth, members]
+
+    def confirm(self, members: "numpy.ndarray"):
+        """Machine.confirm for each member."""
+        for member in members.tolist():
+            r0, r1, r7 = self.registers[[0, 1, 7], member].tolist()
+            result = confirmation(r0, r1, r7)
+            self.registers[0, member] = result
+            self.registers[1, member] = (result - 1) % MEMORY_SIZE
+
+    def stop(self, members: "numpy.ndarray", status: int, exit_code: int):
+        self.status[members] = status
+        self.exit_codes[members] = exit_code
+
+    def feed(self, text: str):
+        """More input for every instance, waking up those waiting on it."""
+        codes = numpy.array([input_code(character) for character in text], numpy.int64)
+        self.input = numpy.concatenate([self.input, codes])
+        self.status[self.status == _NEEDS_INPUT] = _RUNNING
+
+    def groups(self, running: "numpy.ndarray") -> List[Tuple[int, "numpy.ndarray"]]:
+        """The running instances by the address they're on."""
+        addresses = self.pointers[running]
+        first = addresses[0]
+        if (addresses == first).all():
+            return [(int(first), running)]
+
+        order = numpy.argsort(addresses, kind="stable")
+        addresses = addresses[order]
+        splits = numpy.flatnonzero(addresses[1:] != addresses[:-1]) + 1
+        return [
+            (int(addresses[start]), members)
+            for start, members in zip(
+                itertools.chain([0], splits.tolist()),
+                numpy.split(running[order], splits),
+            )
+        ]
+
+    def run(self, max_steps: Optional[int] = None) -> List[Status]:
+        """Run until every instance has halted or wants input it doesn't have, or for
+        max_steps rounds -- calling again carries on from there."""
+        handlers = self.handlers
+        rounds = 0
+        while max_steps is None or rounds < max_steps:
+            running = numpy.flatnonzero(self.status == _RUNNING)
+            if not running.size:
+                break
+            rounds += 1
+            for address, members in self.groups(running):
+                op_codes = self.peek(members, address)
+                if isinstance(op_codes, int):
+                    handlers[op_codes](members, address)
+                    continue
+                # The code itself differs between members
+                for op_code in numpy.unique(op_codes):
+                    handlers[op_code](members[op_codes == op_code], address)
+        self.rounds += rounds
+        return self.statuses()
+
+    def statuses(self) -> List[Status]:
+        return [_STATUSES[status] for status in self.status.tolist()]
+
+    def output_text(self, index: int) -> str:
+        """Everything instance index has printed."""
+        return "".join(map(chr, self.output[: self.written[index], index].tolist()))
+
+
+def sweep_teleporter_batched(
+    file: str,
+    route: str,
+    start: int = 1,
+    stop: int = 32768,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Optional[int]:
+    """As calibration.sweep_teleporter, but running batch_size register 8 candidates
+    at a time in lockstep on one core -- or one at a time without numpy."""
+    snapshot = teleporter_snapshot(file, route)
+    machine = HeadlessMachine(file, [])
+    if numpy is None:
+        for candidate in range(start, stop):
+            if attempt(machine, snapshot, candidate):
+                return candidate
+        return None
+
+    machine.restore(snapshot)
+    for low in range(start, stop, batch_size):
+        candidates = numpy.arange(low, min(low + batch_size, stop))
+        batch = BatchMachine(machine, len(candidates))
+        batch.registers[7] = candidates
+        batch.feed(TELEPORTER)
+        for index, status in enumerate(batch.run()):
+            if status is Status.NEEDS_INPUT and FAILED not in batch.output_text(index):
+                return int(candidates[index])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep the teleporter's register 8 with machines run in lockstep"
+    )
+    parser.add_argument(
+        "--file", default="data/synacor-challenge/challenge.bin", help="binary to run"
+    )
+    parser.add_argument("--start", type=int, default=1)
+    parser.add_argument("--stop", type=int, default=32768)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="candidates run together",
+    )
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    found = sweep_teleporter_batched(
+        args.file, create_route(), args.start, args.stop, args.batch_size
+    )
+    elapsed = time.perf_counter() - began
+    if found is None:
+        print(f"No register 8 value passed, {elapsed:.2f}s")
+    else:
+        print(f"Register 8: {found}, {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
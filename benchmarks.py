@@ -0,0 +1,329 @@
+"""
+Repeatable timings for the machine: replaying the route headless, tight synthetic
+programs, loading the binary, snapshot/restore and the vault search.
+
+    python benchmarks.py [--repeat 5] [--engines decoded classic] [--output JSON]
+
+Every run is appended to the JSON file together with the python and platform it ran
+on, and each timing is compared against the previous run's so regressions stand out.
+Timings are the best of 'repeat' runs.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence
+
+from confirmation import solve_calibration
+from output_sinks import NullSink
+from synacore_challenge import (
+    ENGINES,
+    PAGE_SHIFT,
+    Machine,
+    NeedsInput,
+    create_route,
+)
+from tracing import Tracer
+from vault_info import Cave, LocValue, bfs
+
+CHALLENGE = os.path.join("data", "synacor-challenge", "challenge.bin")
+RESULTS = "benchmarks.json"
+
+# The pointer starts out on address 0 and executes from address 1, so every synthetic
+# program leads with a noop.
+R0, R1, R2, R3 = 32768, 32769, 32770, 32771
+# fmt: off
+PROGRAMS: Dict[str, List[int]] = {
+    # The arch-spec sample (add r0 = r1 + 4, out r0) counted round 30000 times
+    "arch_spec_loop": [
+        21,
+        9, R0, R1, 4,
+        19, R0,
+        9, R2, R2, 1,
+        4, R3, R2, 30000,
+        8, R3, 1,
+        0,
+    ],
+    # wmem/rmem over a 4K buffer at 0x4000, touching 16 pages per lap
+    "memory_loop": [
+        21,
+        9, R0, R2, 0x4000,
+        16, R0, R2,
+        15, R1, R0,
+        9, R2, R2, 1,
+        12, R2, R2, 0xFFF,
+        9, R3, R3, 1,
+        4, R1, R3, 30000,
+        8, R1, 1,
+        0,
+    ],
+    # call/ret into a subroutine pushing and popping a register
+    "call_loop": [
+        21,
+        17, 15,
+        9, R2, R2, 1,
+        4, R3, R2, 30000,
+        8, R3, 1,
+        0,
+        2, R2,
+        3, R0,
+        18,
+    ],
+}
+# fmt: on
+
+
+class RouteMachine(Machine):
+    """Plays a route with the hacks in place, then stops instead of prompting."""
+
+    def __init__(self, file: str, route: str, override: int, engine: str):
+        super().__init__(
+            file,
+            list(route),
+            override,
+            engine=engine,
+            output=NullSink(),
+            read_line=None,
+        )
+
+    def play(self):
+        # process_stream rather than run, so the classic engine is measured too
+        try:
+            self.process_stream()
+        except (NeedsInput, SystemExit):
+            pass
+
+
+class Counter(Tracer):
+    def __init__(self):
+        self.instructions = 0
+
+    def record(self, address, op_code, operands, deltas):
+        self.instructions += 1
+
+
+def best_of(repeat: int, setup: Callable[[], object], run: Callable[[object], None]):
+    """Fastest of 'repeat' runs, leaving setup out of the timing."""
+    best = float("inf")
+    for _ in range(repeat):
+        subject = setup()
+        start = time.perf_counter()
+        run(subject)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def count_instructions(machine: RouteMachine) -> int:
+    # Traced runs are slower, so the count is taken once rather than timed
+    machine.tracer = counter = Counter()
+    machine.play()
+    return counter.instructions
+
+
+def throughput(seconds: float, instructions: int) -> Dict:
+    return {
+        "seconds": seconds,
+        "instructions": instructions,
+        "instructions_per_second": instructions / seconds if seconds else 0.0,
+    }
+
+
+def bench_route(file: str, route: str, engines: Sequence[str], repeat: int) -> Dict:
+    override = solve_calibration()
+    instructions = count_instructions(RouteMachine(file, route, override, "decoded"))
+    return {
+        f"route/{engine}": throughput(
+            best_of(
+                repeat,
+                lambda: RouteMachine(file, route, override, engine),
+                RouteMachine.play,
+            ),
+            instructions,
+        )
+        for engine in engines
+    }
+
+
+def bench_programs(engines: Sequence[str], repeat: int) -> Dict:
+    results = dict()
+    directory = tempfile.mkdtemp()
+    try:
+        for name, words in PROGRAMS.items():
+            file = os.path.join(directory, f"{name}.bin")
+            with open(file, "wb") as f:
+                program = array("H", words)
+                if sys.byteorder == "big":
+                    program.byteswap()
+                program.tofile(f)
+
+            instructions = count_instructions(RouteMachine(file, "", 0, "decoded"))
+            for engine in engines:
+                results[f"{name}/{engine}"] = throughput(
+                    best_of(
+                        repeat,
+                        lambda: RouteMachine(file, "", 0, engine),
+                        RouteMachine.play,
+                    ),
+                    instructions,
+                )
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def bench_load(file: str, repeat: int) -> Dict:
+    directory = tempfile.mkdtemp()
+    try:
+        # Warm the image cache so the cached timing only reads it back
+        Machine.get_data_stream(file, directory)
+        return {
+            "load/uncached": {
+                "seconds": best_of(repeat, lambda: file, Machine.get_data_stream)
+            },
+            "load/cached": {
+                "seconds": best_of(
+                    repeat,
+                    lambda: file,
+                    lambda f: Machine.get_data_stream(f, directory),
+                )
+            },
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_snapshots(file: str, route: str, repeat: int, laps: int = 1000) -> Dict:
+    """Per operation cost of snapshot/restore on a machine at the end of the route."""
+    machine = RouteMachine(file, route, solve_calibration(), "decoded")
+    boot = machine.snapshot()
+    machine.play()
+    finished = machine.snapshot()
+
+    def dirty_one_page():
+        address = 0x4000
+        machine.stream[address] = machine.stream[address]
+        machine.dirty_pages[address >> PAGE_SHIFT] = 1
+
+    def snapshots(_):
+        for _ in range(laps):
+            dirty_one_page()
+            machine.snapshot()
+
+    def restores(_):
+        for _ in range(laps):
+            dirty_one_page()
+            machine.restore(finished)
+
+    def far_restores(_):
+        # Every page the route changed gets copied back, in both directions
+        for _ in range(laps // 2):
+            machine.restore(boot)
+            machine.restore(finished)
+
+    return {
+        name: {"seconds": best_of(repeat, lambda: None, run) / laps}
+        for name, run in (
+            ("snapshot", snapshots),
+            ("restore", restores),
+            ("restore_far", far_restores),
+        )
+    }
+
+
+def bench_vault(repeat: int) -> Dict:
+    def solve(_):
+        start = LocValue(pos=(3, 0), value=22, operator="", direction="", last_pos=None)
+        result = bfs(
+            initial=Cave(start), goal_test=Cave.goal_test, successors=Cave.successors
+        )
+        if result is None:
+            raise RuntimeError("The vault search found no path")
+
+    return {"vault_bfs": {"seconds": best_of(repeat, lambda: None, solve)}}
+
+
+def run_benchmarks(
+    file: str = CHALLENGE,
+    engines: Sequence[str] = ("decoded",),
+    repeat: int = 5,
+) -> Dict:
+    route = create_route()
+    results = dict()
+    results.update(bench_route(file, route, engines, repeat))
+    results.update(bench_programs(engines, repeat))
+    results.update(bench_load(file, repeat))
+    results.update(bench_snapshots(file, route, repeat))
+    results.update(bench_vault(repeat))
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def load_runs(file: str) -> List[Dict]:
+    if not os.path.exists(file):
+        return list()
+    with open(file, "rt") as f:
+        return json.load(f)
+
+
+def save_run(file: str, run: Dict):
+    runs = load_runs(file)
+    runs.append(run)
+    with open(file + ".tmp", "wt") as f:
+        json.dump(runs, f, indent=2)
+    os.replace(file + ".tmp", file)
+
+
+def table(run: Dict, previous: Optional[Dict] = None) -> str:
+    before = previous["results"] if previous else dict()
+    lines = [f"{'benchmark':<24} {'seconds':>12} {'instr/s':>12} {'change':>8}"]
+    for name, result in run["results"].items():
+        seconds = result["seconds"]
+        rate = result.get("instructions_per_second")
+        line = f"{name:<24} {seconds:>12.6f} {f'{rate:.0f}' if rate else '':>12}"
+        if name in before and before[name]["seconds"]:
+            # Positive means slower than last time
+            change = 100 * (seconds / before[name]["seconds"] - 1)
+            line += f" {change:>+7.1f}%"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Synacor machine")
+    parser.add_argument("--file", default=CHALLENGE, help="challenge binary")
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=ENGINES,
+        default=["decoded"],
+        help="engines to time the route and synthetic programs on",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark")
+    parser.add_argument(
+        "--output",
+        metavar="JSON",
+        default=RESULTS,
+        help="file the run is appended to and compared against",
+    )
+    args = parser.parse_args()
+
+    runs = load_runs(args.output)
+    run = run_benchmarks(args.file, args.engines, args.repeat)
+    print(table(run, runs[-1] if runs else None))
+    save_run(args.output, run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Compiles hot basic blocks of the program into Python functions.
+
+A block runs straight through from its start address up to and including the first
+jmp/jt/jf/call/ret, with every operand already resolved: a literal becomes a
+constant and a register becomes registers[index].  Blocks stop short of halt, out
+and in -- those call back into the machine, so the decoded engine runs them instead.
+
+Each block returns the address of the next instruction.  The program decrypts
+itself, so any write into the words a block was compiled from throws the block away,
+and a block writing into itself leaves straight after the write.  For the same reason
+blocks are translated from live memory rather than looked up in a disassembly (see
+disassembler.py), which only describes the image it was taken from.
+"""
+
+from typing import Callable, Dict, List, Optional
+
+from op_codes import MEMORY_SIZE, MODULO, OPERANDS, PAGE_SHIFT, REGISTER_COUNT
+from peephole import LOOKBACK
+
+Block = Callable[[], int]
+
+# Executions of an address, through the decoded engine, before a block is compiled
+HOT_THRESHOLD = 16
+
+# Keeps generated functions (and the time spent compiling them) in check
+MAX_BLOCK_INSTRUCTIONS = 64
+
+# Left to the decoded engine
+_EXCLUDED = {0, 19, 20}
+
+_JUMPS = {6, 7, 8, 17, 18}
+
+_ARITHMETIC = {
+    4: "1 if {b} == {c} else 0",
+    5: "1 if {b} > {c} else 0",
+    9: f"({{b}} + {{c}}) % {MODULO}",
+    10: f"({{b}} * {{c}}) % {MODULO}",
+    11: f"({{b}} % {{c}}) % {MODULO}",
+    12: "{b} & {c}",
+    13: "{b} | {c}",
+}
+
+
+class BlockCompiler:
+    def __init__(self, machine):
+        self.machine = machine
+        self.blocks: List[Optional[Block]] = [None] * MEMORY_SIZE
+        self.hits: List[int] = [0] * MEMORY_SIZE
+        # The end of each compiled block by its start, and for every address the
+        # starts of the blocks compiled from it.
+        self.ends: Dict[int, int] = dict()
+        self.owners: List[Optional[List[int]]] = [None] * MEMORY_SIZE
+        self.namespace: Optional[Dict] = None
+
+    def build_namespace(self) -> Dict:
+        """What generated code can see.  The machine's containers are only ever
+        mutated in place, so binding them once is enough."""
+        machine = self.machine
+        return {
+            "registers": machine.register_file,
+            "stack": machine.stack,
+            "stream": machine.stream,
+            "code": machine.code,
+            "dirty_pages": machine.dirty_pages,
+            "owners": self.owners,
+            "invalidate_address": self.invalidate_address,
+            "confirm": machine.confirm,
+            "natives": machine.intrinsics.natives,
+            "call_intrinsic": machine.call_intrinsic,
+            "ret": machine.handlers[18],
+        }
+
+    def compile(self, start: int) -> Optional[Block]:
+        """Compile the block at start, or None if it opens with an instruction left
+        to the decoded engine -- as is everything while watchpoints are set."""
+        if self.machine.watchpoints.active:
+            return None
+        lines, end = self.translate(start)
+        if not lines:
+            return None
+
+        if self.namespace is None:
+            self.namespace = self.build_namespace()
+
+        source = f"def block_{start}():\n" + "".join(f"    {line}\n" for line in lines)
+        namespace = dict(self.namespace)
+        exec(compile(source, f"<block {start}>", "exec"), namespace)
+        block = namespace[f"block_{start}"]
+
+        self.blocks[start] = block
+        self.ends[start] = end
+        for address in range(start, end):
+            if self.owners[address] is None:
+                self.owners[address] = [start]
+            else:
+                self.owners[address].append(start)
+        return block
+
+    def instructions(self, start: int) -> List[int]:
+        """Addresses of the instructions making up the block at start."""
+        stream = self.machine.stream
+        addresses: List[int] = list()
+        pointer = start
+        while len(addresses) < MAX_BLOCK_INSTRUCTIONS:
+            op_code = stream[pointer]
+            if op_code in _EXCLUDED or op_code not in OPERANDS:
+                break
+            following = pointer + 1 + len(OPERANDS[op_code])
+            if following > MEMORY_SIZE or not self.registers_valid(pointer):
+                break
+            addresses.append(pointer)
+            if op_code in _JUMPS:
+                break
+            pointer = following
+        return addresses
+
+    def registers_valid(self, pointer: int) -> bool:
+        """Whether every register written by the instruction at pointer is one --
+        anything else is left to the decoded engine to reject."""
+        stream = self.machine.stream
+        return all(
+            MEMORY_SIZE <= stream[pointer + offset] < MEMORY_SIZE + REGISTER_COUNT
+            for offset, kind in enumerate(OPERANDS[stream[pointer]], start=1)
+            if kind == "r"
+        )
+
+    def translate(self, start: int):
+        """Python source lines for the block at start, and the address it ends at."""
+        stream = self.machine.stream
+        confirmation_routine = self.machine.confirmation_routine
+        lines: List[str] = list()
+
+        addresses = self.instructions(start)
+        if not addresses:
+            return lines, start
+        last = addresses[-1]
+        end = last + 1 + len(OPERANDS[stream[last]])
+
+        for pointer in addresses:
+            op_code = stream[pointer]
+            kinds = OPERANDS[op_code]
+            words = stream[pointer + 1 : pointer + 1 + len(kinds)]
+            # A write register is a bare index, a value is an expression
+            operands = [
+                (
+                    str(word - 32768)
+                    if kind == "r"
+                    else (f"registers[{word - 32768}]" if word >= 32768 else str(word))
+                )
+                for kind, word in zip(kinds, words)
+            ]
+            following = pointer + 1 + len(kinds)
+
+            if op_code == 1:
+                lines.append(f"registers[{operands[0]}] = {operands[1]}")
+            elif op_code == 2:
+                lines.append(f"stack.append({operands[0]})")
+            elif op_code == 3:
+                lines.append(f"registers[{operands[0]}] = stack.pop()")
+            elif op_code in _ARITHMETIC:
+                a, b, c = operands
+                expression = _ARITHMETIC[op_code].format(b=b, c=c)
+                lines.append(f"registers[{a}] = {expression}")
+            elif op_code == 14:
+                lines.append(f"registers[{operands[0]}] = ~{operands[1]} & 0x7FFF")
+            elif op_code == 15:
+                lines.append(f"registers[{operands[0]}] = stream[{operands[1]}]")
+            elif op_code == 16:
+                lines += [
+                    f"address = {operands[0]}",
+                    f"stream[address] = {operands[1]}",
+                    f"dirty_pages[address >> {PAGE_SHIFT}] = 1",
+                    f"start = max(0, address - {LOOKBACK})",
+                    "code[start : address + 1] = [None] * (address + 1 - start)",
+                    "if owners[address]:",
+                    "    invalidate_address(address)",
+                    f"    if {start} <= address < {end}:",
+                    f"        return {following}",
+                ]
+            elif op_code == 6:
+                lines.append(f"return {operands[0]}")
+            elif op_code == 7:
+                lines += [f"if {operands[0]}:", f"    return {operands[1]}"]
+            elif op_code == 8:
+                lines += [f"if not {operands[0]}:", f"    return {operands[1]}"]
+            elif op_code == 17:
+                lines.append(f"target = {operands[0]}")
+                if confirmation_routine is not None:
+                    lines += [
+                        f"if target == {confirmation_routine}:",
+                        "    confirm()",
+                        f"    return {following}",
+                    ]
+                lines += [
+                    "if target in natives:",
+                    f"    following = call_intrinsic(target, {following})",
+                    "    if following is not None:",
+                    "        return following",
+                ]
+                lines += [f"stack.append({following})", "return target"]
+            elif op_code == 18:
+                lines += ["if stack:", "    return stack.pop()", "return ret(None)"]
+
+        if stream[last] not in (6, 17, 18):
+            # Fell off the end, or a jt/jf that wasn't taken
+            lines.append(f"return {end}")
+        return lines, end
+
+    def invalidate_address(self, address: int):
+        for start in list(self.owners[address] or ()):
+            self.invalidate_block(start)
+
+    def invalidate(self, start: int, stop: int):
+        """Throw away every block compiled from memory in [start, stop)."""
+        if not self.ends:
+            return
+        owners = self.owners
+        for address in range(start, stop):
+            if owners[address]:
+                self.invalidate_address(address)
+
+    def invalidate_block(self, start: int):
+        for address in range(start, self.ends.pop(start)):
+            owners = self.owners[address]
+            owners.remove(start)
+            if not owners:
+                self.owners[address] = None
+        self.blocks[start] = None
+        # Warm back up before recompiling -- the code there may well change again
+        self.hits[start] = 0
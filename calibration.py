@@ -0,0 +1,111 @@
+"""
+Teleporter calibration -- rather than restoring the world and trying the next register 8
+value one at a time, take a snapshot right before 'use teleporter' and hand disjoint
+ranges of candidates out to a pool of processes.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Event
+from typing import Optional
+
+from output_sinks import CollectorSink
+from synacore_challenge import Machine, Snapshot, Status
+
+TELEPORTER = "use teleporter\n"
+
+# Printed when the machine verified the teleporter setting and it didn't pass
+FAILED = "Nothing else seems to happen."
+
+
+class HeadlessMachine(Machine):
+    """Collects output instead of printing it, and stops instead of prompting."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, output=CollectorSink(), read_line=None, **kwargs)
+
+    def write_character(self, value: int):
+        # Straight to the collector -- no teleporter hacks in here
+        self.output.write(chr(value))
+
+    def run_route(self, route: str) -> Status:
+        self.character_input = deque(route)
+        return self.run()
+
+
+def teleporter_snapshot(file: str, route: str) -> Snapshot:
+    """Play the route up to the prompt where the teleporter gets used."""
+    index = route.find(TELEPORTER)
+    if index == -1:
+        raise ValueError(f"Route never uses the teleporter: '{TELEPORTER.strip()}'")
+
+    machine = HeadlessMachine(file, [])
+    machine.run_route(route[:index])
+    return machine.snapshot()
+
+
+# Per process state set up by _init_worker
+_machine: Optional[HeadlessMachine] = None
+_snapshot: Optional[Snapshot] = None
+_found = None
+
+
+def _init_worker(file: str, snapshot: Snapshot, found):
+    global _machine, _snapshot, _found
+    _machine = HeadlessMachine(file, [])
+    _snapshot = snapshot
+    _found = found
+
+
+def attempt(machine: HeadlessMachine, snapshot: Snapshot, candidate: int) -> bool:
+    """Use the teleporter with register 8 set to the candidate and see if it passes."""
+    machine.restore(snapshot)
+    machine.output.clear()
+    machine.override = candidate
+    if machine.run_route(TELEPORTER) is Status.HALTED:
+        return False
+    return FAILED not in machine.output.getvalue()
+
+
+def _sweep_range(start: int, stop: int) -> Optional[int]:
+    for candidate in range(start, stop):
+        # Another worker already has an answer
+        if _found.is_set():
+            return None
+        if attempt(_machine, _snapshot, candidate):
+            _found.set()
+            return candidate
+    return None
+
+
+def sweep_teleporter(
+    file: str,
+    route: str,
+    start: int = 1,
+    stop: int = 32768,
+    workers: Optional[int] = None,
+    chunk_size: int = 256,
+) -> Optional[int]:
+    """Spread the register 8 candidates in [start, stop) across a process pool and
+    return the first one found that passes verification, or None."""
+    snapshot = teleporter_snapshot(file, route)
+    found = Event()
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(file, snapshot, found)
+    ) as pool:
+        futures = [
+            pool.submit(_sweep_range, lo, min(lo + chunk_size, stop))
+            for lo in range(start, stop, chunk_size)
+        ]
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                if result is not None:
+                    return result
+        finally:
+            # Anything not started yet is dropped, running ranges stop on 'found'
+            found.set()
+            for future in futures:
+                future.cancel()
+
+    return None
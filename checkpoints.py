@@ -0,0 +1,129 @@
+"""
+Checkpoint files -- the whole machine as it stands, so a run can pick up where an
+earlier one left off instead of replaying the route from address 0.
+
+    0       header          see HEADER, little endian
+    4096    memory          32768 raw 16 bit little endian words
+    69632   stack           16 bit words, bottom first
+    ...     input           pending input, utf-8
+
+The memory section sits on a page boundary so it can be mapped and copied straight
+into the machine's memory in one go, with no decoding.  The header carries the
+format version and the sha256 of the binary the checkpoint was taken from, and a
+checkpoint not matching both is refused.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+from array import array
+from collections import deque
+
+from synacore_challenge import MEMORY_SIZE, PAGE_COUNT, REGISTER_COUNT, Machine
+
+MAGIC = b"SYNACKPT"
+
+# Bumped whenever the layout changes
+CHECKPOINT_VERSION = 1
+
+# magic, version, binary sha256, registers, pointer, override, at_line_start,
+# output_state, stack words, input bytes
+HEADER = struct.Struct(f"<8sH32s{2 * REGISTER_COUNT}siiB3xIII")
+
+MEMORY_OFFSET = 4096
+STACK_OFFSET = MEMORY_OFFSET + 2 * MEMORY_SIZE
+
+
+class StaleCheckpoint(ValueError):
+    """The checkpoint is from another binary, or another version of the format."""
+
+
+def binary_hash(file: str) -> bytes:
+    with open(file, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def _little_endian(words: array) -> bytes:
+    if sys.byteorder == "big":
+        words = array("H", words)
+        words.byteswap()
+    return words.tobytes()
+
+
+def save_checkpoint(machine: Machine, path: str, binary: str):
+    """Write the machine out, binary being the file it was loaded from."""
+    stack = array("H", machine.stack)
+    pending = "".join(machine.character_input).encode("utf-8")
+    header = HEADER.pack(
+        MAGIC,
+        CHECKPOINT_VERSION,
+        binary_hash(binary),
+        _little_endian(machine.register_file),
+        machine.pointer,
+        machine.override,
+        machine.at_line_start,
+        machine.triggers.state,
+        len(stack),
+        len(pending),
+    )
+
+    with open(path + ".tmp", "wb") as f:
+        f.write(header.ljust(MEMORY_OFFSET, b"\x00"))
+        f.write(_little_endian(machine.stream))
+        f.write(_little_endian(stack))
+        f.write(pending)
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(machine: Machine, path: str, binary: str):
+    """Put the machine, built from binary, back to the state in the checkpoint."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        if len(m) < STACK_OFFSET or m[: len(MAGIC)] != MAGIC:
+            raise StaleCheckpoint(f"{path} isn't a checkpoint")
+        (
+            _,
+            version,
+            digest,
+            registers,
+            pointer,
+            override,
+            at_line_start,
+            output_state,
+            stack_words,
+            input_bytes,
+        ) = HEADER.unpack_from(m)
+        if version != CHECKPOINT_VERSION:
+            raise StaleCheckpoint(
+                f"{path} is version {version}, expected {CHECKPOINT_VERSION}"
+            )
+        if digest != binary_hash(binary):
+            raise StaleCheckpoint(f"{path} was taken from another binary than {binary}")
+
+        # The raw section is the machine's memory as is -- one copy, no decoding
+        with memoryview(machine.stream) as words, words.cast("B") as memory:
+            memory[:] = m[MEMORY_OFFSET:STACK_OFFSET]
+        stack = array("H", m[STACK_OFFSET : STACK_OFFSET + 2 * stack_words])
+        start = STACK_OFFSET + 2 * stack_words
+        pending = m[start : start + input_bytes].decode("utf-8")
+
+    machine.register_file[:] = array("H", registers)
+    if sys.byteorder == "big":
+        machine.stream.byteswap()
+        machine.register_file.byteswap()
+        stack.byteswap()
+
+    # Everything decoded or compiled from the old memory is gone, and the next
+    # snapshot has to copy every page.
+    machine.invalidate_code()
+    machine.base_pages = None
+    machine.dirty_pages[:] = b"\x01" * PAGE_COUNT
+    machine.restore_point = None
+
+    machine.stack[:] = stack
+    machine.pointer = pointer
+    machine.override = override
+    machine.character_input = deque(pending)
+    machine.at_line_start = bool(at_line_start)
+    machine.triggers.state = output_state
@@ -0,0 +1,221 @@
+"""
+The monument's coin puzzle, for however many slots its equation has.
+
+    _ + _ * _^2 + _^3 - _ = 399
+
+Each coin is worth what is on one side of it -- a number of dots or a shape with that
+many sides -- read with 'look <coin>'.  Every way of putting the coins in the slots
+is tried: with numpy as tables of permutations, built and evaluated as array
+operations in chunks of at most BATCH_SIZE rows, and one permutation at a time
+without it.  The answer comes back as the 'use ... coin' commands that place them.
+
+    python coins.py             the commands for the coins carried by data/route.txt
+"""
+
+import argparse
+import itertools
+import math
+import re
+
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from confirmation import solve_calibration
+from explorer import INVENTORY, ExplorerMachine, listed, play
+from synacore_challenge import create_route
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Permutations evaluated per array operation
+BATCH_SIZE = 1 << 16
+
+NUMBERS = {
+    word: value
+    for value, word in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve".split()
+    )
+}
+SHAPES = {
+    "triangle": 3,
+    "square": 4,
+    "pentagon": 5,
+    "hexagon": 6,
+    "heptagon": 7,
+    "octagon": 8,
+}
+
+MARKING = re.compile(r"It has (?:(\w+) dots?|an? (\w+)) on one side")
+EQUATION = re.compile(r"^([_\d +\-*^]*_[_\d +\-*^]*)=\s*(\d+)\s*$", re.MULTILINE)
+TOKEN = re.compile(r"_|\d+|[-+*^]")
+
+# A factor is (slot, constant, exponent) -- slot is None for a constant
+Factor = Tuple[Optional[int], int, int]
+
+
+class Term(NamedTuple):
+    sign: int
+    factors: Tuple[Factor, ...]
+
+
+class Equation(NamedTuple):
+    terms: Tuple[Term, ...]
+    slots: int
+    total: int
+
+    def evaluate(self, columns):
+        """The left hand side for slot values given by column -- ints, or numpy
+        arrays to evaluate many assignments at once."""
+        result = 0
+        for term in self.terms:
+            product = term.sign
+            for slot, constant, exponent in term.factors:
+                base = constant if slot is None else columns[slot]
+                product = product * base**exponent
+            result = result + product
+        return result
+
+
+def parse_equation(text: str) -> Equation:
+    """Sums of products of blanks and numbers, '^' binding tightest."""
+    match = EQUATION.search(text)
+    if match is None:
+        raise ValueError("No coin equation in the text")
+    tokens = TOKEN.findall(match.group(1))
+
+    terms: List[Term] = list()
+    factors: List[Factor] = list()
+    sign = 1
+    slots = 0
+    position = 0
+    expect_operand = True
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+        if expect_operand:
+            if token == "_":
+                slot, constant = slots, 0
+                slots += 1
+            elif token.isdigit():
+                slot, constant = None, int(token)
+            else:
+                raise ValueError(f"Expected a blank or a number, not '{token}'")
+            exponent = 1
+            if position + 1 < len(tokens) and tokens[position] == "^":
+                exponent = int(tokens[position + 1])
+                position += 2
+            factors.append((slot, constant, exponent))
+            expect_operand = False
+        elif token == "*":
+            expect_operand = True
+        elif token in "+-":
+            terms.append(Term(sign, tuple(factors)))
+            factors = list()
+            sign = 1 if token == "+" else -1
+            expect_operand = True
+        else:
+            raise ValueError(f"Unexpected '{token}' in the equation")
+    if expect_operand:
+        raise ValueError("The equation ends on an operator")
+    terms.append(Term(sign, tuple(factors)))
+    return Equation(tuple(terms), slots, int(match.group(2)))
+
+
+def permutation_tables(
+    count: int, length: int, prefixes: Optional["numpy.ndarray"] = None
+) -> Iterator["numpy.ndarray"]:
+    """Every ordering of length distinct indexes below count, one per row and in the
+    order itertools.permutations gives them, as tables of about BATCH_SIZE rows at
+    most -- given prefixes, only the orderings starting with one of those."""
+    table = numpy.zeros((1, 0), dtype=numpy.intp) if prefixes is None else prefixes
+    while table.shape[1] < length:
+        # Rows the finished table would have
+        rows = len(table) * math.perm(count - table.shape[1], length - table.shape[1])
+        if rows > BATCH_SIZE and len(table) > 1:
+            step = max(1, len(table) * BATCH_SIZE // rows)
+            for start in range(0, len(table), step):
+                yield from permutation_tables(
+                    count, length, table[start : start + step]
+                )
+            return
+        table = extend_permutations(table, count)
+    yield table
+
+
+def extend_permutations(table: "numpy.ndarray", count: int) -> "numpy.ndarray":
+    """Every row followed by every index below count it doesn't already have."""
+    rows = numpy.repeat(table, count, axis=0)
+    following = numpy.tile(numpy.arange(count, dtype=numpy.intp), len(table))
+    unused = (rows != following[:, None]).all(axis=1)
+    return numpy.column_stack([rows, following])[unused]
+
+
+def solutions(equation: Equation, values: Sequence[int]) -> Iterator[Tuple[int, ...]]:
+    """Every way to fill the slots with distinct values, as indexes into values."""
+    if numpy is None:
+        for order in itertools.permutations(range(len(values)), equation.slots):
+            if equation.evaluate([values[index] for index in order]) == equation.total:
+                yield order
+        return
+
+    table = numpy.array(values, dtype=numpy.int64)
+    for orders in permutation_tables(len(values), equation.slots):
+        found = equation.evaluate(table[orders].T) == equation.total
+        for order in orders[found].tolist():
+            yield tuple(order)
+
+
+def coin_value(description: str) -> int:
+    marking = MARKING.search(description)
+    if marking is None:
+        raise ValueError(f"Can't tell what the coin is worth: {description.strip()}")
+    dots, shape = marking.groups()
+    if dots is not None:
+        return NUMBERS[dots]
+    return SHAPES[shape]
+
+
+def coin_values(machine: ExplorerMachine) -> Dict[str, int]:
+    """What each coin carried is worth."""
+    _, text = play(machine, "inv\n")
+    values: Dict[str, int] = dict()
+    for item in listed(INVENTORY, text):
+        if item.endswith(" coin"):
+            _, description = play(machine, f"look {item}\n")
+            values[item] = coin_value(description)
+    return values
+
+
+def coin_commands(machine: ExplorerMachine) -> List[str]:
+    """The commands placing the coins carried, for a machine at the monument."""
+    _, text = play(machine, "look\n")
+    equation = parse_equation(text)
+    values = coin_values(machine)
+    names = list(values)
+    for order in solutions(equation, [values[name] for name in names]):
+        return [f"use {names[index]}" for index in order]
+    raise ValueError("No order of the coins carried solves the equation")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve the coin puzzle")
+    parser.add_argument(
+        "--file", default="data/synacor-challenge/challenge.bin", help="binary to run"
+    )
+    args = parser.parse_args()
+
+    # Play the route up to its first coin going into the monument
+    lines = create_route().splitlines()
+    first = next(
+        index
+        for index, line in enumerate(lines)
+        if line.startswith("use ") and line.endswith(" coin")
+    )
+    machine = ExplorerMachine(args.file, [], solve_calibration())
+    play(machine, "".join(f"{line}\n" for line in lines[:first]))
+    print("\n".join(coin_commands(machine)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Native version of the teleporter's confirmation routine at address 6027:
+
+    6027 jt r0 6035          f(0, n) = n + 1
+    6030 add r0 r1 1
+    6034 ret
+    6035 jt r1 6048          f(m, 0) = f(m - 1, r7)
+    6038 add r0 r0 32767
+    6042 set r1 r7
+    6045 call 6027
+    6047 ret
+    6048 push r0            f(m, n) = f(m - 1, f(m, n - 1))
+    ...
+
+An Ackermann function with every value taken modulo 32768 -- far too deep for the
+machine to ever finish.  Rows 0-3 collapse to closed forms, so the whole register 8
+range can be searched in well under a second.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from op_codes import MODULO
+
+CONFIRMATION_ROUTINE = 6027
+
+# The first instructions of the routine -- used to make sure the binary has it
+SIGNATURE = (7, 32768, 6035, 9, 32768, 32769, 1, 18, 7, 32769, 6048)
+
+# r0 / r1 the routine is called with and the r0 it must return for the teleporter
+CALL_ARGUMENTS = (4, 1)
+EXPECTED = 6
+
+
+def has_routine(stream: Sequence[int], address: int = CONFIRMATION_ROUTINE) -> bool:
+    return tuple(stream[address : address + len(SIGNATURE)]) == SIGNATURE
+
+
+def _geometric(a: int, n: int) -> int:
+    """1 + a + a^2 ... + a^(n-1) modulo 32768, without a modular inverse."""
+    if a == 1:
+        return n % MODULO
+    return (pow(a, n, MODULO * (a - 1)) - 1) // (a - 1) % MODULO
+
+
+def _row3_terms(h: int) -> Tuple[int, int, int]:
+    # f(3, n) = a * f(3, n - 1) + b with f(3, 0) = f(2, h)
+    a = h + 1
+    b = 2 * h + 1
+    return a, b, (b + h * a) % MODULO
+
+
+def fast_confirmation(m: int, n: int, h: int) -> int:
+    """f(m, n) for m <= 4 using the closed form of each row."""
+    if m == 0:
+        return (n + 1) % MODULO
+    if m == 1:
+        return (h + 1 + n) % MODULO
+    if m == 2:
+        return (2 * h + 1 + n * (h + 1)) % MODULO
+    if m == 3:
+        a, b, start = _row3_terms(h)
+        return (pow(a, n, MODULO) * start + b * _geometric(a, n)) % MODULO
+    if m == 4:
+        value = fast_confirmation(3, h, h)
+        for _ in range(n):
+            value = fast_confirmation(3, value, h)
+        return value
+    raise ValueError(f"No closed form for row {m}")
+
+
+def memoized_confirmation(m: int, n: int, h: int) -> int:
+    """f(m, n) evaluated iteratively with an explicit stack and a memo of every
+    (m, n) already seen -- slower than the closed forms, but works for any row."""
+    memo: Dict[Tuple[int, int], int] = dict()
+    pending: List[Tuple[int, int]] = [(m, n)]
+
+    while pending:
+        m, n = pending[-1]
+        if (m, n) in memo:
+            pending.pop()
+        elif m == 0:
+            memo[(m, n)] = (n + 1) % MODULO
+            pending.pop()
+        elif n == 0:
+            if (m - 1, h) in memo:
+                memo[(m, n)] = memo[(m - 1, h)]
+                pending.pop()
+            else:
+                pending.append((m - 1, h))
+        elif (m, n - 1) not in memo:
+            pending.append((m, n - 1))
+        elif (m - 1, memo[(m, n - 1)]) in memo:
+            memo[(m, n)] = memo[(m - 1, memo[(m, n - 1)])]
+            pending.pop()
+        else:
+            pending.append((m - 1, memo[(m, n - 1)]))
+
+    return memo[(m, n)]
+
+
+def confirmation(r0: int, r1: int, r7: int) -> int:
+    """The r0 the routine returns.  On the way out r1 is always r0 - 1 as the
+    last thing it does is 'add r0 r1 1'."""
+    if r0 <= 4:
+        return fast_confirmation(r0, r1, r7)
+    return memoized_confirmation(r0, r1, r7)
+
+
+def solve_calibration(
+    r0: int = CALL_ARGUMENTS[0], r1: int = CALL_ARGUMENTS[1], expected: int = EXPECTED
+) -> Optional[int]:
+    """Find the register 8 value the teleporter's confirmation accepts."""
+    for h in range(1, MODULO):
+        if confirmation(r0, r1, h) == expected:
+            # Double check the closed forms against the plain evaluation
+            if memoized_confirmation(r0, r1, h) != expected:
+                raise ArithmeticError(f"Closed form disagrees for register 8: {h}")
+            return h
+    return None
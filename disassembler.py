@@ -0,0 +1,380 @@
+"""
+Static disassembly of a program image.  Starting from address 0 the code is walked
+along every jump and call with a literal target, which gives:
+
+    instructions    every reachable instruction, by the addresses it covers
+    blocks          basic blocks with their successors -- the control flow graph
+    functions       call targets, their call sites and the addresses they span
+    reads / writes  rmem / wmem of literal addresses, by the address touched
+    strings         length prefixed strings handed to the print routines, decrypted
+
+Everything is indexed by address so any address is looked up in O(1).  The binary
+decrypts parts of itself as it runs, so disassembling a running machine's memory
+(disassemble(machine.stream)) finds more than the file alone.
+
+Results are cached by the hash of the image -- 'python disassembler.py' prints a
+listing.
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from intrinsics import DECRYPT, FOR_EACH, PRINT
+from op_codes import DESCRIPTIONS, MODULO, NAMES, OPERANDS
+from tracing import Tracer
+
+# Bumped whenever the layout of a cached disassembly changes
+DISASSEMBLY_CACHE_VERSION = 1
+
+# Prints the string at r0 by calling FOR_EACH with PRINT
+PRINT_STRING = 1518
+
+_JUMPS = {6, 7, 8}
+_ENDS_BLOCK = {0, 6, 7, 8, 17, 18}
+
+
+class Instruction(NamedTuple):
+    address: int
+    op_code: int
+    operands: Tuple[int, ...]
+
+    @property
+    def next(self) -> int:
+        return self.address + 1 + len(self.operands)
+
+    def __str__(self) -> str:
+        operands = " ".join(
+            f"r{operand - 32768}" if operand >= 32768 else str(operand)
+            for operand in self.operands
+        )
+        return f"{self.address:05d} {NAMES[self.op_code]:>5} {operands}".rstrip()
+
+
+class BasicBlock(NamedTuple):
+    start: int
+    # One past the last word of the last instruction
+    end: int
+    successors: Tuple[int, ...]
+
+
+class StringRef(NamedTuple):
+    address: int
+    text: str
+    # What the characters were xor'd with -- 0 for plain text
+    key: int
+    referenced_from: Tuple[int, ...]
+
+
+class Disassembly:
+    def __init__(self, size: int):
+        # Covering instruction start / block start / function entry per address,
+        # -1 where there is none.
+        self.owners = array("i", [-1]) * size
+        self.block_starts = array("i", [-1]) * size
+        self.function_starts = array("i", [-1]) * size
+
+        self.instructions: Dict[int, Instruction] = dict()
+        self.blocks: Dict[int, BasicBlock] = dict()
+        self.functions: Dict[int, List[int]] = dict()
+        self.reads: Dict[int, List[int]] = dict()
+        self.writes: Dict[int, List[int]] = dict()
+        self.strings: Dict[int, StringRef] = dict()
+
+    def instruction_at(self, address: int) -> Optional[Instruction]:
+        """The instruction covering address, operand words included."""
+        start = self.owners[address]
+        return self.instructions[start] if start >= 0 else None
+
+    def block_at(self, address: int) -> Optional[BasicBlock]:
+        start = self.block_starts[address]
+        return self.blocks[start] if start >= 0 else None
+
+    def function_at(self, address: int) -> Optional[int]:
+        """Entry point of the function address belongs to."""
+        start = self.function_starts[address]
+        return start if start >= 0 else None
+
+    def describe(self, address: int) -> str:
+        notes = list()
+        function = self.function_at(address)
+        if function is not None:
+            notes.append(f"in {function}")
+        if address in self.strings:
+            notes.append(repr(self.strings[address].text))
+        if address in DESCRIPTIONS:
+            notes.append(DESCRIPTIONS[address])
+        return "  ".join(notes)
+
+    def listing(self) -> str:
+        lines = list()
+        for address in sorted(self.instructions):
+            instruction = self.instructions[address]
+            if address in self.functions:
+                callers = ", ".join(str(site) for site in self.functions[address])
+                lines += ["", f"function {address}  (called from {callers})"]
+            line = str(instruction)
+            for operand in instruction.operands:
+                if operand in self.strings:
+                    line += f"\t\t{self.strings[operand].text!r}"
+            if address in DESCRIPTIONS:
+                line += f"\t\t{DESCRIPTIONS[address]}"
+            lines.append(line)
+
+        lines += ["", "strings"]
+        for string in self.strings.values():
+            lines.append(f"{string.address:05d} key {string.key:5d}  {string.text!r}")
+        return "\n".join(lines)
+
+
+def disassemble(
+    stream: Sequence[int], entries: Sequence[int] = (0,), functions: Sequence[int] = ()
+) -> Disassembly:
+    """Walk the code reachable from the entry addresses.  Calls with a literal
+    target mark functions -- others, such as targets seen called through a
+    register, can be passed in."""
+    size = len(stream)
+    result = Disassembly(size)
+    for function in functions:
+        result.functions[function] = list()
+    entries = [*entries, *functions]
+    leaders = set(entries)
+    pending = list(entries)
+
+    while pending:
+        address = pending.pop()
+        while 0 <= address < size and result.owners[address] == -1:
+            op_code = stream[address]
+            if op_code not in OPERANDS:
+                break
+            following = address + 1 + len(OPERANDS[op_code])
+            if following > size:
+                break
+
+            instruction = Instruction(
+                address, op_code, tuple(stream[address + 1 : following])
+            )
+            result.instructions[address] = instruction
+            for word in range(address, following):
+                if result.owners[word] == -1:
+                    result.owners[word] = address
+
+            operands = instruction.operands
+            if op_code in _JUMPS or op_code == 17:
+                target = operands[-1] if op_code != 17 else operands[0]
+                if target < 32768:
+                    leaders.add(target)
+                    pending.append(target)
+                    if op_code == 17:
+                        result.functions.setdefault(target, list()).append(address)
+            elif op_code == 15 and operands[1] < 32768:
+                result.reads.setdefault(operands[1], list()).append(address)
+            elif op_code == 16 and operands[0] < 32768:
+                result.writes.setdefault(operands[0], list()).append(address)
+
+            if op_code in _ENDS_BLOCK:
+                leaders.add(following)
+            if op_code in (0, 6, 18):
+                break
+            address = following
+
+    _build_blocks(result, leaders)
+    _build_functions(result)
+    _find_strings(result, stream)
+    return result
+
+
+def _build_blocks(result: Disassembly, leaders):
+    block: List[Instruction] = list()
+
+    def finish():
+        last = block[-1]
+        successors: List[int] = list()
+        if last.op_code in _JUMPS and last.operands[-1] < 32768:
+            successors.append(last.operands[-1])
+        if last.op_code not in (0, 6, 18) and last.next in result.instructions:
+            successors.append(last.next)
+        start = block[0].address
+        result.blocks[start] = BasicBlock(start, last.next, tuple(successors))
+        for instruction in block:
+            for word in range(instruction.address, instruction.next):
+                if result.block_starts[word] == -1:
+                    result.block_starts[word] = start
+        block.clear()
+
+    for address in sorted(result.instructions):
+        instruction = result.instructions[address]
+        if block and (address in leaders or block[-1].next != address):
+            finish()
+        block.append(instruction)
+        if instruction.op_code in _ENDS_BLOCK:
+            finish()
+    if block:
+        finish()
+
+
+def _build_functions(result: Disassembly):
+    """A function spans the blocks reachable from its entry without calls."""
+    for entry in sorted(result.functions):
+        pending = [entry]
+        while pending:
+            block = result.blocks.get(pending.pop())
+            if block is None or result.function_starts[block.start] != -1:
+                continue
+            for word in range(block.start, block.end):
+                if result.function_starts[word] == -1:
+                    result.function_starts[word] = entry
+            pending.extend(block.successors)
+
+
+def _find_strings(result: Disassembly, stream: Sequence[int]):
+    """Follow constant registers through each block to the print routines."""
+    found: Dict[Tuple[int, int], List[int]] = dict()
+    for block in result.blocks.values():
+        known: Dict[int, int] = dict()
+
+        def value(operand: int) -> Optional[int]:
+            return known.get(operand - 32768) if operand >= 32768 else operand
+
+        address = block.start
+        while address < block.end:
+            instruction = result.instructions[address]
+            op_code, operands = instruction.op_code, instruction.operands
+
+            if op_code == 17:
+                target = value(operands[0])
+                string = None
+                if target == PRINT_STRING:
+                    string = known.get(0), 0
+                elif target == FOR_EACH and known.get(1) == PRINT:
+                    string = known.get(0), 0
+                elif target == FOR_EACH and known.get(1) == DECRYPT:
+                    string = known.get(0), known.get(2)
+                if string is not None and None not in string:
+                    found.setdefault(string, list()).append(address)
+                # Nothing is known about the registers once the call returns
+                known.clear()
+            elif OPERANDS[op_code].startswith("r"):
+                register = operands[0] - 32768
+                values = [value(operand) for operand in operands[1:]]
+                known.pop(register, None)
+                if op_code in (1, 9, 10, 11) and None not in values:
+                    if op_code == 1:
+                        known[register] = values[0]
+                    elif op_code == 9:
+                        known[register] = (values[0] + values[1]) % MODULO
+                    elif op_code == 10:
+                        known[register] = (values[0] * values[1]) % MODULO
+                    elif values[1]:
+                        known[register] = values[0] % values[1]
+            address = instruction.next
+
+    for (address, key), sites in sorted(found.items()):
+        if address + stream[address] >= len(stream):
+            continue
+        words = stream[address + 1 : address + 1 + stream[address]]
+        result.strings[address] = StringRef(
+            address,
+            "".join(chr(word ^ key) for word in words),
+            key,
+            tuple(sites),
+        )
+
+
+def load_disassembly(
+    stream: Sequence[int],
+    entries: Sequence[int] = (0,),
+    functions: Sequence[int] = (),
+    cache_dir: Optional[str] = None,
+) -> Disassembly:
+    """Disassemble the image, reusing the result cached for the same image, entries
+    and functions."""
+    if cache_dir is None:
+        return disassemble(stream, entries, functions)
+
+    key = hashlib.sha256(array("H", stream).tobytes())
+    key.update(array("H", sorted(set(entries))).tobytes())
+    key.update(b"|" + array("H", sorted(set(functions))).tobytes())
+    cache_file = os.path.join(
+        cache_dir, f"{key.hexdigest()}.v{DISASSEMBLY_CACHE_VERSION}.disassembly"
+    )
+    if os.path.exists(cache_file):
+        with open(cache_file, "rb") as f:
+            return pickle.load(f)
+
+    result = disassemble(stream, entries, functions)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_file + ".tmp", "wb") as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(cache_file + ".tmp", cache_file)
+    return result
+
+
+class _Executed(Tracer):
+    """Notes every address an instruction ran from, and every call target."""
+
+    def __init__(self):
+        self.addresses = bytearray(MODULO)
+        self.functions = bytearray(MODULO)
+        self._called = False
+
+    def record(self, address, op_code, operands, deltas):
+        self.addresses[address] = 1
+        if self._called:
+            self.functions[address] = 1
+        self._called = op_code == 17
+
+
+def play_route(
+    file: str, route: str, override: Optional[int] = None
+) -> Tuple[array, List[int], List[int]]:
+    """Memory after playing the route, every address executed on the way and every
+    function called -- much of the code is only reached through addresses held in
+    memory.  override is the teleporter's register 8 value, solved for by default,
+    without which the teleporter never gets past headquarters."""
+    from calibration import HeadlessMachine
+    from confirmation import solve_calibration
+
+    override = solve_calibration() if override is None else override
+    machine = HeadlessMachine(file, [], override)
+    machine.tracer = executed = _Executed()
+    machine.run_route(route)
+    return (
+        machine.stream,
+        [address for address, ran in enumerate(executed.addresses) if ran],
+        [address for address, called in enumerate(executed.functions) if called],
+    )
+
+
+def main():
+    from synacore_challenge import Machine
+
+    parser = argparse.ArgumentParser(description="Disassemble a Synacor binary")
+    parser.add_argument(
+        "file", nargs="?", default="data/synacor-challenge/challenge.bin"
+    )
+    parser.add_argument(
+        "--route",
+        default=None,
+        help="play this route first, disassembling the decrypted memory from every "
+        "address it executed",
+    )
+    parser.add_argument(
+        "--cache-dir", default=None, help="where disassemblies are cached by hash"
+    )
+    args = parser.parse_args()
+
+    if args.route is None:
+        stream, entries, functions = Machine.get_data_stream(args.file), [0], []
+    else:
+        with open(args.route, "rt") as f:
+            stream, entries, functions = play_route(args.file, f.read())
+    print(load_disassembly(stream, entries, functions, args.cache_dir).listing())
+
+
+if __name__ == "__main__":
+    main()
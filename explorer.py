@@ -0,0 +1,253 @@
+"""
+Explores the adventure breadth first instead of following a hand written route.
+
+Every state waiting for input is expanded with the commands the game itself suggests:
+each listed exit, 'take' for each item in the room and 'use' for each item carried.
+The state a command leads to is hashed -- memory, registers and stack -- so however
+many ways there are to reach the same state it is only expanded once, and the first
+route to reach it is a shortest one.
+
+Each level of the search is spread across a process pool, every worker restoring
+snapshots into its own machine.  Whenever a command shows a room or a code not seen
+before the route to it is reported.
+
+    python explorer.py --max-depth 40 --output explored.json
+"""
+import argparse
+import hashlib
+import json
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from calibration import HeadlessMachine
+from confirmation import solve_calibration
+from synacore_challenge import Snapshot, Status
+
+# A command taking longer than this is assumed to never come back for input
+COMMAND_STEPS = 5_000_000
+
+# Typed in before a state is hashed.  The game doesn't understand it, but reading it
+# overwrites what is left of earlier commands in the input buffer and on the stack --
+# otherwise states differing only in what was last typed would never match up.
+FILLER = "~" * 40 + "\n"
+
+# Codes are 12 letters and digits, mixing cases -- unlike any word of the game's
+CODE = re.compile(r"\b(?=\w*[a-z])(?=\w*(?:[A-Z]\w*[A-Z]|\d))[A-Za-z0-9]{12}\b")
+ROOM = re.compile(r"^== (.+) ==\n(.*)$", re.MULTILINE)
+EXITS = re.compile(r"^There (?:are \d+ exits|is 1 exit):\n((?:- .+\n)+)", re.MULTILINE)
+ITEMS = re.compile(r"^Things of interest here:\n((?:- .+\n)+)", re.MULTILINE)
+INVENTORY = re.compile(r"^Your inventory:\n((?:- .+\n)+)", re.MULTILINE)
+
+
+class Child(NamedTuple):
+    command: str
+    digest: bytes
+    snapshot: Snapshot
+    output: str
+
+
+class Found(NamedTuple):
+    kind: str
+    name: str
+    route: Tuple[str, ...]
+
+
+class ExplorerMachine(HeadlessMachine):
+    """No tracing when the orb is used -- everything else as the route plays it."""
+
+    def hack_orb(self, line: str):
+        pass
+
+
+def state_digest(machine: ExplorerMachine) -> bytes:
+    """Everything that decides what the machine does next."""
+    digest = hashlib.blake2b(machine.stream.tobytes(), digest_size=16)
+    digest.update(machine.register_file.tobytes())
+    digest.update(repr(machine.stack).encode())
+    return digest.digest()
+
+
+def listed(pattern, text: str) -> List[str]:
+    """The '- ' items under the last heading matching pattern."""
+    matches = pattern.findall(text)
+    if not matches:
+        return list()
+    return [line[2:] for line in matches[-1].splitlines()]
+
+
+def rooms(text: str) -> List[str]:
+    """Each room shown, told apart by its description -- many share a name."""
+    return [f"{name}: {description}" for name, description in ROOM.findall(text)]
+
+
+def codes(text: str) -> List[str]:
+    return CODE.findall(text)
+
+
+def commands(text: str) -> List[str]:
+    """What is worth trying, going by the output of 'look' and 'inv'."""
+    return [
+        *listed(EXITS, text),
+        *(f"take {item}" for item in listed(ITEMS, text)),
+        *(f"use {item}" for item in listed(INVENTORY, text)),
+    ]
+
+
+def play(machine: ExplorerMachine, text: str) -> Tuple[Status, str]:
+    """Type text in and run until the machine wants more, giving what it printed."""
+    machine.output.clear()
+    machine.character_input.extend(text)
+    status = machine.run(COMMAND_STEPS)
+    return status, machine.output.getvalue()
+
+
+def expand(machine: ExplorerMachine, snapshot: Snapshot) -> List[Child]:
+    """Every state one command on from the snapshot that still wants input."""
+    machine.restore(snapshot)
+    _, text = play(machine, "look\ninv\n")
+
+    children: List[Child] = list()
+    for command in commands(text):
+        machine.restore(snapshot)
+        status, output = play(machine, command + "\n")
+        if status is Status.NEEDS_INPUT:
+            state = machine.snapshot()
+            play(machine, FILLER)
+            children.append(Child(command, state_digest(machine), state, output))
+    return children
+
+
+# Per process state set up by _init_worker
+_machine: Optional[ExplorerMachine] = None
+
+
+def _init_worker(file: str, override: int):
+    global _machine
+    _machine = ExplorerMachine(file, [], override)
+
+
+def _expand(snapshot: Snapshot) -> List[Child]:
+    return expand(_machine, snapshot)
+
+
+class Explorer:
+    def __init__(self, file: str, route: str = "", override: Optional[int] = None):
+        self.file = file
+        self.override = solve_calibration() if override is None else override
+
+        machine = ExplorerMachine(file, [], self.override)
+        status, text = play(machine, route)
+        if status is not Status.NEEDS_INPUT:
+            raise ValueError(f"The route left the machine {status.value}")
+
+        self.start = machine.snapshot()
+        play(machine, FILLER)
+        self.seen = {state_digest(machine)}
+        self.found: List[Found] = list()
+        self.rooms: Dict[str, Tuple[str, ...]] = dict()
+        self.codes: Dict[str, Tuple[str, ...]] = dict()
+        # Pages are interned, so the states waiting to be expanded share memory
+        self.pages: Dict[bytes, bytes] = dict()
+        self.note((), text)
+
+    def note(self, route: Tuple[str, ...], text: str):
+        for kind, names, known in (
+            ("room", rooms(text), self.rooms),
+            ("code", codes(text), self.codes),
+        ):
+            for name in names:
+                if name not in known:
+                    known[name] = route
+                    self.found.append(Found(kind, name, route))
+
+    def intern(self, snapshot: Snapshot) -> Snapshot:
+        pages = tuple(self.pages.setdefault(page, page) for page in snapshot.pages)
+        return snapshot._replace(pages=pages)
+
+    def explore(
+        self,
+        max_depth: Optional[int] = None,
+        workers: Optional[int] = None,
+        report: Optional[Callable[[Found], None]] = None,
+    ) -> List[Found]:
+        """Search until no new states turn up, or max_depth commands in.  report is
+        called with each room or code as it is found."""
+        frontier: List[Tuple[Tuple[str, ...], Snapshot]] = [((), self.start)]
+        for found in self.found:
+            if report is not None:
+                report(found)
+
+        depth = 0
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.file, self.override),
+        ) as pool:
+            while frontier and (max_depth is None or depth < max_depth):
+                depth += 1
+                following: List[Tuple[Tuple[str, ...], Snapshot]] = list()
+                expanded = pool.map(
+                    _expand, [snapshot for _, snapshot in frontier], chunksize=4
+                )
+                for (route, _), children in zip(frontier, expanded):
+                    for child in children:
+                        if child.digest in self.seen:
+                            continue
+                        self.seen.add(child.digest)
+                        new_route = (*route, child.command)
+                        count = len(self.found)
+                        self.note(new_route, child.output)
+                        if report is not None:
+                            for found in self.found[count:]:
+                                report(found)
+                        following.append((new_route, self.intern(child.snapshot)))
+                frontier = following
+        return self.found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the shortest routes to every room and code"
+    )
+    parser.add_argument(
+        "--file", default="data/synacor-challenge/challenge.bin", help="binary to run"
+    )
+    parser.add_argument(
+        "--route", default=None, help="play this route first and explore from there"
+    )
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--output", default=None, help="write the routes found to this JSON file"
+    )
+    args = parser.parse_args()
+
+    route = ""
+    if args.route is not None:
+        with open(args.route, "rt") as f:
+            route = f.read()
+
+    def report(found: Found):
+        print(f"{found.kind} {found.name!r} after {len(found.route)}: ", end="")
+        print(", ".join(found.route))
+
+    explorer = Explorer(args.file, route)
+    explorer.explore(args.max_depth, args.workers, report)
+    print(f"{len(explorer.seen)} states")
+
+    if args.output is not None:
+        with open(args.output, "wt") as f:
+            json.dump(
+                {
+                    "rooms": {name: list(r) for name, r in explorer.rooms.items()},
+                    "codes": {name: list(r) for name, r in explorer.codes.items()},
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
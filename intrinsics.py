@@ -0,0 +1,225 @@
+"""
+Native stand-ins for subroutines of challenge.bin.  When call targets a registered
+address the machine runs the Python version instead, leaving the same registers,
+stack, memory and output as interpreting the routine would have.
+
+    1458 for_each    calls r1 with r0 set to each element of the length prefixed
+                     array at r0 -- r1 ends up holding the length
+    1528 print       out r0
+    1531 decrypt     out r0 xor r2
+    2125 xor         r0 = r0 xor r1
+
+for_each is only taken over when the callback is print or decrypt.  An intrinsic is
+only used while the code at its address (and its callback's) still matches what it
+was written against, since the binary rewrites itself, and never while the machine
+is stepping through single instructions (tracing, or Machine.run_until) or has
+watchpoints set.  That check compares live memory, as a disassembly (see
+disassembler.py) only describes the image it was taken from.
+
+With verify set every intrinsic call is also interpreted, from the same state, and
+any difference raises IntrinsicMismatch.
+"""
+
+from array import array
+from typing import Callable, Dict, List, Optional
+
+from op_codes import MODULO
+
+FOR_EACH = 1458
+PRINT = 1528
+DECRYPT = 1531
+XOR = 2125
+
+# The code each routine was written against
+# fmt: off
+SIGNATURES = {
+    FOR_EACH: (
+        2, 32768, 2, 32771, 2, 32772, 2, 32773, 2, 32774, 1, 32774, 32768, 1, 32773,
+        32769, 15, 32772, 32768, 1, 32769, 0, 9, 32771, 1, 32769, 5, 32768, 32771,
+        32772, 7, 32768, 1507, 9, 32771, 32771, 32774, 15, 32768, 32771, 17, 32773,
+        9, 32769, 32769, 1, 7, 32769, 1480, 3, 32774, 3, 32773, 3, 32772, 3, 32771,
+        3, 32768, 18,
+    ),
+    PRINT: (19, 32768, 18),
+    DECRYPT: (2, 32769, 1, 32769, 32770, 17, 2125, 19, 32768, 3, 32769, 18),
+    XOR: (
+        2, 32769, 2, 32770, 12, 32770, 32768, 32769, 14, 32770, 32770, 13, 32768,
+        32768, 32769, 12, 32768, 32768, 32770, 3, 32770, 3, 32769, 18,
+    ),
+}
+# fmt: on
+
+# Writes a character, returning True if doing so rewound the machine
+Write = Callable[[int], bool]
+Intrinsic = Callable[[Write], bool]
+
+
+class IntrinsicMismatch(Exception):
+    """A native routine and the interpreted one it stands in for disagreed."""
+
+
+class Intrinsics:
+    def __init__(self, machine):
+        self.machine = machine
+        self.verify = False
+        # Set while a routine is interpreted for verification, nested calls included
+        self.interpreting = False
+        self.signatures = {
+            address: array("H", code) for address, code in SIGNATURES.items()
+        }
+        # Only routines the loaded program actually has are registered
+        self.natives: Dict[int, Intrinsic] = dict()
+        for address, native in (
+            (FOR_EACH, self.for_each),
+            (XOR, self.xor),
+        ):
+            if self.matches(address):
+                self.register(address, native)
+
+    def register(self, address: int, native: Intrinsic):
+        """Run native in place of calls to address.  It returns False, before
+        changing anything, to have the routine interpreted after all."""
+        self.natives[address] = native
+
+    def matches(self, address: int) -> bool:
+        signature = self.signatures[address]
+        return self.machine.stream[address : address + len(signature)] == signature
+
+    def call(self, target: int, pointer: int) -> Optional[int]:
+        """Run the intrinsic for a call to target returning to pointer.  Gives the
+        address to carry on from, or None to interpret the call as usual."""
+        machine = self.machine
+        if (
+            self.interpreting
+            or machine.stepping
+            or machine.watchpoints.active
+            or not self.matches(target)
+        ):
+            return None
+        if self.verify:
+            return self.call_verified(target, pointer)
+
+        # Triggers fired by the output may rewind the machine -- the pointer is
+        # parked on the call so that shows up as a change.
+        marker = pointer - 1
+
+        def write(value: int) -> bool:
+            machine.write_character(value)
+            return machine.pointer != marker
+
+        machine.pointer = marker
+        if not self.natives[target](write):
+            return None
+        return pointer if machine.pointer == marker else machine.pointer + 1
+
+    def call_verified(self, target: int, pointer: int) -> Optional[int]:
+        machine = self.machine
+        before = self.state()
+
+        native_output: List[int] = list()
+        if not self.natives[target](lambda value: native_output.append(value)):
+            return None
+        native = self.state()
+
+        self.set_state(before)
+        interpreted_output: List[int] = list()
+        self.interpret(target, pointer, interpreted_output.append)
+        interpreted = self.state()
+
+        for name, expected, actual in (
+            ("registers", interpreted[0], native[0]),
+            ("stack", interpreted[1], native[1]),
+            ("memory", interpreted[2], native[2]),
+            ("output", interpreted_output, native_output),
+        ):
+            if expected != actual:
+                raise IntrinsicMismatch(
+                    f"Intrinsic at {target} left different {name} to the routine"
+                )
+
+        # Same state either way -- now print for real
+        marker = machine.pointer = pointer - 1
+        for value in native_output:
+            machine.write_character(value)
+            if machine.pointer != marker:
+                return machine.pointer + 1
+        return pointer
+
+    def state(self):
+        machine = self.machine
+        return (
+            machine.register_file.tobytes(),
+            list(machine.stack),
+            machine.stream.tobytes(),
+        )
+
+    def set_state(self, state):
+        registers, stack, stream = state
+        machine = self.machine
+        machine.register_file[:] = array("H", registers)
+        machine.stack[:] = stack
+        if machine.stream.tobytes() != stream:
+            machine.stream[:] = array("H", stream)
+            machine.invalidate_code()
+
+    def interpret(self, target: int, pointer: int, write: Callable[[int], None]):
+        """Interpret the routine one instruction at a time, handing its output to
+        write, until it returns to pointer."""
+        machine = self.machine
+        stack = machine.stack
+        stream = machine.stream
+        depth = len(stack)
+        stack.append(pointer)
+
+        self.interpreting = True
+        try:
+            address = target
+            while address != pointer or len(stack) != depth:
+                op_code = stream[address]
+                if op_code in (0, 20):
+                    action = "halt" if op_code == 0 else "read input"
+                    raise IntrinsicMismatch(f"Routine at {target} tried to {action}")
+                entry = machine.decode_instruction(address)
+                if op_code == 19:
+                    write(entry[2][entry[3]])
+                    address = entry[1]
+                else:
+                    address = entry[0](entry)
+        finally:
+            self.interpreting = False
+
+    def for_each(self, write: Write) -> bool:
+        machine = self.machine
+        registers = machine.register_file
+        stream = machine.stream
+        callback = registers[1]
+        if callback == PRINT:
+            if not self.matches(PRINT):
+                return False
+            key = None
+        elif callback == DECRYPT:
+            if not (self.matches(DECRYPT) and self.matches(XOR)):
+                return False
+            key = registers[2]
+        else:
+            return False
+
+        start = registers[0]
+        length = stream[start]
+        if length >= MODULO - 1:
+            # The index would wrap before passing the length
+            return False
+
+        for index in range(1, length + 1):
+            value = stream[(start + index) % MODULO]
+            if key is not None:
+                value ^= key
+            if write(value):
+                return True
+        registers[1] = length
+        return True
+
+    def xor(self, write: Write) -> bool:
+        registers = self.machine.register_file
+        registers[0] ^= registers[1]
+        return True
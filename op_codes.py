@@ -0,0 +1,79 @@
+"""
+The machine's instruction set and memory layout, as described in arch-spec.txt --
+shared by everything that decodes, runs or rewrites the program.
+"""
+
+# 15 bit addresses, and arithmetic modulo 32768
+MEMORY_SIZE = 32768
+MODULO = MEMORY_SIZE
+# Operands 32768..32775 name the registers
+REGISTER_COUNT = 8
+
+# Memory is snapshotted in pages, and writes mark their page dirty
+PAGE_SIZE = 256
+PAGE_SHIFT = PAGE_SIZE.bit_length() - 1
+PAGE_COUNT = MEMORY_SIZE // PAGE_SIZE
+
+NAMES = {
+    0: "halt",
+    1: "set",
+    2: "push",
+    3: "pop",
+    4: "eq",
+    5: "gt",
+    6: "jmp",
+    7: "jt",
+    8: "jf",
+    9: "add",
+    10: "multi",
+    11: "mod",
+    12: "and",
+    13: "or",
+    14: "not",
+    15: "rmem",
+    16: "wmem",
+    17: "call",
+    18: "ret",
+    19: "out",
+    20: "in",
+    21: "noop",
+}
+
+# Operand layout per op_code:  "r" is a register to write into and "v" is a value
+# that is either a literal or a register to be read.
+OPERANDS = {
+    0: "",
+    1: "rv",
+    2: "v",
+    3: "r",
+    4: "rvv",
+    5: "rvv",
+    6: "v",
+    7: "vv",
+    8: "vv",
+    9: "rvv",
+    10: "rvv",
+    11: "rvv",
+    12: "rvv",
+    13: "rvv",
+    14: "rv",
+    15: "rv",
+    16: "vv",
+    17: "v",
+    18: "",
+    19: "v",
+    20: "r",
+    21: "",
+}
+
+# Notes on addresses in challenge.bin found while tracing it
+DESCRIPTIONS = {
+    1458: "Commands to get appropriate character to print starts here...",
+    # 1484: "Interesting counter -- if the two args equal some logic can happen, like 'is room yellow or red, etc'",
+    # 1528: "print_buffer...",
+    # 1531: "push onto the stack, set a register value, and call a function ... ",
+    # 2125: "Feels like a math operation in this block? Two items pushed to stack, and/not/or and then stores info to registers.",
+    # 1807: "Storing input character value ... ",
+    # 2144: "Register updated to new value... Note that register 32768 is also manipulated above.",
+    # 2146: "Reset register to what it was before the call started...",
+}
@@ -0,0 +1,63 @@
+"""
+Where the machine's opcode 19 output ends up.  Characters are buffered and only
+handed on at a newline or when the machine is about to wait for input.
+"""
+import sys
+
+from abc import ABC, abstractmethod
+from typing import List, Optional, TextIO
+
+
+class OutputSink(ABC):
+    @abstractmethod
+    def write(self, text: str):
+        pass
+
+    def flush(self):
+        pass
+
+
+class TextSink(OutputSink):
+    """Buffered writes to a text stream -- the console (sys.stdout) by default."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        # Resolved on use so that redirecting sys.stdout still works
+        self.stream = stream
+        self.buffer: List[str] = list()
+
+    def write(self, text: str):
+        self.buffer.append(text)
+        if "\n" in text:
+            self._write_buffer()
+
+    def flush(self):
+        self._write_buffer()
+        (self.stream or sys.stdout).flush()
+
+    def _write_buffer(self):
+        if self.buffer:
+            (self.stream or sys.stdout).write("".join(self.buffer))
+            self.buffer.clear()
+
+
+class CollectorSink(OutputSink):
+    """Keeps everything in memory."""
+
+    def __init__(self):
+        self.chunks: List[str] = list()
+
+    def write(self, text: str):
+        self.chunks.append(text)
+
+    def getvalue(self) -> str:
+        return "".join(self.chunks)
+
+    def clear(self):
+        self.chunks.clear()
+
+
+class NullSink(OutputSink):
+    """Throws everything away -- handy for benchmarking."""
+
+    def write(self, text: str):
+        pass
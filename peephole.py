@@ -0,0 +1,123 @@
+"""
+Superinstructions for the decoded engine.  When an instruction is decoded the words
+after it are checked for a few idioms the binary is full of, and a match is cached as
+one entry doing the work of the whole run:
+
+    push, push, ...      function prologues
+    pop, pop, ...        function epilogues
+    eq/gt + jt/jf        compare and branch
+    add + rmem           indexed loads
+
+A fused entry is (handler, next address, first address, ...) and only ever spans
+MAX_FUSED_WORDS words, which is how far back a write has to look for entries it
+invalidates.  Tracing runs the plain instructions, so traces are unaffected.
+"""
+from typing import Callable, List, Optional, Tuple
+
+MAX_FUSED_WORDS = 16
+
+# Looking back this far from a written address catches every entry covering it
+LOOKBACK = MAX_FUSED_WORDS - 1
+
+
+class Peephole:
+    def __init__(self, machine):
+        self.machine = machine
+        registers = machine.register_file
+        stack = machine.stack
+        stream = machine.stream
+        math_op = machine.math_op
+
+        def push_run(entry):
+            _, pointer, _, values = entry
+            stack.extend([source[index] for source, index in values])
+            return pointer
+
+        def pop_run(entry):
+            _, pointer, address, targets = entry
+            if len(stack) < len(targets):
+                # Pop one at a time, so the machine stops on the pop that found the
+                # stack empty
+                single = machine.decode_instruction(address)
+                return single[0](single)
+            for target in targets:
+                registers[target] = stack.pop()
+            return pointer
+
+        def eq_jt(entry):
+            _, pointer, _, a, b_source, b, c_source, c, x_source, x, y_source, y = entry
+            registers[a] = 1 if b_source[b] == c_source[c] else 0
+            return y_source[y] if x_source[x] != 0 else pointer
+
+        def eq_jf(entry):
+            _, pointer, _, a, b_source, b, c_source, c, x_source, x, y_source, y = entry
+            registers[a] = 1 if b_source[b] == c_source[c] else 0
+            return y_source[y] if x_source[x] == 0 else pointer
+
+        def gt_jt(entry):
+            _, pointer, _, a, b_source, b, c_source, c, x_source, x, y_source, y = entry
+            registers[a] = 1 if b_source[b] > c_source[c] else 0
+            return y_source[y] if x_source[x] != 0 else pointer
+
+        def gt_jf(entry):
+            _, pointer, _, a, b_source, b, c_source, c, x_source, x, y_source, y = entry
+            registers[a] = 1 if b_source[b] > c_source[c] else 0
+            return y_source[y] if x_source[x] == 0 else pointer
+
+        def add_rmem(entry):
+            _, pointer, _, a, b_source, b, c_source, c, d, e_source, e = entry
+            registers[a] = (b_source[b] + c_source[c]) % math_op
+            registers[d] = stream[e_source[e]]
+            return pointer
+
+        self.push_run = push_run
+        self.pop_run = pop_run
+        # Keyed by the op_codes of the pair
+        self.pairs = {
+            (4, 7): eq_jt,
+            (4, 8): eq_jf,
+            (5, 7): gt_jt,
+            (5, 8): gt_jf,
+            (9, 15): add_rmem,
+        }
+        self.handlers = {push_run, pop_run, *self.pairs.values()}
+
+    def fuse(self, address: int, entry: Tuple) -> Optional[Tuple]:
+        """A superinstruction starting with the decoded entry at address, if the
+        instructions after it make one."""
+        stream = self.machine.stream
+        op_code = stream[address]
+        if op_code == 2 or op_code == 3:
+            return self.fuse_run(address, op_code)
+
+        pointer = entry[1]
+        # Both jt and jf take two operands
+        if pointer + 3 <= len(stream) and (op_code, stream[pointer]) in self.pairs:
+            following = self.machine.decode_instruction(pointer)
+            return (
+                self.pairs[(op_code, stream[pointer])],
+                following[1],
+                address,
+                *entry[2:],
+                *following[2:],
+            )
+        return None
+
+    def fuse_run(self, address: int, op_code: int) -> Optional[Tuple]:
+        """Consecutive pushes (or pops), as long as they fit in MAX_FUSED_WORDS."""
+        stream = self.machine.stream
+        decode_instruction = self.machine.decode_instruction
+        operands: List = list()
+        pointer = address
+        while (
+            pointer + 2 <= min(address + MAX_FUSED_WORDS, len(stream))
+            and stream[pointer] == op_code
+        ):
+            entry = decode_instruction(pointer)
+            operands.append(tuple(entry[2:]) if op_code == 2 else entry[2])
+            pointer = entry[1]
+
+        if len(operands) < 2:
+            return None
+        handler: Callable = self.push_run if op_code == 2 else self.pop_run
+        return handler, pointer, address, tuple(operands)
@@ -0,0 +1,192 @@
+"""
+Where does the machine spend its time?  Attach a Profiler as the machine's tracer and
+it counts executions per op_code and per address, follows the call depth and times
+how long the machine works between one input prompt and the next.
+
+A tracer sees every single instruction, so attaching one runs the machine one
+instruction at a time: no superinstructions, intrinsics or compiled blocks.  Counts
+are those of the program itself, but the timings and instructions per second are of
+that stepped loop -- far slower than a normal run of the decoded or compiled engine,
+and not a measure of either.  benchmarks.py times the engines themselves.
+"""
+
+import json
+import time
+
+from typing import Dict, List, Optional
+
+from disassembler import Disassembly
+from op_codes import DESCRIPTIONS, MEMORY_SIZE, NAMES
+from tracing import Tracer
+
+# What the timings measure -- see above
+ENGINE = "stepped"
+
+
+class Profiler(Tracer):
+    def __init__(self, stack: List[int]):
+        """stack is the machine's, which the call depth is read from."""
+        self.op_codes: List[int] = [0] * len(NAMES)
+        self.addresses: List[int] = [0] * MEMORY_SIZE
+        self.address_op_codes: Dict[int, int] = dict()
+        self.calls: Dict[int, int] = dict()
+
+        # The stack's height just after each call still in progress pushed its
+        # return address -- a frame is gone once the stack drops below it.
+        self.stack = stack
+        self.frames: List[int] = list()
+        self.max_depth = 0
+        self._height = len(stack)
+        self._called = False
+
+        # Work done answering each line of input: (instructions, seconds)
+        self.prompts: List[List[float]] = list()
+        self._waiting = True
+        self._line_read = True
+        self._prompt_start = 0.0
+        self._prompt_instructions = 0
+        self._last_output = 0.0
+
+    def record(self, address, op_code, operands, deltas):
+        self.op_codes[op_code] += 1
+        if not self.addresses[address]:
+            self.address_op_codes[address] = op_code
+        self.addresses[address] += 1
+
+        if self._called:
+            # The target may be in a register, so count the call where it landed
+            self.calls[address] = self.calls.get(address, 0) + 1
+            self._called = False
+
+        height = len(self.stack)
+        while self.frames and height < self.frames[-1]:
+            # Returned, or its return address was popped some other way
+            self.frames.pop()
+        if op_code == 17 and height == self._height + 1:
+            # Pushed a return address -- calls answered natively push nothing
+            self.frames.append(height)
+            self.max_depth = max(self.max_depth, len(self.frames))
+            self._called = True
+        self._height = height
+
+        if op_code == 19:
+            self._last_output = time.perf_counter()
+        elif op_code == 20:
+            if not self._waiting:
+                # Stop the clock at the prompt's last character, not after the read
+                # which may have sat waiting on someone typing.
+                self._end_prompt(self._last_output)
+            self._line_read = any(value == 10 for _, value in deltas)
+            return
+
+        if self._waiting:
+            if not self._line_read:
+                # Still taking in the characters of a line
+                return
+            self._waiting = False
+            self._prompt_start = self._last_output = time.perf_counter()
+            self._prompt_instructions = 0
+        self._prompt_instructions += 1
+
+    def _end_prompt(self, finished: float):
+        self.prompts.append(
+            [self._prompt_instructions, max(0.0, finished - self._prompt_start)]
+        )
+        self._waiting = True
+
+    def close(self):
+        """Account for whatever ran after the last input."""
+        if not self._waiting:
+            self._end_prompt(time.perf_counter())
+
+    @property
+    def depth(self) -> int:
+        return len(self.frames)
+
+    @property
+    def instructions(self) -> int:
+        return sum(self.op_codes)
+
+    @property
+    def executed(self) -> List[int]:
+        """Every address an instruction ran from."""
+        return [address for address, count in enumerate(self.addresses) if count]
+
+    @property
+    def seconds(self) -> float:
+        """Time spent running, leaving out the time spent waiting on input."""
+        return sum(seconds for _, seconds in self.prompts)
+
+    def report(self, top: int = 25) -> Dict:
+        seconds = self.seconds
+        prompted = sum(instructions for instructions, _ in self.prompts)
+        hot_spots = sorted(
+            (address for address, count in enumerate(self.addresses) if count),
+            key=lambda address: self.addresses[address],
+            reverse=True,
+        )
+        return {
+            "engine": ENGINE,
+            "instructions": self.instructions,
+            "seconds": seconds,
+            "instructions_per_second": prompted / seconds if seconds else 0.0,
+            "op_codes": {
+                NAMES[op_code]: count
+                for op_code, count in sorted(
+                    enumerate(self.op_codes), key=lambda item: item[1], reverse=True
+                )
+                if count
+            },
+            "hot_spots": [
+                {
+                    "address": address,
+                    "op_code": NAMES[self.address_op_codes[address]],
+                    "count": self.addresses[address],
+                }
+                for address in hot_spots[:top]
+            ],
+            "calls": {
+                str(target): count
+                for target, count in sorted(
+                    self.calls.items(), key=lambda item: item[1], reverse=True
+                )[:top]
+            },
+            "max_call_depth": self.max_depth,
+            "prompts": [
+                {"instructions": instructions, "seconds": seconds}
+                for instructions, seconds in self.prompts
+            ],
+        }
+
+    def write_json(self, file: str, top: int = 25):
+        with open(file, "wt") as f:
+            json.dump(self.report(top), f, indent=2)
+
+    def table(self, top: int = 25, disassembly: Optional[Disassembly] = None) -> str:
+        """Hot spots and op_code counts -- with a disassembly each hot spot also
+        shows the function it's in."""
+        report = self.report(top)
+        total = report["instructions"] or 1
+        lines = [
+            f"{report['instructions']} instructions in {report['seconds']:.3f}s "
+            f"({report['instructions_per_second']:.0f}/s {report['engine']}), "
+            f"{len(report['prompts'])} prompts, "
+            f"max call depth {report['max_call_depth']}",
+            "",
+            f"{'address':>7} {'count':>10} {'%':>6} {'op':>6}",
+        ]
+        for hot_spot in report["hot_spots"]:
+            address, count = hot_spot["address"], hot_spot["count"]
+            if disassembly is None:
+                notes = DESCRIPTIONS.get(address, "")
+            else:
+                notes = disassembly.describe(address)
+            lines.append(
+                f"{address:>7} {count:>10} {100 * count / total:>6.2f} "
+                f"{hot_spot['op_code']:>6}  {notes}".rstrip()
+            )
+
+        lines += ["", f"{'op_code':>7} {'count':>10} {'%':>6}"]
+        for name, count in report["op_codes"].items():
+            lines.append(f"{name:>7} {count:>10} {100 * count / total:>6.2f}")
+        return "\n".join(lines)
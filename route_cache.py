@@ -0,0 +1,169 @@
+"""
+Snapshots keyed by the route that led to them, so trying a variation of a route only
+replays what changed.
+
+Whenever the machine is about to read a new line a snapshot is taken and stored in a
+trie of input lines.  Running a route walks the trie as far as it matches, restores
+the deepest snapshot found and plays the rest of the route from there.
+
+Snapshots share every page not written since the one before, so the cache counts
+each distinct page once, however many snapshots hold it, and lets it go with the last
+of them.  Once the total goes over the budget the least recently used snapshots are
+dropped -- never the one at the root, taken before any input, nor the one just taken.
+
+    python route_cache.py data/route.txt my_variation.txt
+"""
+import argparse
+import time
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from confirmation import solve_calibration
+from explorer import ExplorerMachine, play
+from synacore_challenge import Snapshot, Status
+
+# Bytes of snapshots kept by default
+DEFAULT_BUDGET = 64 << 20
+
+
+class _Node:
+    __slots__ = ("line", "parent", "children", "snapshot")
+
+    def __init__(self, line: Optional[str], parent: Optional["_Node"]):
+        self.line = line
+        self.parent = parent
+        self.children: Dict[str, _Node] = dict()
+        self.snapshot: Optional[Snapshot] = None
+
+
+class RouteCache:
+    def __init__(
+        self,
+        file: str,
+        override: Optional[int] = None,
+        engine: str = "decoded",
+        budget: int = DEFAULT_BUDGET,
+    ):
+        override = solve_calibration() if override is None else override
+        self.machine = ExplorerMachine(file, [], override, engine=engine)
+        self.budget = budget
+        self.used = 0
+        # Snapshots holding each page, by the page's id -- a page is only freed, and
+        # its id reused, once no snapshot holds it
+        self.page_references: Dict[int, int] = dict()
+        # Least recently used first
+        self.recent: "OrderedDict[_Node, None]" = OrderedDict()
+        # Lines of the last run played and skipped
+        self.replayed = 0
+        self.skipped = 0
+
+        self.root = _Node(None, None)
+        status, self.boot_output = play(self.machine, "")
+        if status is not Status.NEEDS_INPUT:
+            raise ValueError(f"The machine {status.value} before asking for input")
+        self.store(self.root, self.machine.snapshot())
+
+    def run(self, route: str) -> Tuple[Status, str]:
+        """Play the route from the start, giving the machine's status at the end and
+        what it printed after the deepest cached prefix."""
+        lines = route.splitlines()
+
+        # Deepest cached snapshot along the route
+        node, cached, depth = self.root, self.root, 0
+        for index, line in enumerate(lines):
+            node = node.children.get(line)
+            if node is None:
+                break
+            if node.snapshot is not None:
+                cached, depth = node, index + 1
+
+        self.recent.move_to_end(cached)
+        self.machine.restore(cached.snapshot)
+        self.skipped, self.replayed = depth, len(lines) - depth
+
+        output: List[str] = list()
+        status = Status.NEEDS_INPUT
+        node = cached
+        for line in lines[depth:]:
+            status, text = play(self.machine, line + "\n")
+            output.append(text)
+            if status is not Status.NEEDS_INPUT:
+                break
+            child = node.children.get(line)
+            if child is None:
+                child = node.children[line] = _Node(line, node)
+            node = child
+            if node.snapshot is None:
+                self.store(node, self.machine.snapshot())
+        return status, "".join(output)
+
+    def store(self, node: _Node, snapshot: Snapshot):
+        references = self.page_references
+        for page in snapshot.pages:
+            count = references.get(id(page), 0)
+            if not count:
+                self.used += len(page)
+            references[id(page)] = count + 1
+        node.snapshot = snapshot
+        self.recent[node] = None
+        self.evict(node)
+
+    def release(self, node: _Node):
+        """Drop the node's snapshot, and the pages no other snapshot holds."""
+        references = self.page_references
+        for page in node.snapshot.pages:
+            count = references[id(page)] - 1
+            if count:
+                references[id(page)] = count
+            else:
+                del references[id(page)]
+                self.used -= len(page)
+        node.snapshot = None
+
+    def evict(self, keep: _Node):
+        """Drop the least recently used snapshots until back within budget, other
+        than the root's and keep's."""
+        for node in list(self.recent):
+            if self.used <= self.budget:
+                break
+            if node is self.root or node is keep:
+                continue
+            del self.recent[node]
+            self.release(node)
+            # Drop trie nodes that no longer lead to any snapshot
+            while node.parent is not None and node.snapshot is None:
+                if node.children:
+                    break
+                del node.parent.children[node.line]
+                node = node.parent
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play routes, replaying only what differs from earlier ones"
+    )
+    parser.add_argument("routes", nargs="+", help="route files, played in order")
+    parser.add_argument(
+        "--file", default="data/synacor-challenge/challenge.bin", help="binary to run"
+    )
+    parser.add_argument(
+        "--budget", type=int, default=DEFAULT_BUDGET, help="bytes of snapshots kept"
+    )
+    args = parser.parse_args()
+
+    cache = RouteCache(args.file, budget=args.budget)
+    for path in args.routes:
+        with open(path, "rt") as f:
+            route = f.read()
+        start = time.perf_counter()
+        status, _ = cache.run(route)
+        print(
+            f"{path}: {status.value} in {time.perf_counter() - start:.3f}s, "
+            f"replayed {cache.replayed} lines and skipped {cache.skipped}, "
+            f"{cache.used} bytes cached"
+        )
+
+
+if __name__ == "__main__":
+    main()
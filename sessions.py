@@ -0,0 +1,124 @@
+"""
+Many machines served from one process with asyncio.  Each session owns a machine
+that, rather than blocking on input(), stops with Status.NEEDS_INPUT so the session
+can await its next line -- and whose output is passed on to an async writer.
+
+Sessions run their machine in slices of steps and yield to the event loop between
+slices, so a session busy computing never starves the others.
+
+    python sessions.py --port 8023      then connect with e.g. 'nc localhost 8023'
+"""
+import argparse
+import asyncio
+
+from typing import Awaitable, Callable, Optional
+
+from confirmation import solve_calibration
+from output_sinks import CollectorSink
+from synacore_challenge import Machine, Status
+
+# Steps a session runs before letting the others have a turn
+SLICE_STEPS = 20000
+
+# Gives the next line of input, without its newline, or None when there is no more
+LineReader = Callable[[], Awaitable[Optional[str]]]
+TextWriter = Callable[[str], Awaitable[None]]
+
+
+class SessionMachine(Machine):
+    """Collects output and stops, rather than blocking, when it runs out of input."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, output=CollectorSink(), read_line=None, **kwargs)
+
+
+class Session:
+    def __init__(
+        self,
+        file: str,
+        read_line: LineReader,
+        write: TextWriter,
+        override: int = 0,
+        engine: str = "decoded",
+        slice_steps: int = SLICE_STEPS,
+    ):
+        self.machine = SessionMachine(file, [], override, engine=engine)
+        self.read_line = read_line
+        self.write = write
+        self.slice_steps = slice_steps
+
+    async def run(self):
+        """Run until the machine halts or the input runs out."""
+        machine = self.machine
+        while True:
+            status = machine.run(self.slice_steps)
+            await self.flush()
+            if status is Status.HALTED:
+                return
+            if status is Status.NEEDS_INPUT:
+                line = await self.read_line()
+                if line is None:
+                    return
+                machine.character_input.extend(line + "\n")
+            else:
+                # Out of steps -- let the other sessions have a turn
+                await asyncio.sleep(0)
+
+    async def flush(self):
+        output = self.machine.output
+        text = output.getvalue()
+        if text:
+            output.clear()
+            await self.write(text)
+
+
+async def serve(
+    file: str,
+    host: str = "127.0.0.1",
+    port: int = 8023,
+    engine: str = "decoded",
+    slice_steps: int = SLICE_STEPS,
+):
+    """Start a new session for every connection, forever."""
+    override = solve_calibration()
+
+    async def connected(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def read_line() -> Optional[str]:
+            line = await reader.readline()
+            if not line:
+                return None
+            return line.decode("utf-8", "replace").rstrip("\r\n")
+
+        async def write(text: str):
+            writer.write(text.encode("utf-8"))
+            await writer.drain()
+
+        session = Session(file, read_line, write, override, engine, slice_steps)
+        try:
+            await session.run()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(connected, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Synacor sessions over TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8023)
+    parser.add_argument("--engine", choices=("decoded", "compiled"), default="decoded")
+    parser.add_argument("--slice-steps", type=int, default=SLICE_STEPS)
+    parser.add_argument(
+        "--file", default="data/synacor-challenge/challenge.bin", help="binary to run"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.file, args.host, args.port, args.engine, args.slice_steps))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,244 @@
+import os
 import sys
-import copy
+import argparse
+import hashlib
+import struct
+
+from array import array
+from collections import deque
+from collections.abc import MutableMapping
+from enum import Enum
+from typing import Callable, Deque, Iterator, List, NamedTuple, Optional, Tuple
 
-from typing import List, Optional
+from block_compiler import HOT_THRESHOLD, BlockCompiler
+from confirmation import (
+    CONFIRMATION_ROUTINE,
+    confirmation,
+    has_routine,
+    solve_calibration,
+)
+from intrinsics import Intrinsics
+from op_codes import (
+    MEMORY_SIZE,
+    NAMES,
+    OPERANDS,
+    PAGE_COUNT,
+    PAGE_SHIFT,
+    PAGE_SIZE,
+    REGISTER_COUNT,
+)
+from output_sinks import OutputSink, TextSink
+from peephole import LOOKBACK, Peephole
+from tracing import ConsoleTracer, TeeTracer, Tracer
+from triggers import Triggers
+from watchpoints import LOG, Watchpoints, WatchpointHit, add_watch
 
+# Lets a literal operand be read the same way as a register: source[index]
+LITERALS = range(32768)
 
-class Machine:
-    debug = False
+ENGINES = ("decoded", "classic", "compiled")
+
+# Read in place of input characters too big for the machine
+REPLACEMENT_CHARACTER = ord("?")
+
+# Bumped whenever the layout of a cached program image changes
+IMAGE_CACHE_VERSION = 3
+# magic, version, words -- ahead of the words of a cached image
+IMAGE_HEADER = struct.Struct("<8sHI")
+IMAGE_MAGIC = b"SYNAIMG\x00"
+
+
+class Status(Enum):
+    """Why Machine.run stopped."""
+
+    HALTED = "halted"
+    NEEDS_INPUT = "needs-input"
+    BUDGET_EXHAUSTED = "budget-exhausted"
+    BREAKPOINT = "breakpoint"
+
+
+class Halted(Exception):
+    """The machine ran halt, or ret with nothing on the stack."""
+
+    def __init__(self, code: int):
+        super().__init__(code)
+        self.code = code
+
+
+class NeedsInput(Exception):
+    """The machine wants a character, there are none left and no way to read more."""
+
+
+class Snapshot(NamedTuple):
+    pages: Tuple[bytes, ...]
+    registers: bytes
+    stack: Tuple[int, ...]
+    pointer: int
+    character_input: Tuple[str, ...]
+    at_line_start: bool
+    output_state: int
+
+
+def input_code(character: str) -> int:
+    """What the machine reads for character.  Registers only hold 15 bit values and
+    input may come from anywhere, so anything bigger reads as REPLACEMENT_CHARACTER."""
+    value = ord(character)
+    return value if value < MEMORY_SIZE else REPLACEMENT_CHARACTER
+
+
+class Registers(MutableMapping):
+    """Dict style view over the 8 slot register file, keyed 32768..32775 as the
+    op codes address them -- the machine itself reads the array by index."""
+
+    def __init__(self, register_file: array):
+        self.register_file = register_file
+
+    def __getitem__(self, key: int) -> int:
+        return self.register_file[self._index(key)]
+
+    def __setitem__(self, key: int, value: int):
+        self.register_file[self._index(key)] = value
+
+    def __delitem__(self, key: int):
+        raise TypeError("registers can not be removed")
 
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(MEMORY_SIZE, MEMORY_SIZE + REGISTER_COUNT))
+
+    def __len__(self) -> int:
+        return REGISTER_COUNT
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    @staticmethod
+    def _index(key: int) -> int:
+        if not MEMORY_SIZE <= key < MEMORY_SIZE + REGISTER_COUNT:
+            raise KeyError(key)
+        return key - MEMORY_SIZE
+
+
+class Machine:
     math_op = 32768
 
-    registers = {
-        32768: 0,
-        32769: 0,
-        32770: 0,
-        32771: 0,
-        32772: 0,
-        32773: 0,
-        32774: 0,
-        32775: 0,
-    }
-
-    character_input = list()
-    stack: List[Optional[hex]] = list()
-    pointer: int = 0
-
-    # hack the machine
-    override_check: str = ""
-    restore_point = None
-
-    def __init__(self, file: str, route: List[str], override: int = 0):
-        self.character_input = list(route)
-        self.stream = self.get_data_stream(file)
+    def __init__(
+        self,
+        file: str,
+        route: List[str],
+        override: int = 0,
+        engine: str = "decoded",
+        cache_dir: Optional[str] = None,
+        output: Optional[OutputSink] = None,
+        read_line: Optional[Callable[[], str]] = input,
+    ):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+
+        # All state lives on the instance, so machines in one process stay apart
+        self.character_input: Deque[str] = deque(route)
+        self.at_line_start = True
+        self.stack: List[int] = list()
+        self.pointer = 0
+        self.steps_left = 0
+
+        # hack the machine
+        self.restore_point: Optional[Snapshot] = None
         self.override = override
-
-    def debug_op_code_result(self, *args):
-        names = {
-            0: "halt",
-            1: "set",
-            2: "push",
-            3: "pop",
-            4: "eq",
-            5: "gt",
-            6: "jmp",
-            7: "jt",
-            8: "jf",
-            9: "add",
-            10: "multi",
-            11: "mod",
-            12: "and",
-            13: "or",
-            14: "not",
-            15: "rmem",
-            16: "wmem",
-            17: "call",
-            18: "ret",
-            19: "out",
-            20: "in",
-            21: "noop",
-        }
-        description = {
-            1458: "Commands to get appropriate character to print starts here...",
-            # 1484: "Interesting counter -- if the two args equal some logic can happen, like 'is room yellow or red, etc'",
-            # 1528: "print_buffer...",
-            # 1531: "push onto the stack, set a register value, and call a function ... ",
-            # 2125: "Feels like a math operation in this block? Two items pushed to stack, and/not/or and then stores info to registers.",
-            # 1807: "Storing input character value ... ",
-            # 2144: "Register updated to new value... Note that register 32768 is also manipulated above.",
-            # 2146: "Reset register to what it was before the call started...",
-        }
-
-        index, op_code, *items = args
-        if self.debug is True:
-            actuals = [self.register_check(i) for i in items]
-
-            results = list()
-            for t in zip(items, actuals):
-                if t[0] == t[1]:
-                    results.append(f"[{t[0]}]")
-                else:
-                    results.append("[{}: {}]".format(t[0], t[1]))
-            if op_code == 19:
-                print()
-
-            print(
-                f"{index - len(results):05d}",
-                f"{op_code:02d}",
-                f"{names[op_code]:>6}",
-                *results,
-                f"-> {self.stream[index + 1]}",
-                f"\t\t\t{description.get(index - len(results), '')}",
-            )
+        self.engine = engine
+        self.output = TextSink() if output is None else output
+        # Asked for more input when the route runs out -- with None the machine
+        # stops with NeedsInput instead.
+        self.read_line = read_line
+        self.exit_code: Optional[int] = None
+
+        # Nothing is traced unless a tracer is attached -- see tracing.py.  The orb's
+        # debug toggle has a tracer of its own, so it never replaces an attached one,
+        # and the engines record to both through _tracer.
+        self.attached_tracer: Optional[Tracer] = None
+        self.debug_tracer: Optional[ConsoleTracer] = None
+        self._tracer: Optional[Tracer] = None
+        # Set while every instruction has to run on its own, i.e. tracing
+        self.stepping = False
+
+        self.triggers = Triggers()
+        self.register_hacks()
+
+        # Compact machine state: 8 registers and 32K words of memory, both unsigned
+        # 16 bit arrays.  'registers' is kept as a dict style view for the hacks.
+        self.register_file = array("H", bytes(2 * REGISTER_COUNT))
+        self.registers = Registers(self.register_file)
+        self.stream = array("H", bytes(2 * MEMORY_SIZE))
+        program = self.get_data_stream(file, cache_dir)
+        self.stream[: len(program)] = program
+
+        # Copy on write bookkeeping: the pages of the snapshot the memory was last
+        # taken from / restored to, and which pages have been written since.
+        self.base_pages: Optional[Tuple[bytes, ...]] = None
+        self.dirty_pages = bytearray(b"\x01" * PAGE_COUNT)
+
+        # The teleporter's confirmation routine never finishes when interpreted, so
+        # calls to it are answered natively -- see confirmation.py
+        self.confirmation_routine = (
+            CONFIRMATION_ROUTINE if has_routine(self.stream) else None
+        )
+
+        # Pre-decoded instructions keyed by address -- filled lazily as code executes
+        self.code: List[Optional[Tuple]] = [None] * len(self.stream)
+        # Native versions of the binary's own subroutines -- see intrinsics.py
+        self.intrinsics = Intrinsics(self)
+        # Hot basic blocks compiled to Python functions, used by the compiled engine
+        self.compiler = BlockCompiler(self)
+        self.handlers = self.build_handlers()
+        # Fuses common instruction sequences as they're decoded
+        self.peephole = Peephole(self)
+        # Checks wrapped around decoded instructions when any are set
+        self.watchpoints = Watchpoints(self)
+
+    @property
+    def tracer(self) -> Optional[Tracer]:
+        """What the engines record each instruction to -- the attached tracer, the
+        debug one or both."""
+        return self._tracer
+
+    @tracer.setter
+    def tracer(self, value: Optional[Tracer]):
+        self.attached_tracer = value
+        self._combine_tracers()
+
+    @property
+    def debug(self) -> bool:
+        return self.debug_tracer is not None
+
+    @debug.setter
+    def debug(self, value: bool):
+        """Turning debug on traces to the console, along with the game's output --
+        next to any tracer already attached."""
+        if value is not self.debug:
+            self.debug_tracer = ConsoleTracer(self.output) if value else None
+            self._combine_tracers()
+
+    def _combine_tracers(self):
+        tracers = [
+            tracer
+            for tracer in (self.attached_tracer, self.debug_tracer)
+            if tracer is not None
+        ]
+        if len(tracers) > 1:
+            self._tracer = TeeTracer(tracers)
+        else:
+            self._tracer = tracers[0] if tracers else None
+
+    def trace_classic(self, tracer: Tracer, address: int, op_code: int, before: array):
+        """Hand an instruction run by the classic interpreter to the tracer, just as
+        the decoded engine does."""
+        following = address + 1 + len(OPERANDS[op_code])
+        operands = tuple(self.stream[address + 1 : following])
+        deltas = tuple(
+            (index, value)
+            for index, value in enumerate(self.register_file)
+            if value != before[index]
+        )
+        tracer.record(address, op_code, operands, deltas)
 
     def get_next_byte(self, index, register_check=False):
         index += 1
@@ -99,14 +248,60 @@ class Machine:
         return index, arg1
 
     def process_stream(self):
+        """Run the machine to the end, exiting the process when it halts.  A breaking
+        watchpoint is reported on stderr and the machine carries on."""
+        try:
+            if self.engine == "classic":
+                self.interpret_stream()
+            else:
+                while self.execute_stream():
+                    print(f"watchpoint {self.watchpoints.hits[-1]}", file=sys.stderr)
+        except Halted as halted:
+            sys.exit(halted.code)
+
+    def run(self, max_steps: Optional[int] = None) -> Status:
+        """Run until the machine halts, wants input it can't get or has taken
+        max_steps steps -- calling again carries on from there.  Always runs the
+        decoded (or compiled) engine."""
+        return self.run_until(None, max_steps)
+
+    def run_until(
+        self,
+        predicate: Optional[Callable[["Machine"], bool]],
+        max_steps: Optional[int] = None,
+    ) -> Status:
+        """As run, but also stopping as soon as predicate(machine) holds after an
+        instruction, or on a breaking watchpoint.  'machine.pointer + 1' is the
+        address of the next one.
+
+        A predicate sees every single instruction, so nothing is fused, run natively
+        or compiled while one is set."""
+        try:
+            if self.execute_stream(max_steps, predicate):
+                return Status.BREAKPOINT
+        except Halted as halted:
+            self.exit_code = halted.code
+            return Status.HALTED
+        except NeedsInput:
+            return Status.NEEDS_INPUT
+        return Status.BUDGET_EXHAUSTED
+
+    def interpret_stream(self):
+        """The original one-instruction-at-a-time interpreter -- kept around so the
+        decoded engine can be compared against it."""
         while True:
+            tracer = self.tracer
+            if tracer is not None:
+                address = self.pointer + 1
+                before = self.register_file[:]
             self.pointer, op_code = self.get_next_byte(
                 self.pointer, register_check=True
             )
 
             if op_code == 0:
                 """halt 0 -> stop execution and terminate the program"""
-                sys.exit(op_code)
+                self.output.flush()
+                raise Halted(0)
 
             elif op_code == 1:
                 """set: 1 a b -> set register <a> to the value of <b>"""
@@ -115,7 +310,6 @@ class Machine:
                     self.pointer, register_check=True
                 )
                 self.registers[arg1] = arg2
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2)
 
             elif op_code == 2:
                 """push: 2 a -> push <a> onto the stack"""
@@ -123,13 +317,11 @@ class Machine:
                     self.pointer, register_check=True
                 )
                 self.stack.append(arg1)
-                self.debug_op_code_result(self.pointer, op_code, arg1)
 
             elif op_code == 3:
                 # pop off stack and write to register (a)
                 self.pointer, arg1 = self.get_next_byte(self.pointer)
                 self.registers[arg1] = self.stack.pop()
-                self.debug_op_code_result(self.pointer, op_code, arg1)
 
             elif op_code == 4:
                 # equal - set a to 1 if b == c else 0
@@ -141,7 +333,6 @@ class Machine:
                     self.pointer, register_check=True
                 )
                 self.registers[arg1] = 1 if arg2 == arg3 else 0
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2, arg3)
 
             elif op_code == 5:
                 self.pointer, arg1 = self.get_next_byte(self.pointer)
@@ -152,14 +343,12 @@ class Machine:
                     self.pointer, register_check=True
                 )
                 self.registers[arg1] = 1 if arg2 > arg3 else 0
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2, arg3)
 
             elif op_code == 6:  # jump(a)
                 self.pointer, arg1 = self.get_next_byte(
                     self.pointer, register_check=True
                 )
                 self.pointer = arg1 - 1
-                self.debug_op_code_result(self.pointer, op_code, arg1)
 
             elif op_code == 7:
                 """JT: if a is nonzero jump to b"""
@@ -170,16 +359,9 @@ class Machine:
                     self.pointer, register_check=True
                 )
 
-                # HACK for verification code to be short circuited
-                if self.registers[32775] != 0 and arg2 == 6048:
-                    # print(arg1, arg2)
-                    arg1 = 0
-                    # self.debug = False
                 if arg1 != 0:
                     self.pointer = arg2 - 1
 
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2)
-
             elif op_code == 8:
                 """JF: if a is zero jump to b"""
                 self.pointer, arg1 = self.get_next_byte(
@@ -191,8 +373,6 @@ class Machine:
                 if arg1 == 0:
                     self.pointer = arg2 - 1
 
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2)
-
             elif op_code == 9:
                 self.pointer, arg1 = self.get_next_byte(self.pointer)
                 self.pointer, arg2 = self.get_next_byte(
@@ -203,7 +383,6 @@ class Machine:
                 )
 
                 self.registers[arg1] = (arg2 + arg3) % self.math_op
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2, arg3)
 
             elif op_code == 10:  # mult
                 self.pointer, arg1 = self.get_next_byte(self.pointer)
@@ -215,7 +394,6 @@ class Machine:
                 )
 
                 self.registers[arg1] = (arg2 * arg3) % self.math_op
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2, arg3)
 
             elif op_code == 11:  # mod
                 self.pointer, arg1 = self.get_next_byte(self.pointer)
@@ -238,8 +416,6 @@ class Machine:
 
                 self.registers[arg1] = arg2 & arg3
 
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2, arg3)
-
             elif op_code == 13:
                 self.pointer, arg1 = self.get_next_byte(self.pointer)
                 self.pointer, arg2 = self.get_next_byte(
@@ -251,8 +427,6 @@ class Machine:
 
                 self.registers[arg1] = arg2 | arg3
 
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2, arg3)
-
             elif op_code == 14:
                 """bitwise inverse of <b> in <a>"""
                 self.pointer, arg1 = self.get_next_byte(self.pointer)
@@ -264,8 +438,6 @@ class Machine:
                 inverse_arg2 = self.register_check(inverse)
                 self.registers[arg1] = inverse_arg2
 
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2)
-
             elif op_code == 15:
                 """rmem: read memory at address <b> and write it to <a>"""
                 self.pointer, arg1 = self.get_next_byte(
@@ -276,7 +448,6 @@ class Machine:
                 )
 
                 self.registers[arg1] = self.stream[arg2]
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2)
 
             elif op_code == 16:
                 """wmem: write the value from <b> into memory at address <a>"""
@@ -288,25 +459,26 @@ class Machine:
                 )
 
                 self.stream[arg1] = arg2
-                self.debug_op_code_result(self.pointer, op_code, arg1, arg2)
+                self.dirty_pages[arg1 >> PAGE_SHIFT] = 1
 
             elif op_code == 17:
                 """Write next address to stack and jump to address"""
                 self.pointer, arg1 = self.get_next_byte(
                     self.pointer, register_check=True
                 )
-                self.stack.append(self.pointer + 1)
-                self.pointer = arg1 - 1
-
-                self.debug_op_code_result(self.pointer, op_code, arg1)
+                if arg1 == self.confirmation_routine:
+                    self.confirm()
+                else:
+                    self.stack.append(self.pointer + 1)
+                    self.pointer = arg1 - 1
 
             elif op_code == 18:
                 if len(self.stack) == 0:
-                    sys.exit(1)
+                    self.output.flush()
+                    raise Halted(1)
 
                 item = self.stack.pop()
                 self.pointer = item - 1
-                self.debug_op_code_result(self.pointer, op_code, item)
 
             elif op_code == 19:
                 """Print Next Character."""
@@ -315,31 +487,18 @@ class Machine:
                     self.pointer, register_check=True
                 )
 
-                print(chr(arg1), end="")
-
-                # Hack the machine for teleportation
-                self.hack_the_machine(arg1)
-
-                self.debug_op_code_result(self.pointer, op_code, arg1)
+                self.write_character(arg1)
 
             elif op_code == 20:
 
-                """read a character from the terminal and write its ascii code to <a>; 
+                """read a character from the terminal and write its ascii code to <a>;
                 it can be assumed that once input starts, it will continue until a newline
                 is encountered; this means that you can safely read whole lines from the
                 keyboard and trust that they will be fully read"""
-                if len(self.character_input) == 0:
-                    self.character_input = list(input())
-                    self.character_input.append("\n")
-
-                self.hack_orb()
-
-                # IMPORTANT: Change the 8th register at this point to pass initial
-                # machine startup tests -- but to then be ready for teleportation.
-                if "".join(self.character_input).startswith("use teleporter\n"):
-                    self.registers[32775] = self.override
-
-                result = ord(self.character_input.pop(0))
+                # Anything snapshotting the machine mid read must resume on this op_code
+                self.pointer -= 1
+                result = self.read_character()
+                self.pointer += 1
 
                 self.pointer, arg1 = self.get_next_byte(
                     self.pointer, register_check=False
@@ -350,64 +509,513 @@ class Machine:
                 # Printing out the next set of bytes revealed that the next logical op_code
                 # instruction wants to match the input to a different register.  By simply typing
                 # \n I was able to unlock additional messages/commands/etc.
-                self.debug_op_code_result(self.pointer, op_code, result)
 
             elif op_code == 21:
-                self.debug_op_code_result(self.pointer, op_code)
                 pass
             else:
                 # Should NEVER get here...
                 raise ValueError(f"Unexpected op_code encountered: {op_code}")
 
-    def hack_orb(self):
-        if "".join(self.character_input).startswith("use orb\n"):
-            self.debug = not self.debug
-
-    def hack_the_machine(self, arg1):
-        if "".join(self.character_input).startswith("sandy beach"):
-            # put the machine back into its normal state
-            self.registers[32775] = 0
-
-        if (
-            "".join(self.character_input).startswith("use teleporter\n")
-            and self.registers[32775] == 0
-        ):
-            if self.restore_point is None:
-                # Create a point to get back to in order to loop faster.
-                # and hack the Machine for its stabilization number.
-                self.restore_point = copy.deepcopy(self)
-
-            # Only takes place when 'use teleporter' is triggered
-            self.registers[32775] = self.override
-
-        if self.registers[32775] != 0:
-            self.override_check += chr(arg1)
-
-            # Message seen if we don't hack the machine and SLOW verification takes place
-            if "1 billion years" in self.override_check:
-                pass
-                # This was used to trace the machine code that caused the verification
-                # While teh code is no longer needed with the solution -- keeping it
-                # for posterity :)
-                # self.debug = True
-
-            # When brute forcing the code, many attempts will be made, and this message
-            # indicates verification took place, but failed
-            if "Nothing else seems to happen." in self.override_check:
-
-                # failed to resolve teleporter code -- so lets restore the machine state
-                # and try again
-                print(
-                    f"\nRestoring the world...: Register 32775: {self.registers[32775]}"
-                )
-                self.registers = dict(self.restore_point.registers)
-                self.stack = list(self.restore_point.stack)
-                self.stream = list(self.restore_point.stream)
-                self.override_check = self.restore_point.override_check[::]
-                self.character_input = list(self.restore_point.character_input)
-                self.pointer = self.restore_point.pointer
-                self.override += 1
-                self.registers[32775] = self.override
+            if tracer is not None:
+                self.trace_classic(tracer, address, op_code, before)
+
+    def execute_stream(
+        self,
+        max_steps: Optional[int] = None,
+        predicate: Optional[Callable[["Machine"], bool]] = None,
+    ) -> bool:
+        """Run the pre-decoded, table dispatched engine.
+
+        Each address is decoded once into a tuple of (handler, next address, operands)
+        and cached in self.code -- only a wmem into code throws an entry away.
+
+        Should anything raise out of an instruction (i.e. input running dry) the
+        pointer is left on that instruction, so calling this again picks it back up.
+        Given max_steps it also returns after that many steps -- a step being one
+        dispatch, whether an instruction, superinstruction, intrinsic or compiled
+        block -- to be picked back up the same way.  Given a predicate it returns
+        True as soon as the predicate holds after an instruction, as it does on a
+        breaking watchpoint.
+        """
+        pointer = self.pointer + 1
+        self.steps_left = sys.maxsize if max_steps is None else max_steps
+        watchpoints = self.watchpoints
+        if watchpoints.skip != pointer:
+            # Not resuming from an execute break -- nothing to step past
+            watchpoints.skip = None
+        while True:
+            self.stepping = self.tracer is not None or predicate is not None
+            try:
+                if self.stepping:
+                    return self._execute_stepped(
+                        pointer, self.steps_left, self.tracer, predicate
+                    )
+                elif self.engine == "compiled" and not watchpoints.active:
+                    self._execute_compiled(pointer, self.steps_left)
+                else:
+                    self._execute(pointer, self.steps_left)
+                return False
+            except _TracerChanged as change:
+                pointer = change.pointer
+            except WatchpointHit as hit:
+                self.pointer = hit.resume - 1
+                # Running again carries on past an execute break, rather than
+                # breaking on the same instruction straight away
+                watchpoints.skip = hit.resume if hit.hit.kind == "execute" else None
+                return True
+            finally:
+                self.stepping = False
+
+    def _execute(self, pointer: int, steps: int):
+        code = self.code
+        decode = self.decode
+        try:
+            for remaining in range(steps, 0, -1):
+                entry = code[pointer]
+                if entry is None:
+                    entry = decode(pointer)
+                pointer = entry[0](entry)
+        except BaseException:
+            self.pointer = pointer - 1
+            self.steps_left = remaining - 1
+            raise
+        self.pointer = pointer - 1
+        self.steps_left = 0
+
+    def _execute_compiled(self, pointer: int, steps: int):
+        """Run compiled blocks where there are any, and the decoded instructions
+        everywhere else -- compiling a block once its start address gets hot.
+
+        Anything raised out of a compiled block leaves the pointer on the block's
+        first instruction."""
+        code = self.code
+        decode = self.decode
+        compiler = self.compiler
+        blocks = compiler.blocks
+        hits = compiler.hits
+        try:
+            for remaining in range(steps, 0, -1):
+                block = blocks[pointer]
+                if block is not None:
+                    pointer = block()
+                    continue
+
+                hits[pointer] += 1
+                if hits[pointer] == HOT_THRESHOLD and compiler.compile(pointer):
+                    continue
+
+                entry = code[pointer]
+                if entry is None:
+                    entry = decode(pointer)
+                pointer = entry[0](entry)
+        except BaseException:
+            self.pointer = pointer - 1
+            self.steps_left = remaining - 1
+            raise
+        self.pointer = pointer - 1
+        self.steps_left = 0
+
+    def _execute_stepped(
+        self,
+        pointer: int,
+        steps: int,
+        tracer: Optional[Tracer],
+        predicate: Optional[Callable[["Machine"], bool]],
+    ) -> bool:
+        """One instruction at a time, recording each with the tracer and checking
+        the predicate after each."""
+        code = self.code
+        decode = self.decode
+        stream = self.stream
+        registers = self.register_file
+        record = None if tracer is None else tracer.record
+        fused = self.peephole.handlers
+        try:
+            for remaining in range(steps, 0, -1):
+                entry = code[pointer]
+                if entry is None:
+                    entry = decode(pointer)
+                if entry[0] in fused:
+                    # Run each instruction of a superinstruction on its own
+                    entry = self.decode_instruction(pointer)
+
+                if record is None:
+                    pointer = entry[0](entry)
+                else:
+                    op_code = stream[pointer]
+                    operands = tuple(stream[pointer + 1 : entry[1]])
+                    before = registers[:]
+                    address, pointer = pointer, entry[0](entry)
+
+                    deltas = ()
+                    if registers != before:
+                        deltas = tuple(
+                            (index, value)
+                            for index, value in enumerate(registers)
+                            if value != before[index]
+                        )
+                    record(address, op_code, operands, deltas)
+
+                if predicate is not None:
+                    self.pointer = pointer - 1
+                    if predicate(self):
+                        self.steps_left = remaining - 1
+                        return True
+        except BaseException:
+            self.pointer = pointer - 1
+            self.steps_left = remaining - 1
+            raise
+        self.pointer = pointer - 1
+        self.steps_left = 0
+        return False
+
+    def decode(self, address: int) -> Tuple:
+        """Decode the instruction at address, fused with the ones after it where
+        they make a superinstruction, and cache it."""
+        entry = self.decode_instruction(address)
+        if self.watchpoints.active:
+            entry = self.watchpoints.wrap(address, entry)
+        else:
+            entry = self.peephole.fuse(address, entry) or entry
+        self.code[address] = entry
+        return entry
+
+    def decode_instruction(self, address: int) -> Tuple:
+        op_code = self.stream[address]
+        if op_code not in OPERANDS:
+            # Should NEVER get here...
+            raise ValueError(f"Unexpected op_code encountered: {op_code}")
+
+        kinds = OPERANDS[op_code]
+        operands = list()
+        for offset, kind in enumerate(kinds, start=1):
+            word = self.stream[address + offset]
+            if kind == "r":
+                if not MEMORY_SIZE <= word < MEMORY_SIZE + REGISTER_COUNT:
+                    raise ValueError(
+                        f"Invalid register {word} for {NAMES[op_code]} at address "
+                        f"{address + offset}"
+                    )
+                operands.append(word - 32768)
+            elif word >= 32768:
+                operands.extend((self.register_file, word - 32768))
+            else:
+                operands.extend((LITERALS, word))
+
+        return (self.handlers[op_code], address + 1 + len(kinds), *operands)
+
+    def invalidate_code(self, start: int = 0, stop: Optional[int] = None):
+        """Drop decoded instructions and compiled blocks that overlap the memory in
+        [start, stop)."""
+        stop = len(self.code) if stop is None else stop
+        self.compiler.invalidate(start, stop)
+        # An entry spans up to LOOKBACK + 1 words, so look back far enough to catch it
+        start = max(0, start - LOOKBACK)
+        self.code[start:stop] = [None] * (stop - start)
+
+    def build_handlers(self) -> List[Callable[[Tuple], int]]:
+        """One handler per op_code -- each takes a decoded entry and returns the
+        address of the next instruction.  They hold on to the machine's containers,
+        so these must be mutated in place rather than replaced."""
+        registers = self.register_file
+        stack = self.stack
+        stream = self.stream
+        code = self.code
+        dirty_pages = self.dirty_pages
+        confirmation_routine = self.confirmation_routine
+        math_op = self.math_op
+        natives = self.intrinsics.natives
+        owners = self.compiler.owners
+        invalidate_blocks = self.compiler.invalidate_address
+
+        def halt(entry):
+            self.output.flush()
+            raise Halted(0)
+
+        def set_(entry):
+            _, pointer, a, b_source, b = entry
+            registers[a] = b_source[b]
+            return pointer
+
+        def push(entry):
+            _, pointer, a_source, a = entry
+            stack.append(a_source[a])
+            return pointer
+
+        def pop(entry):
+            _, pointer, a = entry
+            registers[a] = stack.pop()
+            return pointer
+
+        def eq(entry):
+            _, pointer, a, b_source, b, c_source, c = entry
+            registers[a] = 1 if b_source[b] == c_source[c] else 0
+            return pointer
+
+        def gt(entry):
+            _, pointer, a, b_source, b, c_source, c = entry
+            registers[a] = 1 if b_source[b] > c_source[c] else 0
+            return pointer
+
+        def jmp(entry):
+            _, pointer, a_source, a = entry
+            return a_source[a]
+
+        def jt(entry):
+            _, pointer, a_source, a, b_source, b = entry
+            return b_source[b] if a_source[a] != 0 else pointer
+
+        def jf(entry):
+            _, pointer, a_source, a, b_source, b = entry
+            return b_source[b] if a_source[a] == 0 else pointer
+
+        def add(entry):
+            _, pointer, a, b_source, b, c_source, c = entry
+            registers[a] = (b_source[b] + c_source[c]) % math_op
+            return pointer
+
+        def mult(entry):
+            _, pointer, a, b_source, b, c_source, c = entry
+            registers[a] = (b_source[b] * c_source[c]) % math_op
+            return pointer
+
+        def mod(entry):
+            _, pointer, a, b_source, b, c_source, c = entry
+            registers[a] = (b_source[b] % c_source[c]) % math_op
+            return pointer
+
+        def and_(entry):
+            _, pointer, a, b_source, b, c_source, c = entry
+            registers[a] = b_source[b] & c_source[c]
+            return pointer
+
+        def or_(entry):
+            _, pointer, a, b_source, b, c_source, c = entry
+            registers[a] = b_source[b] | c_source[c]
+            return pointer
+
+        def not_(entry):
+            _, pointer, a, b_source, b = entry
+            registers[a] = ~b_source[b] & 0x7FFF
+            return pointer
+
+        def rmem(entry):
+            _, pointer, a, b_source, b = entry
+            registers[a] = stream[b_source[b]]
+            return pointer
+
+        def wmem(entry):
+            _, pointer, a_source, a, b_source, b = entry
+            address = a_source[a]
+            stream[address] = b_source[b]
+            dirty_pages[address >> PAGE_SHIFT] = 1
+            # Self modifying code -- forget any instruction covering this address
+            start = max(0, address - LOOKBACK)
+            code[start : address + 1] = [None] * (address + 1 - start)
+            if owners[address]:
+                invalidate_blocks(address)
+            return pointer
+
+        def call(entry):
+            _, pointer, a_source, a = entry
+            target = a_source[a]
+            if target == confirmation_routine:
+                self.confirm()
+                return pointer
+            if target in natives:
+                following = self.call_intrinsic(target, pointer)
+                if following is not None:
+                    return following
+            stack.append(pointer)
+            return target
+
+        def ret(entry):
+            if len(stack) == 0:
+                self.output.flush()
+                raise Halted(1)
+            return stack.pop()
+
+        # Triggers fired by in/out may attach or drop a tracer, which means the
+        # engine has to switch loops.
+        def out(entry):
+            _, pointer, a_source, a = entry
+            tracer = self.tracer
+            # Triggers may rewind the machine, so let them move the pointer
+            self.pointer = pointer - 1
+            self.write_character(a_source[a])
+            if self.tracer is not tracer:
+                raise _TracerChanged(self.pointer + 1)
+            return self.pointer + 1
+
+        def in_(entry):
+            _, pointer, a = entry
+            tracer = self.tracer
+            # Anything snapshotting the machine mid read must resume on this op_code
+            self.pointer = pointer - 3
+            registers[a] = self.read_character()
+            if self.tracer is not tracer:
+                raise _TracerChanged(pointer)
+            return pointer
+
+        def noop(entry):
+            return entry[1]
+
+        return [
+            halt,
+            set_,
+            push,
+            pop,
+            eq,
+            gt,
+            jmp,
+            jt,
+            jf,
+            add,
+            mult,
+            mod,
+            and_,
+            or_,
+            not_,
+            rmem,
+            wmem,
+            call,
+            ret,
+            out,
+            in_,
+            noop,
+        ]
+
+    def call_intrinsic(self, target: int, pointer: int) -> Optional[int]:
+        """Run a call natively, if it can be -- gives the address to carry on from."""
+        tracer = self.tracer
+        following = self.intrinsics.call(target, pointer)
+        if following is not None and self.tracer is not tracer:
+            raise _TracerChanged(following)
+        return following
+
+    def write_character(self, value: int):
+        character = chr(value)
+        self.output.write(character)
+        self.triggers.output_character(character)
+
+    def read_character(self) -> int:
+        self.output.flush()
+        if len(self.character_input) == 0:
+            if self.read_line is None:
+                raise NeedsInput()
+            self.character_input.extend(self.read_line())
+            self.character_input.append("\n")
+
+        if self.at_line_start:
+            self.triggers.input_line(self.pending_line())
+
+        character = self.character_input.popleft()
+        self.at_line_start = character == "\n"
+        return input_code(character)
+
+    def pending_line(self) -> str:
+        """The next line of input, up to and including its newline."""
+        line = list()
+        for character in self.character_input:
+            line.append(character)
+            if character == "\n":
+                break
+        return "".join(line)
+
+    def register_hacks(self):
+        self.triggers.on_input_line("use orb\n", self.hack_orb)
+        self.triggers.on_input_line("sandy beach", self.hack_sandy_beach)
+        self.triggers.on_input_line("use teleporter\n", self.hack_teleporter)
+
+        # When brute forcing the code, many attempts will be made, and this message
+        # indicates verification took place, but failed.  (Watching for "1 billion
+        # years" instead, and flipping on debug, is how the verification was traced.)
+        self.triggers.on_output(
+            "Nothing else seems to happen.", self.hack_failed_calibration
+        )
+
+    def hack_orb(self, line: str):
+        self.debug = not self.debug
+
+    def hack_sandy_beach(self, line: str):
+        # put the machine back into its normal state
+        self.registers[32775] = 0
+
+    def hack_teleporter(self, line: str):
+        # IMPORTANT: Change the 8th register at this point to pass initial
+        # machine startup tests -- but to then be ready for teleportation.
+        if self.registers[32775] == 0 and self.restore_point is None:
+            # Create a point to get back to in order to loop faster.
+            # and hack the Machine for its stabilization number.
+            self.restore_point = self.snapshot()
+
+        self.registers[32775] = self.override
+
+    def hack_failed_calibration(self):
+        if self.registers[32775] == 0 or self.restore_point is None:
+            return
+
+        # failed to resolve teleporter code -- so lets restore the machine state
+        # and try again
+        self.output.write(
+            f"\nRestoring the world...: Register 32775: {self.registers[32775]}\n"
+        )
+        self.restore(self.restore_point)
+        self.override += 1
+        self.registers[32775] = self.override
+
+    def confirm(self):
+        """Stand in for a call to the confirmation routine: same r0/r1 it would
+        leave behind, without the billion years."""
+        result = confirmation(
+            self.register_file[0], self.register_file[1], self.register_file[7]
+        )
+        self.register_file[0] = result
+        self.register_file[1] = (result - 1) % self.math_op
+
+    def snapshot(self) -> Snapshot:
+        """Capture the machine state.  Memory pages untouched since the previous
+        snapshot/restore are shared with it, so only dirtied pages get copied."""
+        pages = list(self.base_pages or [b""] * PAGE_COUNT)
+        for page, dirty in enumerate(self.dirty_pages):
+            if dirty:
+                start = page << PAGE_SHIFT
+                pages[page] = self.stream[start : start + PAGE_SIZE].tobytes()
+
+        self.base_pages = tuple(pages)
+        self.dirty_pages[:] = bytes(PAGE_COUNT)
+
+        return Snapshot(
+            pages=self.base_pages,
+            registers=self.register_file.tobytes(),
+            stack=tuple(self.stack),
+            pointer=self.pointer,
+            character_input=tuple(self.character_input),
+            at_line_start=self.at_line_start,
+            output_state=self.triggers.state,
+        )
+
+    def restore(self, snap: Snapshot):
+        """Put the machine back to a snapshot -- only pages that differ are copied.
+
+        Containers are updated in place as the decoded engine holds on to them.
+        """
+        base_pages = self.base_pages or [None] * PAGE_COUNT
+        for page, dirty in enumerate(self.dirty_pages):
+            if dirty or base_pages[page] is not snap.pages[page]:
+                start = page << PAGE_SHIFT
+                self.stream[start : start + PAGE_SIZE] = array("H", snap.pages[page])
+                self.invalidate_code(start, start + PAGE_SIZE)
+
+        self.base_pages = snap.pages
+        self.dirty_pages[:] = bytes(PAGE_COUNT)
+
+        self.register_file[:] = array("H", snap.registers)
+        self.stack[:] = snap.stack
+        self.pointer = snap.pointer
+        self.character_input = deque(snap.character_input)
+        self.at_line_start = snap.at_line_start
+        self.triggers.state = snap.output_state
 
     def register_check(self, arg):
         if isinstance(arg, int) is False:
@@ -419,30 +1027,233 @@ class Machine:
         return arg
 
     @staticmethod
-    def get_data_stream(file) -> List[int]:
-        collector: List[int] = list()
+    def get_data_stream(file, cache_dir: Optional[str] = None) -> array:
+        """Read the whole program in one go and decode it into 16 bit words.
+
+        When a cache_dir is given the validated image is stored there keyed by the
+        file's path, size and modification time, so later launches skip reading and
+        checking the binary and just read the image back.  A cached image whose
+        header or length don't check out is decoded again and replaced.
+        """
+        if cache_dir is None:
+            return Machine.decode_image(Machine.read_binary(file))
+
+        status = os.stat(file)
+        key = f"{os.path.abspath(file)}\0{status.st_size}\0{status.st_mtime_ns}"
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        cache_file = os.path.join(
+            cache_dir, f"{digest}.{sys.byteorder}.v{IMAGE_CACHE_VERSION}.image"
+        )
+        if os.path.exists(cache_file):
+            collector = Machine.read_cached_image(cache_file)
+            if collector is not None:
+                return collector
+
+        collector = Machine.decode_image(Machine.read_binary(file))
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file + ".tmp", "wb") as f:
+            f.write(IMAGE_HEADER.pack(IMAGE_MAGIC, IMAGE_CACHE_VERSION, len(collector)))
+            collector.tofile(f)
+        os.replace(cache_file + ".tmp", cache_file)
+        return collector
 
+    @staticmethod
+    def read_binary(file) -> bytes:
         with open(file, "rb") as f:
-            data = f.read(2)
-            while data:
-                byte = int.from_bytes(data, byteorder="little")
-                collector.append(byte)
-                data = f.read(2)
+            return f.read()
+
+    @staticmethod
+    def read_cached_image(cache_file: str) -> Optional[array]:
+        """The image stored by get_data_stream, or None if it isn't a whole one.  Its
+        words were checked before it was stored, so they aren't checked again."""
+        with open(cache_file, "rb") as f:
+            data = f.read()
+        if len(data) < IMAGE_HEADER.size:
+            return None
+        magic, version, words = IMAGE_HEADER.unpack_from(data)
+        if (
+            magic != IMAGE_MAGIC
+            or version != IMAGE_CACHE_VERSION
+            or words > MEMORY_SIZE
+            or len(data) != IMAGE_HEADER.size + 2 * words
+        ):
+            return None
+
+        collector = array("H")
+        collector.frombytes(memoryview(data)[IMAGE_HEADER.size :])
+        return collector
+
+    @staticmethod
+    def decode_image(data: bytes) -> array:
+        """Little endian words -> array, rejecting anything the machine can't hold."""
+        if len(data) % 2:
+            raise ValueError(
+                f"Program is {len(data)} bytes, which isn't a whole number of words"
+            )
+
+        collector = array("H", data)
+        if sys.byteorder == "big":
+            collector.byteswap()
+
+        if len(collector) > MEMORY_SIZE:
+            raise ValueError(
+                f"Program is {len(collector)} words, but memory only holds "
+                f"{MEMORY_SIZE}"
+            )
+
+        if collector and max(collector) > 32775:
+            address = next(i for i, word in enumerate(collector) if word > 32775)
+            raise ValueError(
+                f"Invalid value {collector[address]} found at address {address}"
+            )
 
         return collector
 
 
+class _TracerChanged(Exception):
+    """Raised by the decoded engine to swap between its plain and traced loops."""
+
+    def __init__(self, pointer: int):
+        super().__init__(pointer)
+        self.pointer = pointer
+
+
 def create_route():
     with open(r"./data/route.txt", "rt") as text:
         return text.read()
 
 
 def main():
-    route = create_route()
+    parser = argparse.ArgumentParser(description="Synacor challenge virtual machine")
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="search for the teleporter's register 8 value across a process pool",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="processes used by --sweep"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="with --sweep, run this many candidates in lockstep on one core instead",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="decoded",
+        help="compiled turns hot basic blocks into Python functions",
+    )
+    parser.add_argument(
+        "--verify-intrinsics",
+        action="store_true",
+        help="check every native subroutine call against interpreting it",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="JSON",
+        default=None,
+        help="profile the machine, printing hot spots and writing a JSON report",
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="SPEC",
+        action="append",
+        default=[],
+        help="log read:START[-STOP], write:START[-STOP], reg:R[=VALUE] or "
+        "exec:ADDRESS hits to stderr",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="where decoded program images and disassemblies are cached",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="FILE",
+        default=None,
+        help="carry on from a checkpoint instead of replaying the route",
+    )
+    parser.add_argument(
+        "--save-checkpoint",
+        metavar="FILE",
+        default=None,
+        help="replay the route, then save a checkpoint of where it ends and stop",
+    )
+    args = parser.parse_args()
+    if args.watch and args.engine == "classic":
+        parser.error("--watch needs the decoded or compiled engine")
+
     f = r"data/synacor-challenge/challenge.bin"
-    calibration_code = 32773
-    a = Machine(f, list(route), calibration_code)
-    a.process_stream()
+    if args.checkpoint is not None:
+        from checkpoints import load_checkpoint
+
+        a = Machine(f, [], engine=args.engine, cache_dir=args.cache_dir)
+        load_checkpoint(a, args.checkpoint, f)
+    else:
+        route = create_route()
+        calibration_code = solve_calibration()
+        if args.sweep:
+            if args.batch_size is not None:
+                from batch_machine import sweep_teleporter_batched
+
+                calibration_code = sweep_teleporter_batched(
+                    f, route, batch_size=args.batch_size
+                )
+            else:
+                from calibration import sweep_teleporter
+
+                calibration_code = sweep_teleporter(f, route, workers=args.workers)
+            if calibration_code is None:
+                sys.exit("No register 8 value passed the teleporter's verification")
+            print(f"Teleporter calibrated with register 32775: {calibration_code}")
+
+        if args.save_checkpoint is not None:
+            from checkpoints import save_checkpoint
+
+            a = Machine(
+                f,
+                list(route),
+                calibration_code,
+                args.engine,
+                args.cache_dir,
+                read_line=None,
+            )
+            status = a.run()
+            a.output.flush()
+            if status is not Status.NEEDS_INPUT:
+                sys.exit(f"The route left the machine {status.value}")
+            save_checkpoint(a, args.save_checkpoint, f)
+            return
+
+        a = Machine(f, list(route), calibration_code, args.engine, args.cache_dir)
+
+    # Whether from a checkpoint or the start of the route
+    a.intrinsics.verify = args.verify_intrinsics
+    for spec in args.watch:
+        add_watch(a.watchpoints, spec, LOG)
+    if args.watch:
+        a.watchpoints.report = lambda hit: print(hit, file=sys.stderr)
+    if args.profile is None:
+        a.process_stream()
+        return
+
+    from disassembler import load_disassembly
+    from profiler import Profiler
+
+    a.tracer = profiler = Profiler(a.stack)
+    try:
+        a.process_stream()
+    finally:
+        profiler.close()
+        a.output.flush()
+        # Much of the code only shows up in memory once the binary has decrypted it
+        disassembly = load_disassembly(
+            a.stream, profiler.executed, list(profiler.calls), args.cache_dir
+        )
+        print(profiler.table(disassembly=disassembly), file=sys.stderr)
+        profiler.write_json(args.profile)
 
 
 if __name__ == "__main__":
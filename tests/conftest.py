@@ -0,0 +1,55 @@
+import os
+import struct
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHALLENGE = os.path.join("data", "synacor-challenge", "challenge.bin")
+
+# Register operands
+R0, R1, R2, R3 = 32768, 32769, 32770, 32771
+
+# Counts r1 up to 40, adding 1 to r0 each time round -- until r1 reaches 30, when it
+# patches a word of the loop with wmem.
+# fmt: off
+LOOP = [
+    21,
+    1, R1, 0,           # 1   set r1 0
+    9, R0, R0, 1,       # 4   add r0 r0 1       the 1 is at 7
+    9, R1, R1, 1,       # 8   add r1 r1 1
+    4, R2, R1, 30,      # 12  eq r2 r1 30       fused with the jf
+    8, R2, 22,          # 16  jf r2 22
+    16, 0, 0,           # 19  wmem <address> <value>, filled in below
+    4, R3, R1, 40,      # 22  eq r3 r1 40       the 40 is at 25, fused with the jf
+    8, R3, 4,           # 26  jf r3 4
+    0,                  # 29  halt
+]
+# fmt: on
+
+
+def patched_loop(address: int, value: int):
+    """LOOP with its wmem writing value to address."""
+    program = list(LOOP)
+    program[20:22] = [address, value]
+    return program
+
+
+@pytest.fixture(autouse=True)
+def repository_root(monkeypatch):
+    """The modules open data/ relative to the working directory."""
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def make_binary(tmp_path):
+    """Write a program of 16 bit words out as a binary, giving its path."""
+
+    def make(words):
+        path = tmp_path / "program.bin"
+        path.write_bytes(struct.pack(f"<{len(words)}H", *words))
+        return str(path)
+
+    return make
@@ -0,0 +1,65 @@
+import pytest
+
+from calibration import TELEPORTER, HeadlessMachine, attempt, teleporter_snapshot
+from conftest import CHALLENGE, R0, R1
+from synacore_challenge import Machine, Status, create_route
+
+numpy = pytest.importorskip("numpy")
+
+from batch_machine import BatchMachine  # noqa: E402
+
+
+def test_lanes_match_single_machines_at_the_teleporter():
+    snapshot = teleporter_snapshot(CHALLENGE, create_route())
+    machine = HeadlessMachine(CHALLENGE, [])
+    machine.restore(snapshot)
+
+    candidates = [1, 2, 300, 25734]
+    batch = BatchMachine(machine, len(candidates))
+    batch.registers[7] = candidates
+    batch.feed(TELEPORTER)
+    statuses = batch.run()
+
+    for lane, candidate in enumerate(candidates):
+        passed = attempt(machine, snapshot, candidate)
+        assert batch.output_text(lane) == machine.output.getvalue()
+        assert statuses[lane] is Status.NEEDS_INPUT
+        assert passed is (candidate == 25734)
+
+
+# Counts r1 down from the r0 it starts with, printing a '*' each time round, then
+# pushes r0 through a call and halts with ret on an empty stack when r0 was odd.
+# fmt: off
+DIVERGING = [
+    21,
+    19, 42,             # 1   out '*'
+    9, R1, R1, 32767,   # 3   add r1 r1 -1
+    7, R1, 1,           # 7   jt r1 1
+    12, R1, R0, 1,      # 10  and r1 r0 1
+    7, R1, 21,          # 14  jt r1 21
+    17, 22,             # 17  call 22
+    0,                  # 19  halt
+    21,                 # 20
+    18,                 # 21  ret -- nothing on the stack
+    2, R0,              # 22  push r0
+    3, R1,              # 24  pop r1
+    18,                 # 26  ret
+]
+# fmt: on
+
+
+def test_lanes_that_branch_apart_match_single_machines(make_binary):
+    file = make_binary(DIVERGING)
+    starts = [1, 2, 5, 8]
+    batch = BatchMachine(Machine(file, [], read_line=None), len(starts))
+    batch.registers[0] = starts
+    batch.registers[1] = starts
+    statuses = batch.run()
+
+    for lane, start in enumerate(starts):
+        single = HeadlessMachine(file, [])
+        single.register_file[0] = single.register_file[1] = start
+        assert statuses[lane] is single.run()
+        assert batch.exit_codes[lane] == single.exit_code
+        assert batch.output_text(lane) == single.output.getvalue() == "*" * start
+        assert batch.registers[:, lane].tolist() == single.register_file.tolist()
@@ -0,0 +1,70 @@
+import pytest
+
+from block_compiler import HOT_THRESHOLD
+from conftest import LOOP, R0, R1, R2, patched_loop
+from synacore_challenge import PAGE_SIZE, Machine, Status
+
+
+def test_hot_blocks_are_compiled(make_binary):
+    machine = Machine(make_binary(LOOP), [], engine="compiled", read_line=None)
+    assert machine.run() is Status.HALTED
+    assert machine.register_file[0] == 40
+    # The loop body, from the add at 4 through the jf at 16
+    assert machine.compiler.blocks[4] is not None
+    assert machine.compiler.ends[4] == 19
+    assert machine.compiler.hits[4] == HOT_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "address, value, expected",
+    [
+        # The add in the hot block compiled from 4 -- 30 rounds of 1, then 10 of 2
+        (7, 2, 50),
+        # The compare at the end of it -- the loop now runs to 45
+        (25, 45, 45),
+    ],
+)
+def test_writes_into_a_compiled_block_are_picked_up(
+    make_binary, address, value, expected
+):
+    program = patched_loop(address, value)
+    machine = Machine(make_binary(program), [], engine="compiled", read_line=None)
+    assert machine.run() is Status.HALTED
+    assert machine.register_file[0] == expected
+
+
+def test_a_block_writing_into_itself_leaves_after_the_write(make_binary):
+    # fmt: off
+    program = [
+        21,
+        9, R0, R0, 1,       # 1   add r0 r0 1
+        16, 11, R0,         # 5   wmem 11 r0        the 1 below becomes r0
+        9, R1, R1, 1,       # 8   add r1 r1 1
+        4, R2, R0, 20,      # 12  eq r2 r0 20
+        8, R2, 1,           # 16  jf r2 1
+        0,                  # 19  halt
+    ]
+    # fmt: on
+    machine = Machine(make_binary(program), [], engine="compiled", read_line=None)
+    assert machine.run() is Status.HALTED
+    # 1 + 2 + ... + 20, rather than whatever the block was compiled with
+    assert machine.register_file[1] == 210
+
+
+def test_compiled_writes_mark_their_page_dirty(make_binary):
+    # fmt: off
+    program = [
+        21,
+        16, 1000, R0,       # 1   wmem 1000 r0
+        9, R0, R0, 1,       # 4   add r0 r0 1
+        4, R1, R0, 40,      # 8   eq r1 r0 40
+        8, R1, 1,           # 12  jf r1 1
+        0,                  # 15  halt
+    ]
+    # fmt: on
+    machine = Machine(make_binary(program), [], engine="compiled", read_line=None)
+    machine.snapshot()
+    assert machine.run() is Status.HALTED
+    assert machine.compiler.blocks[1] is not None
+    dirty = [page for page, flag in enumerate(machine.dirty_pages) if flag]
+    assert dirty == [1000 // PAGE_SIZE]
@@ -0,0 +1,81 @@
+import io
+import json
+import sys
+
+import pytest
+
+import synacore_challenge
+from checkpoints import StaleCheckpoint, load_checkpoint, save_checkpoint
+from confirmation import solve_calibration
+from conftest import CHALLENGE
+from output_sinks import CollectorSink
+from synacore_challenge import Machine, Status, create_route
+
+
+def machine(route: str = "") -> Machine:
+    return Machine(CHALLENGE, list(route), output=CollectorSink(), read_line=None)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    lines = create_route().splitlines()
+    original = machine("\n".join(lines[:20]) + "\n")
+    assert original.run() is Status.NEEDS_INPUT
+    original.character_input.extend("look")
+    path = str(tmp_path / "game.checkpoint")
+    save_checkpoint(original, path, CHALLENGE)
+
+    loaded = machine()
+    load_checkpoint(loaded, path, CHALLENGE)
+    assert loaded.stream == original.stream
+    assert loaded.register_file == original.register_file
+    assert loaded.stack == original.stack
+    assert loaded.pointer == original.pointer
+    assert list(loaded.character_input) == list(original.character_input)
+    assert loaded.at_line_start == original.at_line_start
+
+    # Both carry on the same way
+    rest = "\n" + "\n".join(lines[20:30]) + "\n"
+    for each in (original, loaded):
+        each.output.clear()
+        each.character_input.extend(rest)
+        assert each.run() is Status.NEEDS_INPUT
+    assert loaded.output.getvalue() == original.output.getvalue()
+
+
+def test_checkpoint_from_another_binary_is_refused(tmp_path, make_binary):
+    original = machine()
+    original.run()
+    path = str(tmp_path / "game.checkpoint")
+    save_checkpoint(original, path, CHALLENGE)
+
+    with pytest.raises(StaleCheckpoint):
+        load_checkpoint(machine(), path, make_binary([21, 0]))
+
+
+def test_resumed_checkpoint_is_watched_and_profiled(tmp_path, monkeypatch, capsys):
+    lines = create_route().splitlines()
+    teleporter = lines.index("use teleporter")
+    original = Machine(
+        CHALLENGE,
+        list("\n".join(lines[:teleporter]) + "\n"),
+        solve_calibration(),
+        read_line=None,
+    )
+    original.run()
+    path = str(tmp_path / "game.checkpoint")
+    save_checkpoint(original, path, CHALLENGE)
+    capsys.readouterr()
+
+    profile = tmp_path / "profile.json"
+    argv = [
+        "synacore_challenge.py",
+        f"--checkpoint={path}",
+        "--watch=reg:7",
+        f"--profile={profile}",
+    ]
+    monkeypatch.setattr(sys, "argv", argv)
+    monkeypatch.setattr(sys, "stdin", io.StringIO("use teleporter\n"))
+    with pytest.raises(EOFError):
+        synacore_challenge.main()
+    assert f"r7 = {solve_calibration()}" in capsys.readouterr().err
+    assert json.loads(profile.read_text())["instructions"] > 0
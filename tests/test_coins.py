@@ -0,0 +1,49 @@
+import itertools
+
+import pytest
+
+import coins
+from coins import coin_value, parse_equation, solutions
+
+MONUMENT = """
+There is a strange monument in the center of the hall with circular slots and
+unusual symbols.  It reads:
+
+_ + _ * _^2 + _^3 - _ = 399
+"""
+
+# red, corroded, shiny, concave, blue
+VALUES = [2, 3, 5, 7, 9]
+
+
+def test_parse_equation():
+    equation = parse_equation(MONUMENT)
+    assert (equation.slots, equation.total) == (5, 399)
+    assert equation.evaluate([9, 2, 5, 7, 3]) == 399
+
+
+@pytest.mark.parametrize("with_numpy", [True, False])
+def test_solutions(monkeypatch, with_numpy):
+    if with_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(coins, "numpy", None)
+    orders = list(solutions(parse_equation(MONUMENT), VALUES))
+    assert [[VALUES[index] for index in order] for order in orders] == [[9, 2, 5, 7, 3]]
+
+
+@pytest.mark.parametrize("count, length", [(5, 5), (7, 4), (9, 6)])
+def test_permutation_tables_are_chunked_in_order(monkeypatch, count, length):
+    numpy = pytest.importorskip("numpy")
+    monkeypatch.setattr(coins, "BATCH_SIZE", 100)
+    tables = list(coins.permutation_tables(count, length))
+    assert max(len(table) for table in tables) <= 100
+    rows = [tuple(row) for row in numpy.concatenate(tables).tolist()]
+    assert rows == list(itertools.permutations(range(count), length))
+
+
+def test_coin_value():
+    assert coin_value("It has a triangle on one side.") == 3
+    assert coin_value("It has seven dots on one side.") == 7
+    with pytest.raises(ValueError):
+        coin_value("It is a coin.")
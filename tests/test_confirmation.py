@@ -0,0 +1,53 @@
+import functools
+import sys
+
+import pytest
+
+from confirmation import (
+    CALL_ARGUMENTS,
+    EXPECTED,
+    MODULO,
+    confirmation,
+    fast_confirmation,
+    memoized_confirmation,
+    solve_calibration,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def naive(m: int, n: int, h: int) -> int:
+    """The routine at 6027 as written, recursion and all."""
+    if m == 0:
+        return (n + 1) % MODULO
+    if n == 0:
+        return naive(m - 1, h, h)
+    return naive(m - 1, naive(m, n - 1, h), h)
+
+
+@pytest.fixture(autouse=True)
+def deep_recursion():
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(20000)
+    yield
+    sys.setrecursionlimit(limit)
+
+
+@pytest.mark.parametrize("m", [0, 1, 2, 3])
+@pytest.mark.parametrize("h", [1, 2, 3, 7])
+def test_closed_forms_match_the_recursion(m, h):
+    for n in range(6):
+        expected = naive(m, n, h)
+        assert fast_confirmation(m, n, h) == expected
+        assert memoized_confirmation(m, n, h) == expected
+        assert confirmation(m, n, h) == expected
+
+
+@pytest.mark.parametrize("h", [1, 2])
+def test_row_four_matches_the_memoized_evaluation(h):
+    for n in range(3):
+        assert fast_confirmation(4, n, h) == memoized_confirmation(4, n, h)
+
+
+def test_calibration_solves_the_teleporter():
+    h = solve_calibration()
+    assert confirmation(*CALL_ARGUMENTS, h) == EXPECTED
@@ -0,0 +1,46 @@
+import disassembler
+from conftest import R0, R1
+from disassembler import disassemble, load_disassembly
+
+# fmt: off
+PROGRAM = [
+    21,                 # 0   noop
+    17, 9,              # 1   call 9
+    15, R0, 100,        # 3   rmem r0 100
+    6, 15,              # 6   jmp 15
+    0,                  # 8   never reached
+    21,                 # 9   noop          the function called at 1
+    16, 101, R1,        # 10  wmem 101 r1
+    18,                 # 13  ret
+    21,                 # 14  never reached
+    0,                  # 15  halt
+]
+# fmt: on
+
+
+def test_index_finds_instructions_blocks_and_functions():
+    result = disassemble(PROGRAM)
+    assert sorted(result.instructions) == [0, 1, 3, 6, 9, 10, 13, 15]
+    # Operand words belong to their instruction
+    assert result.instruction_at(5).address == 3
+    assert result.instruction_at(8) is None
+    assert result.functions == {9: [1]}
+    assert result.function_at(12) == 9
+    assert result.writes == {101: [10]}
+    assert result.function_at(3) is None
+    assert result.reads == {100: [3]}
+    assert result.block_at(4).start == 3
+    assert result.blocks[3].successors == (15,)
+
+
+def test_cached_disassembly_is_reused(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    first = load_disassembly(PROGRAM, cache_dir=cache_dir)
+
+    def disassemble(*args):
+        raise AssertionError("disassembled again")
+
+    monkeypatch.setattr(disassembler, "disassemble", disassemble)
+    cached = load_disassembly(PROGRAM, cache_dir=cache_dir)
+    assert cached.instructions == first.instructions
+    assert cached.functions == first.functions
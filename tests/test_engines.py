@@ -0,0 +1,37 @@
+import pytest
+
+from conftest import CHALLENGE
+from confirmation import solve_calibration
+from output_sinks import CollectorSink
+from synacore_challenge import ENGINES, Machine, NeedsInput, create_route
+
+
+def play(engine: str, file: str, route: str, override: int = 0) -> str:
+    machine = Machine(file, list(route), override, engine, output=CollectorSink())
+    machine.read_line = None
+    try:
+        if engine == "classic":
+            machine.interpret_stream()
+        else:
+            machine.execute_stream()
+    except NeedsInput:
+        pass
+    return machine.output.getvalue()
+
+
+def test_engines_print_the_same_for_the_route():
+    route = create_route()
+    override = solve_calibration()
+    outputs = {engine: play(engine, CHALLENGE, route, override) for engine in ENGINES}
+    assert outputs["decoded"] == outputs["classic"]
+    assert outputs["compiled"] == outputs["classic"]
+    assert "Congratulations; you have reached the end of the challenge!" in (
+        outputs["classic"]
+    )
+
+
+def test_literal_register_operand_is_rejected(make_binary):
+    # set 5 1 -- a literal where a register has to be
+    machine = Machine(make_binary([21, 1, 5, 1, 0]), [], read_line=None)
+    with pytest.raises(ValueError, match="address 2"):
+        machine.run()
@@ -0,0 +1,43 @@
+from confirmation import solve_calibration
+from conftest import CHALLENGE
+from explorer import Explorer, ExplorerMachine, commands, play
+
+LOOK = """
+== Foothills ==
+You find yourself standing at the base of an enormous mountain.
+
+Things of interest here:
+- tablet
+
+There are 2 exits:
+- doorway
+- south
+
+What do you do?
+Your inventory:
+- lantern
+
+What do you do?
+"""
+
+
+def test_commands_come_from_the_listings():
+    assert commands(LOOK) == ["doorway", "south", "take tablet", "use lantern"]
+
+
+def test_found_routes_lead_where_they_say():
+    explorer = Explorer(CHALLENGE)
+    found = explorer.explore(max_depth=2, workers=1)
+    assert ("code", ("take tablet", "use tablet")) in [
+        (each.kind, each.route) for each in found
+    ]
+    for each in found:
+        # Replaying the route shows the room or code last of all
+        machine = ExplorerMachine(CHALLENGE, [], solve_calibration())
+        _, text = play(machine, "")
+        for command in each.route:
+            _, text = play(machine, command + "\n")
+        if each.kind == "room":
+            assert each.name.split(": ", 1)[1] in text
+        else:
+            assert each.name in text
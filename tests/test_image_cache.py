@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from conftest import CHALLENGE
+from synacore_challenge import Machine
+
+
+def test_cached_image_is_read_back_without_the_binary(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    image = Machine.get_data_stream(CHALLENGE, cache_dir)
+    assert image == Machine.get_data_stream(CHALLENGE)
+    assert len(os.listdir(cache_dir)) == 1
+
+    def read_binary(file):
+        raise AssertionError("the binary was read again")
+
+    monkeypatch.setattr(Machine, "read_binary", staticmethod(read_binary))
+    assert Machine.get_data_stream(CHALLENGE, cache_dir) == image
+
+
+def test_changed_binary_is_decoded_again(tmp_path, make_binary):
+    cache_dir = str(tmp_path / "cache")
+    file = make_binary([21, 0])
+    assert Machine.get_data_stream(file, cache_dir).tolist() == [21, 0]
+    file = make_binary([21, 21, 0])
+    assert Machine.get_data_stream(file, cache_dir).tolist() == [21, 21, 0]
+
+
+def test_damaged_image_is_replaced(tmp_path, make_binary):
+    cache_dir = str(tmp_path / "cache")
+    file = make_binary([21, 19, 65, 0])
+    Machine.get_data_stream(file, cache_dir)
+    (cache_file,) = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    with open(cache_file, "r+b") as f:
+        f.truncate(os.path.getsize(cache_file) - 2)
+
+    assert Machine.get_data_stream(file, cache_dir).tolist() == [21, 19, 65, 0]
+    assert Machine.read_cached_image(cache_file).tolist() == [21, 19, 65, 0]
+
+
+def test_odd_length_binary_is_rejected(tmp_path):
+    file = tmp_path / "odd.bin"
+    file.write_bytes(b"\x15\x00\x00")
+    with pytest.raises(ValueError, match="3 bytes"):
+        Machine.get_data_stream(str(file))
+
+
+def test_values_past_the_registers_are_rejected(make_binary):
+    with pytest.raises(ValueError, match="address 1"):
+        Machine.get_data_stream(make_binary([21, 32776]))
@@ -0,0 +1,71 @@
+import pytest
+
+from conftest import CHALLENGE
+from intrinsics import FOR_EACH, XOR, IntrinsicMismatch
+from output_sinks import CollectorSink
+from synacore_challenge import Machine, Status, create_route
+
+ROUTE = "\n".join(create_route().splitlines()[:10]) + "\n"
+
+
+def machine(natives: bool = True, verify: bool = False) -> Machine:
+    result = Machine(CHALLENGE, list(ROUTE), output=CollectorSink(), read_line=None)
+    if not natives:
+        result.intrinsics.natives.clear()
+    result.intrinsics.verify = verify
+    return result
+
+
+def counted(machine: Machine, address: int):
+    calls = list()
+    native = machine.intrinsics.natives[address]
+
+    def count(write):
+        calls.append(address)
+        return native(write)
+
+    machine.intrinsics.register(address, count)
+    return calls
+
+
+def test_challenge_registers_its_routines():
+    assert set(machine().intrinsics.natives) == {FOR_EACH, XOR}
+
+
+def test_natives_match_the_interpreted_routines():
+    interpreted = machine(natives=False)
+    assert interpreted.run() is Status.NEEDS_INPUT
+
+    verified = machine(verify=True)
+    calls = counted(verified, FOR_EACH)
+    assert verified.run() is Status.NEEDS_INPUT
+    assert calls
+    assert verified.output.getvalue() == interpreted.output.getvalue()
+    assert verified.register_file == interpreted.register_file
+    assert verified.stack == interpreted.stack
+
+
+def test_verify_catches_a_wrong_native():
+    verified = machine(verify=True)
+
+    def wrong_xor(write):
+        verified.register_file[0] ^= verified.register_file[1] ^ 1
+        return True
+
+    verified.intrinsics.register(XOR, wrong_xor)
+    with pytest.raises(IntrinsicMismatch, match="registers"):
+        verified.run()
+
+
+def test_natives_are_left_alone_once_the_code_changes():
+    changed = machine()
+    calls = counted(changed, XOR)
+    # The routine never changes r1, so saving it is only a nicety
+    for address in (XOR, XOR + 1, XOR + 21, XOR + 22):
+        changed.stream[address] = 21
+    changed.invalidate_code()
+    assert changed.run() is Status.NEEDS_INPUT
+    assert not calls
+    original = machine()
+    original.run()
+    assert changed.output.getvalue() == original.output.getvalue()
@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+from output_sinks import CollectorSink, NullSink, OutputSink, TextSink
+from synacore_challenge import Machine, Status
+
+
+def test_text_sink_writes_whole_lines():
+    stream = io.StringIO()
+    sink = TextSink(stream)
+    sink.write("a")
+    sink.write("b")
+    assert stream.getvalue() == ""
+    sink.write("\n")
+    assert stream.getvalue() == "ab\n"
+    sink.write("c")
+    sink.flush()
+    assert stream.getvalue() == "ab\nc"
+
+
+def test_collector_and_null_sinks():
+    collector = CollectorSink()
+    collector.write("ab")
+    collector.write("c")
+    assert collector.getvalue() == "abc"
+    collector.clear()
+    assert collector.getvalue() == ""
+    NullSink().write("anything")
+
+
+def test_sink_must_write():
+    with pytest.raises(TypeError):
+        OutputSink()
+
+
+def test_output_is_flushed_before_reading(make_binary):
+    # out 'a', in r0
+    stream = io.StringIO()
+    program = make_binary([21, 19, 97, 20, 32768, 0])
+    machine = Machine(program, [], output=TextSink(stream), read_line=None)
+    assert machine.run() is Status.NEEDS_INPUT
+    assert stream.getvalue() == "a"
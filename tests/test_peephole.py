@@ -0,0 +1,43 @@
+import pytest
+
+from conftest import LOOP, R0, R1, patched_loop
+from synacore_challenge import Machine, Status
+
+
+def test_compare_and_branch_is_fused(make_binary):
+    machine = Machine(make_binary(LOOP), [], read_line=None)
+    entry = machine.decode(12)
+    assert entry[0] is machine.peephole.pairs[(4, 8)]
+    assert entry[1] == 19
+
+
+def test_pushes_are_fused_up_to_the_limit(make_binary):
+    machine = Machine(make_binary([21] + [2, R0] * 10 + [0]), [], read_line=None)
+    entry = machine.decode(1)
+    assert entry[0] is machine.peephole.push_run
+    # Eight two word pushes fit in sixteen words
+    assert entry[1] == 17
+
+
+def test_pops_short_of_the_stack_stop_on_the_empty_pop(make_binary):
+    # push 5, pop r0, pop r1
+    machine = Machine(make_binary([21, 2, 5, 3, R0, 3, R1, 0]), [], read_line=None)
+    with pytest.raises(IndexError):
+        machine.run()
+    assert machine.register_file[0] == 5
+    assert machine.pointer + 1 == 5
+
+
+@pytest.mark.parametrize(
+    "address, value, expected",
+    [
+        # The compare of the fused eq + jf at 22 -- the loop now runs to 45
+        (25, 45, 45),
+        # The target of the fused jf -- straight to the halt
+        (28, 29, 30),
+    ],
+)
+def test_writes_into_a_fused_range_are_picked_up(make_binary, address, value, expected):
+    machine = Machine(make_binary(patched_loop(address, value)), [], read_line=None)
+    assert machine.run() is Status.HALTED
+    assert machine.register_file[0] == expected
@@ -0,0 +1,66 @@
+import json
+
+from conftest import R0
+from profiler import Profiler
+from synacore_challenge import Machine, Status
+
+# fmt: off
+PROGRAM = [
+    21,
+    17, 8,              # 1   call 8
+    17, 5,              # 3   call 5 -- the very next instruction
+    21,                 # 5   noop
+    0,                  # 6   halt
+    21,                 # 7
+    2, R0,              # 8   push r0
+    3, R0,              # 10  pop r0
+    18,                 # 12  ret
+]
+# fmt: on
+
+
+def profile(make_binary, program) -> Profiler:
+    machine = Machine(make_binary(program), [], read_line=None)
+    machine.tracer = profiler = Profiler(machine.stack)
+    machine.run()
+    return profiler
+
+
+def test_counts_per_op_code_address_and_call(make_binary):
+    profiler = profile(make_binary, PROGRAM)
+    # call 5 is a call like any other, even though it lands where it would anyway
+    assert profiler.calls == {8: 1, 5: 1}
+    assert profiler.addresses[8] == 1
+    assert profiler.op_codes[17] == 2
+    assert profiler.depth == 1
+    assert profiler.max_depth == 1
+
+
+def test_ret_on_an_empty_stack_leaves_the_depth_at_zero(make_binary):
+    # ret, halting with nothing to return to
+    profiler = profile(make_binary, [21, 18])
+    assert profiler.depth == 0
+    assert profiler.max_depth == 0
+
+
+def test_depth_follows_returns(make_binary):
+    # call 4, halt, ret
+    machine = Machine(make_binary([21, 17, 4, 0, 18]), [], read_line=None)
+    machine.tracer = profiler = Profiler(machine.stack)
+    assert machine.run(max_steps=1) is Status.BUDGET_EXHAUSTED
+    assert profiler.depth == 1
+    assert machine.run() is Status.HALTED
+    assert profiler.depth == 0
+    assert profiler.max_depth == 1
+
+
+def test_report_is_json(make_binary, tmp_path):
+    profiler = profile(make_binary, PROGRAM)
+    profiler.close()
+    path = tmp_path / "profile.json"
+    profiler.write_json(str(path))
+    report = json.loads(path.read_text())
+    assert report["engine"] == "stepped"
+    assert report["op_codes"]["call"] == 2
+    assert report["max_call_depth"] == 1
+    assert "max call depth 1" in profiler.table()
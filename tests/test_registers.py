@@ -0,0 +1,23 @@
+import pytest
+
+from conftest import R0, R1
+from synacore_challenge import Machine, Status
+
+
+def test_registers_view_reads_and_writes_the_register_file(make_binary):
+    machine = Machine(make_binary([21, 0]), [], read_line=None)
+    machine.registers[32775] = 25734
+    assert machine.register_file[7] == 25734
+    assert list(machine.registers) == list(range(32768, 32776))
+    with pytest.raises(KeyError):
+        machine.registers[32776]
+    with pytest.raises(TypeError):
+        del machine.registers[32768]
+
+
+def test_characters_too_big_for_a_register_are_replaced(make_binary):
+    # in r0, in r1
+    program = make_binary([21, 20, R0, 20, R1, 0])
+    machine = Machine(program, list("a\U0001f600"), read_line=None)
+    assert machine.run() is Status.HALTED
+    assert machine.register_file.tolist()[:2] == [ord("a"), ord("?")]
@@ -0,0 +1,54 @@
+from conftest import CHALLENGE
+from explorer import ExplorerMachine, play
+from route_cache import RouteCache
+from synacore_challenge import Status, create_route
+
+LINES = create_route().splitlines()[:10]
+
+
+def route(lines) -> str:
+    return "".join(f"{line}\n" for line in lines)
+
+
+def distinct_bytes(cache: RouteCache) -> int:
+    """Bytes of the pages the cached snapshots hold, counting shared pages once."""
+    pages = {
+        id(page): len(page) for node in cache.recent for page in node.snapshot.pages
+    }
+    return sum(pages.values())
+
+
+def test_variations_replay_only_what_changed():
+    cache = RouteCache(CHALLENGE)
+    assert cache.run(route(LINES))[0] is Status.NEEDS_INPUT
+    assert (cache.skipped, cache.replayed) == (0, 10)
+
+    variation = [*LINES[:8], "inv"]
+    status, text = cache.run(route(variation))
+    assert status is Status.NEEDS_INPUT
+    assert (cache.skipped, cache.replayed) == (8, 1)
+
+    fresh = ExplorerMachine(CHALLENGE, [], cache.machine.override)
+    play(fresh, route(LINES[:8]))
+    assert text == play(fresh, "inv\n")[1]
+
+
+def test_pages_are_counted_once_and_freed_with_their_last_snapshot():
+    cache = RouteCache(CHALLENGE)
+    cache.run(route(LINES))
+    assert len(cache.recent) == 11
+    assert cache.used == distinct_bytes(cache)
+
+    # Over budget everything goes but the root and the snapshot just taken
+    cache.budget = 0
+    cache.run(route([*LINES, "inv"]))
+    node = cache.root
+    for line in [*LINES, "inv"]:
+        # Only the path to the snapshot kept is left in the trie
+        assert list(node.children) == [line]
+        node = node.children[line]
+    assert list(cache.recent) == [cache.root, node]
+    assert cache.used == distinct_bytes(cache)
+    assert len(cache.page_references) == len(
+        {id(page) for node in cache.recent for page in node.snapshot.pages}
+    )
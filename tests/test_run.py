@@ -0,0 +1,54 @@
+import pytest
+
+from conftest import LOOP, R0, patched_loop
+from output_sinks import CollectorSink
+from synacore_challenge import Machine, Status
+
+# Reads a character and prints it back
+ECHO = [21, 20, R0, 19, R0, 0]
+
+
+def machine(file: str, engine: str = "decoded") -> Machine:
+    return Machine(file, [], engine=engine, output=CollectorSink(), read_line=None)
+
+
+@pytest.mark.parametrize("engine", ["decoded", "compiled"])
+def test_budget_runs_pick_up_where_they_stopped(make_binary, engine):
+    # The wmem writes over the unused word at 0
+    file = make_binary(patched_loop(0, 21))
+    whole = machine(file, engine)
+    assert whole.run() is Status.HALTED
+
+    sliced = machine(file, engine)
+    runs = 1
+    while sliced.run(7) is Status.BUDGET_EXHAUSTED:
+        assert sliced.steps_left == 0
+        runs += 1
+    assert runs > 1
+    assert sliced.exit_code == 0
+    assert sliced.register_file == whole.register_file
+
+
+def test_predicate_stops_after_the_instruction(make_binary):
+    stepped = machine(make_binary(LOOP))
+    status = stepped.run_until(lambda m: m.register_file[0] == 10)
+    assert status is Status.BREAKPOINT
+    assert stepped.register_file[0] == 10
+    # Stopped just after the add r0 r0 1
+    assert stepped.pointer + 1 == 8
+
+    # Carrying on runs to the end
+    assert stepped.run() is Status.HALTED
+    assert stepped.register_file[0] == 40
+
+
+def test_needs_input_then_carries_on(make_binary):
+    echo = machine(make_binary(ECHO))
+    assert echo.run() is Status.NEEDS_INPUT
+    assert echo.pointer + 1 == 1
+    assert echo.exit_code is None
+
+    echo.character_input.extend("x")
+    assert echo.run() is Status.HALTED
+    assert echo.output.getvalue() == "x"
+    assert echo.exit_code == 0
@@ -0,0 +1,78 @@
+import asyncio
+
+from conftest import CHALLENGE
+from output_sinks import CollectorSink
+from sessions import Session
+from synacore_challenge import Machine, create_route
+
+
+def lines(route: str):
+    """A line reader giving route a line at a time, then None."""
+    pending = route.splitlines()
+
+    async def read_line():
+        return pending.pop(0) if pending else None
+
+    return read_line
+
+
+def solo(route: str) -> str:
+    """What a machine on its own prints for the route."""
+    machine = Machine(CHALLENGE, list(route), output=CollectorSink(), read_line=None)
+    machine.run()
+    return machine.output.getvalue()
+
+
+def writer(output: list):
+    async def write(text: str):
+        output.append(text)
+
+    return write
+
+
+def test_sessions_keep_their_own_state():
+    route = create_route().splitlines()
+    routes = ["\n".join(route[:8]) + "\n", "\n".join(route[:3] + ["inv"]) + "\n"]
+    written = [list(), list()]
+    sessions = [
+        Session(CHALLENGE, lines(each), writer(output))
+        for each, output in zip(routes, written)
+    ]
+
+    async def run_all():
+        await asyncio.gather(*(session.run() for session in sessions))
+
+    asyncio.run(run_all())
+    for each, output in zip(routes, written):
+        assert "".join(output) == solo(each)
+    first, second = (session.machine for session in sessions)
+    assert first.register_file is not second.register_file
+    assert first.stack is not second.stack
+    assert first.stream is not second.stream
+
+
+def test_session_ends_when_its_machine_halts(make_binary):
+    written = list()
+    session = Session(
+        make_binary([21, 19, 65, 0]), lines("never read\n"), writer(written)
+    )
+    asyncio.run(session.run())
+    assert written == ["A"]
+    assert session.machine.exit_code == 0
+
+
+def test_busy_session_lets_the_others_run(make_binary):
+    # jmp 1, forever
+    busy = Session(make_binary([21, 6, 1]), lines(""), writer(list()), slice_steps=100)
+    written = list()
+    route = "\n".join(create_route().splitlines()[:3]) + "\n"
+    other = Session(CHALLENGE, lines(route), writer(written), slice_steps=100)
+
+    async def run_both():
+        spinning = asyncio.ensure_future(busy.run())
+        await other.run()
+        assert not spinning.done()
+        spinning.cancel()
+
+    asyncio.run(run_both())
+    assert "".join(written) == solo(route)
@@ -0,0 +1,59 @@
+from conftest import R0
+from output_sinks import CollectorSink
+from synacore_challenge import PAGE_SIZE, Machine, Status
+
+# Writes the words either side of the boundary between pages 0 and 1, waits for a
+# character, then writes them again along with the last word of page 1.
+# fmt: off
+PROGRAM = [
+    21,
+    16, PAGE_SIZE - 1, 1,
+    16, PAGE_SIZE, 2,
+    20, R0,
+    16, PAGE_SIZE - 1, 3,
+    16, PAGE_SIZE, 4,
+    16, 2 * PAGE_SIZE - 1, 5,
+    20, R0,
+    0,
+]
+# fmt: on
+
+
+def test_restore_undoes_writes_across_page_boundaries(make_binary):
+    machine = Machine(make_binary(PROGRAM), [], output=CollectorSink(), read_line=None)
+    assert machine.run() is Status.NEEDS_INPUT
+    snapshot = machine.snapshot()
+    memory = machine.stream[:]
+    registers = machine.register_file[:]
+    pointer = machine.pointer
+
+    machine.character_input.extend("a")
+    assert machine.run() is Status.NEEDS_INPUT
+    assert machine.stream[PAGE_SIZE - 1 : PAGE_SIZE + 1].tolist() == [3, 4]
+    assert machine.stream[2 * PAGE_SIZE - 1] == 5
+
+    machine.restore(snapshot)
+    assert machine.stream == memory
+    assert machine.register_file == registers
+    assert machine.pointer == pointer
+    assert machine.stream[PAGE_SIZE - 1 : PAGE_SIZE + 1].tolist() == [1, 2]
+
+    # Replaying from the snapshot ends up where the first run did
+    machine.character_input.extend("a")
+    assert machine.run() is Status.NEEDS_INPUT
+    assert machine.stream[2 * PAGE_SIZE - 1] == 5
+    assert machine.register_file[0] == ord("a")
+
+
+def test_snapshots_share_pages_not_written_since(make_binary):
+    machine = Machine(make_binary(PROGRAM), [], output=CollectorSink(), read_line=None)
+    machine.run()
+    first = machine.snapshot()
+    machine.character_input.extend("a")
+    machine.run()
+    second = machine.snapshot()
+
+    # Only pages 0 and 1 were written in between
+    assert first.pages[0] is not second.pages[0]
+    assert first.pages[1] is not second.pages[1]
+    assert all(a is b for a, b in zip(first.pages[2:], second.pages[2:]))
@@ -0,0 +1,63 @@
+from conftest import CHALLENGE, R0, R1
+from output_sinks import CollectorSink
+from synacore_challenge import Halted, Machine, NeedsInput, create_route
+from tracing import FileTracer, RingTracer, TeeTracer, TraceRecord, read_trace
+
+# fmt: off
+PROGRAM = [
+    21,
+    1, R0, 5,           # 1   set r0 5
+    9, R1, R0, 2,       # 4   add r1 r0 2
+    19, 65,             # 8   out 'A'
+    0,                  # 10  halt
+]
+# fmt: on
+
+
+def trace(file: str, engine: str, tracer, route: str = ""):
+    machine = Machine(file, list(route), engine=engine, output=CollectorSink())
+    machine.read_line = None
+    machine.tracer = tracer
+    if engine == "classic":
+        try:
+            machine.interpret_stream()
+        except (Halted, NeedsInput):
+            pass
+    else:
+        machine.run()
+    return machine
+
+
+def test_records_carry_operands_and_register_changes(make_binary):
+    ring = RingTracer()
+    machine = trace(make_binary(PROGRAM), "decoded", ring)
+    assert machine.exit_code == 0
+    assert ring.records() == [
+        TraceRecord(1, 1, (R0, 5), ((0, 5),)),
+        TraceRecord(4, 9, (R1, R0, 2), ((1, 7),)),
+        TraceRecord(8, 19, (65,), ()),
+    ]
+
+
+def test_ring_keeps_the_last_records(make_binary):
+    ring = RingTracer(size=2)
+    trace(make_binary(PROGRAM), "decoded", ring)
+    assert [record.address for record in ring.records()] == [4, 8]
+
+
+def test_file_trace_reads_back(make_binary, tmp_path):
+    path = str(tmp_path / "trace.bin")
+    ring = RingTracer()
+    with FileTracer(path) as tracer:
+        trace(make_binary(PROGRAM), "decoded", TeeTracer([tracer, ring]))
+    assert list(read_trace(path)) == ring.records()
+
+
+def test_classic_and_decoded_trace_the_same():
+    route = "\n".join(create_route().splitlines()[:5]) + "\n"
+    traces = dict()
+    for engine in ("classic", "decoded"):
+        traces[engine] = RingTracer(size=None)
+        trace(CHALLENGE, engine, traces[engine], route)
+    assert traces["classic"].records() == traces["decoded"].records()
+    assert len(traces["decoded"].records()) > 100000
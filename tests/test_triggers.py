@@ -0,0 +1,52 @@
+import pytest
+
+from triggers import Triggers
+
+
+def feed(triggers: Triggers, text: str):
+    for character in text:
+        triggers.output_character(character)
+
+
+def test_output_patterns_fire_wherever_they_end():
+    triggers = Triggers()
+    fired = list()
+    for pattern in ("he", "she", "his", "hers"):
+        triggers.on_output(pattern, lambda pattern=pattern: fired.append(pattern))
+    feed(triggers, "ushers and his")
+    # 'she' and 'he' end on the same character
+    assert sorted(fired[:2]) == ["he", "she"]
+    assert fired[2:] == ["hers", "his"]
+
+
+def test_output_patterns_overlapping_themselves():
+    triggers = Triggers()
+    fired = list()
+    triggers.on_output("aa", lambda: fired.append("aa"))
+    feed(triggers, "aaaa")
+    assert fired == ["aa"] * 3
+
+
+def test_state_survives_between_writes():
+    triggers = Triggers()
+    fired = list()
+    triggers.on_output("Nothing else", lambda: fired.append(True))
+    feed(triggers, "Nothing ")
+    feed(triggers, "else")
+    assert fired == [True]
+
+
+def test_empty_output_pattern_is_rejected():
+    with pytest.raises(ValueError):
+        Triggers().on_output("", lambda: None)
+
+
+def test_input_lines_match_by_prefix():
+    triggers = Triggers()
+    lines = list()
+    triggers.on_input_line("use orb\n", lines.append)
+    triggers.on_input_line("use", lambda line: lines.append(line.upper()))
+    triggers.input_line("use orb\n")
+    triggers.input_line("use orbit\n")
+    triggers.input_line("look\n")
+    assert lines == ["use orb\n", "USE ORB\n", "USE ORBIT\n"]
@@ -0,0 +1,36 @@
+from vault_info import Cave, LocValue, bfs, node_to_path
+
+
+def cave(pos, value, operator, last_pos=None) -> Cave:
+    return Cave(LocValue(pos, value, operator, "", last_pos))
+
+
+def test_bfs_finds_the_shortest_route_to_the_door():
+    start = cave(Cave.START_POS, Cave.START_VALUE, "")
+    result = bfs(start, Cave.goal_test, Cave.successors)
+    assert result is not None
+    path = node_to_path(result)
+    assert [each.state.direction for each in path[1:]] == [
+        "north",
+        "east",
+        "east",
+        "north",
+        "west",
+        "south",
+        "east",
+        "east",
+        "west",
+        "north",
+        "north",
+        "east",
+    ]
+    assert path[-1].state.value == Cave.GOAL
+
+
+def test_caves_are_equal_when_their_futures_are():
+    # On a number, where the orb came from no longer matters
+    assert cave((1, 0), 26, 4, (2, 0)) == cave((1, 0), 26, 4, (0, 0))
+    assert hash(cave((1, 0), 26, 4, (2, 0))) == hash(cave((1, 0), 26, 4, (0, 0)))
+    # On an operator it decides which way the orb can't go back
+    assert cave((2, 0), 22, "+", (3, 0)) != cave((2, 0), 22, "+", (1, 0))
+    assert cave((2, 0), 22, "+", (3, 0)) != cave((2, 0), 23, "+", (3, 0))
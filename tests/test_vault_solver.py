@@ -0,0 +1,65 @@
+import pytest
+
+import vault_solver
+from conftest import CHALLENGE
+from explorer import play
+from synacore_challenge import create_route
+from vault_solver import OPERATORS, Vault, VaultSolver, antechamber, map_vault
+
+VAULT = Vault(
+    (("*", 8, "-", 1), (4, "*", 11, "*"), ("+", 4, "-", 18), (22, "-", 9, "*")),
+    (3, 0),
+    (0, 3),
+    30,
+)
+
+
+def weigh(vault: Vault, moves):
+    """The orb's weight at the end of the moves, walked tile by tile."""
+    (row, column), pending = vault.start, None
+    weight = vault.grid[row][column]
+    for move in moves:
+        row += vault_solver.MOVES[move][0]
+        column += vault_solver.MOVES[move][1]
+        tile = vault.grid[row][column]
+        if isinstance(tile, str):
+            pending = tile
+        elif (row, column) == vault.start:
+            weight, pending = tile, None
+        else:
+            weight = OPERATORS[pending](weight, tile)
+    return (row, column), weight
+
+
+@pytest.mark.parametrize("dense", [True, False])
+def test_routes_reach_the_door_with_the_weight(monkeypatch, dense):
+    if not dense:
+        monkeypatch.setattr(vault_solver, "numpy", None)
+    solver = VaultSolver(VAULT).solve()
+    moves = solver.route()
+    assert len(moves) == 12
+    assert weigh(VAULT, moves) == (VAULT.door, 30)
+
+    # One sweep answers other weights too
+    assert weigh(VAULT, solver.route(23)) == (VAULT.door, 23)
+
+
+def test_dense_and_sparse_sweeps_agree(monkeypatch):
+    dense = VaultSolver(VAULT).solve(8)
+    monkeypatch.setattr(vault_solver, "numpy", None)
+    sparse = VaultSolver(VAULT).solve(8)
+    assert set(dense.reached) == set(sparse.reached)
+    for target in dense.reached:
+        assert len(dense.route(target)) == len(sparse.route(target))
+
+
+def test_the_game_opens_for_the_route():
+    machine, snapshot = antechamber(CHALLENGE, create_route())
+    vault = map_vault(machine, snapshot)
+    assert vault == VAULT
+
+    moves = VaultSolver(vault).solve().route()
+    machine.restore(snapshot)
+    play(machine, "take orb\n" + "".join(f"{move}\n" for move in moves))
+    _, text = play(machine, "vault\n")
+    assert "== Vault ==" in text
@@ -0,0 +1,78 @@
+import sys
+
+import pytest
+
+import synacore_challenge
+from conftest import CHALLENGE, R0, R1
+from confirmation import CONFIRMATION_ROUTINE, solve_calibration
+from output_sinks import CollectorSink
+from synacore_challenge import Machine, Status, create_route
+from watchpoints import BREAK, LOG, add_watch
+
+# fmt: off
+PROGRAM = [
+    21,
+    1, R0, 100,         # 1   set r0 100
+    16, 200, 7,         # 4   wmem 200 7
+    15, R1, 200,        # 7   rmem r1 200
+    9, R0, R0, 1,       # 10  add r0 r0 1
+    0,                  # 14  halt
+]
+# fmt: on
+
+
+def machine(file: str, route: str = "") -> Machine:
+    override = solve_calibration()
+    return Machine(file, list(route), override, output=CollectorSink(), read_line=None)
+
+
+@pytest.mark.parametrize(
+    "spec, expected",
+    [
+        ("write:200", "00004 write 00200 = 7"),
+        ("read:195-205", "00007 read 00200 = 7"),
+        ("reg:0=101", "00010 r0 = 101"),
+        ("exec:10", "00010 executed"),
+    ],
+)
+def test_breaks_and_carries_on(make_binary, spec, expected):
+    vm = machine(make_binary(PROGRAM))
+    add_watch(vm.watchpoints, spec, BREAK)
+    assert vm.run() is Status.BREAKPOINT
+    assert str(vm.watchpoints.hits[-1]) == expected
+    assert vm.run() is Status.HALTED
+    assert len(vm.watchpoints.hits) == 1
+    assert vm.register_file[0] == 101
+
+
+def test_register_watch_ignores_other_values(make_binary):
+    vm = machine(make_binary(PROGRAM))
+    add_watch(vm.watchpoints, "reg:0=5", BREAK)
+    assert vm.run() is Status.HALTED
+    assert vm.watchpoints.hits == []
+
+
+def test_register_set_by_a_trigger_is_seen():
+    vm = machine(CHALLENGE, create_route())
+    add_watch(vm.watchpoints, "reg:7", LOG)
+    assert vm.run() is Status.NEEDS_INPUT
+    assert [hit.value for hit in vm.watchpoints.hits] == [solve_calibration()]
+
+
+def test_execute_watch_on_the_confirmation_routine_fires_at_the_call():
+    vm = machine(CHALLENGE, create_route())
+    vm.watchpoints.on_execute(CONFIRMATION_ROUTINE)
+    assert vm.run() is Status.BREAKPOINT
+    hit = vm.watchpoints.hits[-1]
+    assert (hit.kind, hit.target) == ("execute", CONFIRMATION_ROUTINE)
+    assert vm.stream[hit.address] == 17
+    assert vm.pointer + 1 == hit.address
+    assert vm.run() is Status.NEEDS_INPUT
+    assert "Congratulations" in vm.output.getvalue()
+
+
+def test_classic_engine_refuses_watchpoints(monkeypatch):
+    argv = ["synacore_challenge.py", "--engine", "classic", "--watch", "exec:1"]
+    monkeypatch.setattr(sys, "argv", argv)
+    with pytest.raises(SystemExit):
+        synacore_challenge.main()
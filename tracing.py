@@ -0,0 +1,161 @@
+"""
+Opt-in tracing for the decoded engine.  With no tracer attached the machine runs its
+plain loop and never calls into here -- attaching one swaps in a loop that hands each
+instruction to Tracer.record along with the registers it changed.
+
+The binary trace is a header followed by one record per instruction:
+
+    address (H)  op_code (B)  operand count (B)  delta count (B)
+    operands (H each)         deltas (register index B, new value H each)
+
+all little endian.  'python tracing.py trace.bin' prints one back out.
+"""
+import struct
+import sys
+
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import BinaryIO, Deque, Iterator, List, NamedTuple, Optional, Tuple
+
+from op_codes import DESCRIPTIONS, NAMES
+from output_sinks import OutputSink
+
+TRACE_MAGIC = b"SYNTRACE"
+TRACE_VERSION = 1
+
+_HEADER = struct.Struct("<8sH")
+_RECORD = struct.Struct("<HBBB")
+_DELTA = struct.Struct("<BH")
+
+
+class TraceRecord(NamedTuple):
+    address: int
+    op_code: int
+    operands: Tuple[int, ...]
+    # (register index, new value) for every register the instruction changed
+    deltas: Tuple[Tuple[int, int], ...]
+
+
+class Tracer(ABC):
+    @abstractmethod
+    def record(
+        self,
+        address: int,
+        op_code: int,
+        operands: Tuple[int, ...],
+        deltas: Tuple[Tuple[int, int], ...],
+    ):
+        pass
+
+    def close(self):
+        pass
+
+
+def format_record(record: TraceRecord) -> str:
+    operands = " ".join(
+        f"[r{operand - 32768}]" if operand >= 32768 else f"[{operand}]"
+        for operand in record.operands
+    )
+    deltas = " ".join(f"r{index}={value}" for index, value in record.deltas)
+    line = f"{record.address:05d} {record.op_code:02d} {NAMES[record.op_code]:>6}"
+    line += f" {operands}"
+    if deltas:
+        line += f" -> {deltas}"
+    description = DESCRIPTIONS.get(record.address)
+    if description:
+        line += f"\t\t\t{description}"
+    return line
+
+
+class ConsoleTracer(Tracer):
+    """Writes each instruction through the machine's output, so it stays in step
+    with what the game prints."""
+
+    def __init__(self, output: OutputSink):
+        self.output = output
+
+    def record(self, address, op_code, operands, deltas):
+        if op_code == 19:
+            self.output.write("\n")
+        self.output.write(
+            format_record(TraceRecord(address, op_code, operands, deltas)) + "\n"
+        )
+
+
+class RingTracer(Tracer):
+    """Keeps the last 'size' instructions in memory."""
+
+    def __init__(self, size: int = 10000):
+        self.buffer: Deque[TraceRecord] = deque(maxlen=size)
+
+    def record(self, address, op_code, operands, deltas):
+        self.buffer.append(TraceRecord(address, op_code, operands, deltas))
+
+    def records(self) -> List[TraceRecord]:
+        return list(self.buffer)
+
+
+class FileTracer(Tracer):
+    """Appends compact binary records to a file -- read them back with read_trace."""
+
+    def __init__(self, file: str):
+        self.file: BinaryIO = open(file, "wb")
+        self.file.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION))
+
+    def record(self, address, op_code, operands, deltas):
+        write = self.file.write
+        write(_RECORD.pack(address, op_code, len(operands), len(deltas)))
+        write(struct.pack(f"<{len(operands)}H", *operands))
+        for index, value in deltas:
+            write(_DELTA.pack(index, value))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TeeTracer(Tracer):
+    """Hands each instruction on to several tracers."""
+
+    def __init__(self, tracers: List[Tracer]):
+        self.tracers = list(tracers)
+
+    def record(self, address, op_code, operands, deltas):
+        for tracer in self.tracers:
+            tracer.record(address, op_code, operands, deltas)
+
+    def close(self):
+        for tracer in self.tracers:
+            tracer.close()
+
+
+def read_trace(file: str) -> Iterator[TraceRecord]:
+    with open(file, "rb") as f:
+        magic, version = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError(f"{file} is not a version {TRACE_VERSION} trace")
+
+        while True:
+            header = f.read(_RECORD.size)
+            if not header:
+                return
+            address, op_code, operand_count, delta_count = _RECORD.unpack(header)
+            operands = struct.unpack(f"<{operand_count}H", f.read(2 * operand_count))
+            deltas = tuple(
+                _DELTA.unpack(f.read(_DELTA.size)) for _ in range(delta_count)
+            )
+            yield TraceRecord(address, op_code, operands, deltas)
+
+
+def main(file: Optional[str] = None):
+    for record in read_trace(file or sys.argv[1]):
+        print(format_record(record))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Callbacks fired by what gets typed into the machine and what it prints.
+
+Input triggers are matched once per line, against the start of the line about to be
+read.  Output triggers are compiled into an Aho-Corasick automaton that is stepped
+once per printed character, so any number of patterns costs a dict lookup.
+"""
+from collections import deque
+from typing import Callable, Deque, Dict, List, Tuple
+
+InputCallback = Callable[[str], None]
+OutputCallback = Callable[[], None]
+
+
+class Triggers:
+    def __init__(self):
+        self.input_triggers: List[Tuple[str, InputCallback]] = list()
+        self.output_triggers: List[Tuple[str, OutputCallback]] = list()
+
+        # Output automaton: transitions[state][character] -> state (missing means 0)
+        # and the callbacks for every pattern ending in a state.
+        self.transitions: List[Dict[str, int]] = [dict()]
+        self.matches: List[Tuple[OutputCallback, ...]] = [tuple()]
+        self.state = 0
+
+    def on_input_line(self, prefix: str, callback: InputCallback):
+        """Call back with the line when the next line to be read starts with prefix.
+        End the prefix with a newline to match a whole line."""
+        self.input_triggers.append((prefix, callback))
+
+    def on_output(self, text: str, callback: OutputCallback):
+        """Call back whenever the machine finishes printing text."""
+        if not text:
+            raise ValueError("An output trigger needs some text to match")
+        self.output_triggers.append((text, callback))
+        self.compile()
+
+    def input_line(self, line: str):
+        for prefix, callback in self.input_triggers:
+            if line.startswith(prefix):
+                callback(line)
+
+    def output_character(self, character: str):
+        self.state = state = self.transitions[self.state].get(character, 0)
+        for callback in self.matches[state]:
+            callback()
+
+    def compile(self):
+        """Build the automaton -- a trie of the patterns with failure links folded
+        into a full transition table."""
+        goto: List[Dict[str, int]] = [dict()]
+        found: List[List[OutputCallback]] = [list()]
+        for text, callback in self.output_triggers:
+            state = 0
+            for character in text:
+                if character not in goto[state]:
+                    goto.append(dict())
+                    found.append(list())
+                    goto[state][character] = len(goto) - 1
+                state = goto[state][character]
+            found[state].append(callback)
+
+        alphabet = {character for text, _ in self.output_triggers for character in text}
+        transitions: List[Dict[str, int]] = [dict() for _ in goto]
+        failure = [0] * len(goto)
+
+        # Breadth first so a state's failure target is always finished before it
+        queue: Deque[int] = deque()
+        for character, child in goto[0].items():
+            transitions[0][character] = child
+            queue.append(child)
+
+        while queue:
+            state = queue.popleft()
+            found[state].extend(found[failure[state]])
+            for character in alphabet:
+                fallback = transitions[failure[state]].get(character, 0)
+                if character in goto[state]:
+                    child = goto[state][character]
+                    failure[child] = fallback
+                    transitions[state][character] = child
+                    queue.append(child)
+                elif fallback:
+                    transitions[state][character] = fallback
+
+        self.transitions = transitions
+        self.matches = [tuple(callbacks) for callbacks in found]
+        self.state = 0
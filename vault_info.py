@@ -36,6 +36,11 @@ class LocValue(NamedTuple):
 
 
 class Cave:
+    """A search state.  Two caves are equal when their futures are -- the same room,
+    orb weight and, standing on an operator, the room they can't step back into --
+    which is packed into one int so explored sets hold (and hash) ints' worth."""
+
+    __slots__ = ("state", "key")
 
     board = [["*", 8, "-", 1], [4, "*", 11, "*"], ["+", 4, "-", 18], [22, "-", 9, "*"]]
 
@@ -47,9 +52,36 @@ class Cave:
         DIRECTION.west: "west",
     }
     GOAL = 30
+    GOAL_POS = (0, 3)
+    START_POS = (3, 0)
+    START_VALUE = 22
+
+    # The orb evaporates outside of (MIN_VALUE, MAX_VALUE]
+    MIN_VALUE = -40
+    MAX_VALUE = 100
 
     def __init__(self, start: LocValue):
         self.state = start
+        self.key = self.pack(start)
+
+    @classmethod
+    def pack(cls, state: LocValue) -> int:
+        """value, pos and last_pos as one mixed radix int -- last_pos only counts
+        on an operator, the one place it limits the moves."""
+        size = len(cls.board)
+        cells = size * size
+        x, y = state.pos
+        last = cells
+        if isinstance(state.operator, str) and state.last_pos is not None:
+            last = state.last_pos[0] * size + state.last_pos[1]
+        cell = (state.value - cls.MIN_VALUE) * cells + x * size + y
+        return cell * (cells + 1) + last
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Cave) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return self.key
 
     def add_positions(self, pos01, pos02):
         x = pos01[0] + pos02[0]
@@ -69,8 +101,8 @@ class Cave:
         return True
 
     def successors(self) -> List[Cave]:
-        min_number = -40
-        max_number = 100
+        min_number = self.MIN_VALUE
+        max_number = self.MAX_VALUE
         collector = list()
         for direction in self.DIRECTION:
 
@@ -88,8 +120,8 @@ class Cave:
                     if self.state.operator == "*":
                         total_weight *= room_value
 
-                if (x, y) == (3, 0):
-                    total_weight = 22
+                if (x, y) == self.START_POS:
+                    total_weight = self.START_VALUE
 
                 if max_number >= total_weight > min_number:
                     collector.append(
@@ -107,10 +139,12 @@ class Cave:
         return collector
 
     def goal_test(self):
-        return self.state.value == self.GOAL and self.state.pos == (0, 3)
+        return self.state.value == self.GOAL and self.state.pos == self.GOAL_POS
 
 
 class Node(Generic[T]):
+    __slots__ = ("state", "parent", "cost", "heuristic")
+
     def __init__(
         self,
         state: T,
@@ -0,0 +1,337 @@
+"""
+Solves the vault lock from what the game shows, rather than from a board typed in.
+
+The rooms are mapped by walking them without the orb: the antechamber's pedestal
+gives the orb's starting weight, every other room's floor a number or an operator,
+and the door the weight it wants.  Walking onto an operator leaves it pending, the
+next number applies it -- so a state is (room, weight) with any pending operator
+implied by the room.  Stepping back into the antechamber resets the orb, the door
+takes it for good and a weight outside the window evaporates it.
+
+Moves become a transition table once, and a breadth first sweep over every state
+records each one's parent.  The sweep doesn't stop at the first weight to reach the
+door, so one pass answers a shortest route query for any target.  With numpy each
+layer is a handful of array operations per move, without it a dict is used instead.
+
+    python vault_solver.py          the route from the antechamber to the door
+"""
+import argparse
+import operator
+import re
+
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from confirmation import solve_calibration
+from explorer import EXITS, ExplorerMachine, listed, play
+from synacore_challenge import Snapshot, Status, create_route
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+Position = Tuple[int, int]
+Tile = Union[int, str, None]
+
+MOVES = {"north": (-1, 0), "south": (1, 0), "east": (0, 1), "west": (0, -1)}
+DIRECTIONS = tuple(MOVES)
+
+# Work on numbers and numpy arrays alike
+OPERATORS = {"+": operator.add, "-": operator.sub, "*": operator.mul}
+
+PEDESTAL = re.compile(r"the number '(\d+)' is carved into the orb's pedestal")
+DOOR = re.compile(r"it has a large '(\d+)' carved into it")
+MOSAIC = re.compile(r"mosaic depicting (?:the number '(\d+)'|a '(.)' symbol)")
+
+# What a move does to the orb
+_KEEP, _APPLY, _RESET = range(3)
+
+
+class Vault(NamedTuple):
+    # Rows north to south, None where there's no room
+    grid: Tuple[Tuple[Tile, ...], ...]
+    start: Position
+    door: Position
+    target: int
+
+
+class Transition(NamedTuple):
+    direction: int
+    destination: int
+    effect: int
+    number: int
+    operator: Optional[str]
+
+
+def map_vault(machine: ExplorerMachine, snapshot: Snapshot) -> Vault:
+    """Walk every room of the lock, starting from a snapshot in the antechamber
+    before the orb is taken."""
+    machine.restore(snapshot)
+    _, text = play(machine, "look\n")
+    pedestal = PEDESTAL.search(text)
+    if pedestal is None:
+        raise ValueError("The snapshot isn't in the vault antechamber")
+
+    tiles: Dict[Position, Tile] = {(0, 0): int(pedestal.group(1))}
+    routes: Dict[Position, List[str]] = {(0, 0): []}
+    texts = {(0, 0): text}
+    outside = set()
+    door: Optional[Position] = None
+    target = 0
+
+    pending = deque([(0, 0)])
+    while pending:
+        here = pending.popleft()
+        for direction in listed(EXITS, texts[here]):
+            if direction not in MOVES:
+                continue
+            row, column = MOVES[direction]
+            there = (here[0] + row, here[1] + column)
+            if there in tiles or there in outside:
+                continue
+
+            route = [*routes[here], direction]
+            machine.restore(snapshot)
+            play(machine, "".join(f"{command}\n" for command in route[:-1]))
+            status, text = play(machine, f"{route[-1]}\n")
+            mosaic = MOSAIC.search(text)
+            if status is not Status.NEEDS_INPUT or mosaic is None:
+                # Left the lock
+                outside.add(there)
+                continue
+
+            number, symbol = mosaic.groups()
+            tiles[there] = int(number) if number is not None else symbol
+            routes[there] = route
+            texts[there] = text
+            carved = DOOR.search(text)
+            if carved is not None:
+                door, target = there, int(carved.group(1))
+            pending.append(there)
+
+    if door is None:
+        raise ValueError("Never found the vault door")
+
+    top = min(row for row, _ in tiles)
+    left = min(column for _, column in tiles)
+    bottom = max(row for row, _ in tiles)
+    right = max(column for _, column in tiles)
+    grid = tuple(
+        tuple(tiles.get((row, column)) for column in range(left, right + 1))
+        for row in range(top, bottom + 1)
+    )
+    return Vault(grid, (-top, -left), (door[0] - top, door[1] - left), target)
+
+
+class VaultSolver:
+    def __init__(self, vault: Vault, min_value: int = 0, max_value: int = 32767):
+        """Weights are kept within [min_value, max_value] -- the machine's words by
+        default."""
+        self.vault = vault
+        self.min_value = min_value
+        self.max_value = max_value
+        self.span = max_value - min_value + 1
+
+        self.positions = [
+            (row, column)
+            for row, tiles in enumerate(vault.grid)
+            for column, tile in enumerate(tiles)
+            if tile is not None
+        ]
+        self.index = {position: index for index, position in enumerate(self.positions)}
+        self.table = self.transitions()
+        self.start_value = vault.grid[vault.start[0]][vault.start[1]]
+        self.start = self.state(vault.start, self.start_value)
+        self.door = self.index[vault.door]
+
+        self.parents: Union[Dict[int, int], "numpy.ndarray", None] = None
+        self.directions: Union[Dict[int, int], "numpy.ndarray", None] = None
+        # The door state for every weight it can be reached with
+        self.reached: Dict[int, int] = dict()
+
+    def state(self, position: Position, value: int) -> int:
+        return self.index[position] * self.span + value - self.min_value
+
+    def transitions(self) -> List[List[Transition]]:
+        """Every move out of each room, by room index."""
+        grid = self.vault.grid
+        table: List[List[Transition]] = list()
+        for row, column in self.positions:
+            tile = grid[row][column]
+            moves: List[Transition] = list()
+            for direction, name in enumerate(DIRECTIONS):
+                there = (row + MOVES[name][0], column + MOVES[name][1])
+                if there not in self.index:
+                    continue
+                number = grid[there[0]][there[1]]
+                if there == self.vault.start:
+                    effect = _RESET
+                elif isinstance(number, int) and isinstance(tile, str):
+                    effect = _APPLY
+                else:
+                    effect = _KEEP
+                moves.append(
+                    Transition(
+                        direction,
+                        self.index[there],
+                        effect,
+                        number if isinstance(number, int) else 0,
+                        tile if isinstance(tile, str) else None,
+                    )
+                )
+            table.append(moves)
+        return table
+
+    def solve(self, max_moves: Optional[int] = None) -> "VaultSolver":
+        """Sweep every state reachable within max_moves (or at all)."""
+        if numpy is None:
+            self._solve_sparse(max_moves)
+        else:
+            self._solve_dense(max_moves)
+        return self
+
+    def _solve_dense(self, max_moves: Optional[int]):
+        span = self.span
+        size = len(self.positions) * span
+        parents = numpy.full(size, -1, dtype=numpy.int64)
+        directions = numpy.zeros(size, dtype=numpy.int8)
+        seen = numpy.zeros(size, dtype=bool)
+        seen[self.start] = True
+
+        frontier = numpy.array([self.start], dtype=numpy.int64)
+        moves = 0
+        while frontier.size and (max_moves is None or moves < max_moves):
+            moves += 1
+            rooms = frontier // span
+            following = list()
+            for room, transitions in enumerate(self.table):
+                states = frontier[rooms == room]
+                if not states.size:
+                    continue
+                values = states % span + self.min_value
+                for move in transitions:
+                    if move.effect == _RESET:
+                        weights = numpy.full_like(values, self.start_value)
+                    elif move.effect == _APPLY:
+                        weights = OPERATORS[move.operator](values, move.number)
+                    else:
+                        weights = values
+                    kept = (weights >= self.min_value) & (weights <= self.max_value)
+                    targets = move.destination * span + weights[kept] - self.min_value
+                    sources = states[kept]
+                    fresh = ~seen[targets]
+                    # Several sources can land on one target -- any will do
+                    targets, first = numpy.unique(targets[fresh], return_index=True)
+                    seen[targets] = True
+                    parents[targets] = sources[fresh][first]
+                    directions[targets] = move.direction
+                    if move.destination != self.door:
+                        following.append(targets)
+            frontier = (
+                numpy.concatenate(following)
+                if following
+                else numpy.zeros(0, dtype=numpy.int64)
+            )
+
+        self.parents = parents
+        self.directions = directions
+        offset = self.door * span
+        self.reached = {
+            int(value) + self.min_value: offset + int(value)
+            for value in numpy.flatnonzero(seen[offset : offset + span])
+        }
+
+    def _solve_sparse(self, max_moves: Optional[int]):
+        span = self.span
+        parents: Dict[int, int] = {self.start: -1}
+        directions: Dict[int, int] = dict()
+
+        frontier = [self.start]
+        moves = 0
+        while frontier and (max_moves is None or moves < max_moves):
+            moves += 1
+            following: List[int] = list()
+            for state in frontier:
+                room, offset = divmod(state, span)
+                value = offset + self.min_value
+                for move in self.table[room]:
+                    if move.effect == _RESET:
+                        weight = self.start_value
+                    elif move.effect == _APPLY:
+                        weight = OPERATORS[move.operator](value, move.number)
+                    else:
+                        weight = value
+                    if not self.min_value <= weight <= self.max_value:
+                        continue
+                    target = move.destination * span + weight - self.min_value
+                    if target in parents:
+                        continue
+                    parents[target] = state
+                    directions[target] = move.direction
+                    if move.destination != self.door:
+                        following.append(target)
+            frontier = following
+
+        self.parents = parents
+        self.directions = directions
+        self.reached = {
+            state % span + self.min_value: state
+            for state in parents
+            if state // span == self.door
+        }
+
+    def route(self, target: Optional[int] = None) -> Optional[List[str]]:
+        """A shortest list of moves from the antechamber into the door room with the
+        orb weighing target (the door's own number by default)."""
+        if self.parents is None:
+            raise ValueError("solve() hasn't been run")
+        target = self.vault.target if target is None else target
+        state = self.reached.get(target)
+        if state is None:
+            return None
+
+        moves: List[str] = list()
+        while state != self.start:
+            moves.append(DIRECTIONS[int(self.directions[state])])
+            state = int(self.parents[state])
+        moves.reverse()
+        return moves
+
+
+def antechamber(file: str, route: str) -> Tuple[ExplorerMachine, Snapshot]:
+    """A machine played up to where the route takes the orb."""
+    lines = route.splitlines()
+    if "take orb" not in lines:
+        raise ValueError("The route never takes the orb")
+    machine = ExplorerMachine(file, [], solve_calibration())
+    play(machine, "".join(f"{line}\n" for line in lines[: lines.index("take orb")]))
+    return machine, machine.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve the vault lock")
+    parser.add_argument(
+        "--file", default="data/synacor-challenge/challenge.bin", help="binary to run"
+    )
+    parser.add_argument(
+        "--target", type=int, default=None, help="weight wanted at the door"
+    )
+    parser.add_argument("--max-moves", type=int, default=None)
+    args = parser.parse_args()
+
+    machine, snapshot = antechamber(args.file, create_route())
+    vault = map_vault(machine, snapshot)
+    for tiles in vault.grid:
+        print(" ".join(f"{tile if tile is not None else '':>3}" for tile in tiles))
+
+    moves = VaultSolver(vault).solve(args.max_moves).route(args.target)
+    if moves is None:
+        print("The door can't be reached with that weight")
+    else:
+        print("take orb")
+        print("\n".join(moves))
+
+
+if __name__ == "__main__":
+    main()
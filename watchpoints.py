@@ -0,0 +1,256 @@
+"""
+Watchpoints for the decoded engine -- stop (or just log) when memory in a range is
+read by rmem or written by wmem, when a register changes to a value, or when
+execution reaches an address.
+
+Nothing is checked per instruction.  Setting a watchpoint throws the decoded code
+away, and from then on decoding wraps only the instructions that can hit one: rmem
+and wmem look their address up in a bitmap, instructions writing a watched register
+compare what they wrote -- as do calls, since the confirmation routine is answered
+natively, and in/out, since the hacks they trigger set r7 -- and watched addresses
+get a check in front.  The confirmation routine itself never runs, so watching its
+address checks the calls made to it instead.  Everything else runs the usual
+handlers.  While any are set nothing is fused, compiled or run as an intrinsic, as
+those would skip the checks.
+
+A breaking watchpoint makes Machine.run/run_until return Status.BREAKPOINT: after
+the read, write or register change, or before the watched address runs -- running
+again carries on past it.  Every hit is recorded in hits.
+
+    python synacore_challenge.py --watch exec:6027 --watch write:3952-3960
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from op_codes import MEMORY_SIZE, OPERANDS
+
+# What happens on a hit
+LOG = 1
+BREAK = 2
+
+Handler = Callable[[Tuple], int]
+
+
+class Hit(NamedTuple):
+    # "read", "write", "register" or "execute"
+    kind: str
+    # Of the instruction that hit
+    address: int
+    # Memory address, register index or the address executed
+    target: int
+    value: int
+
+    def __str__(self) -> str:
+        if self.kind == "register":
+            return f"{self.address:05d} r{self.target} = {self.value}"
+        if self.kind == "execute" and self.target != self.address:
+            return (
+                f"{self.target:05d} answered natively, called from {self.address:05d}"
+            )
+        if self.kind == "execute":
+            return f"{self.address:05d} executed"
+        return f"{self.address:05d} {self.kind} {self.target:05d} = {self.value}"
+
+
+class WatchpointHit(Exception):
+    """Stops the engine on a breaking watchpoint -- resume is where to carry on."""
+
+    def __init__(self, hit: Hit, resume: int):
+        super().__init__(hit)
+        self.hit = hit
+        self.resume = resume
+
+
+class Watchpoints:
+    def __init__(self, machine):
+        self.machine = machine
+        # LOG or BREAK per address, 0 for none
+        self.reads = bytearray(MEMORY_SIZE)
+        self.writes = bytearray(MEMORY_SIZE)
+        # By register index, the action for each value -- None for any change
+        self.registers: Dict[int, Dict[Optional[int], int]] = dict()
+        self.executes: Dict[int, int] = dict()
+
+        self.hits: List[Hit] = list()
+        # Called with every hit, breaking or not
+        self.report: Optional[Callable[[Hit], None]] = None
+        # Where an execute break stopped, stepped past once when running again
+        self.skip: Optional[int] = None
+
+        self.active = False
+        self.watching_reads = False
+        self.watching_writes = False
+
+    def on_read(self, start: int, stop: Optional[int] = None, action: int = BREAK):
+        """Watch rmem from [start, stop) -- just start when there's no stop."""
+        stop = start + 1 if stop is None else stop
+        self.reads[start:stop] = bytes([action]) * (stop - start)
+        self.changed()
+
+    def on_write(self, start: int, stop: Optional[int] = None, action: int = BREAK):
+        stop = start + 1 if stop is None else stop
+        self.writes[start:stop] = bytes([action]) * (stop - start)
+        self.changed()
+
+    def on_register(
+        self, register: int, value: Optional[int] = None, action: int = BREAK
+    ):
+        """Watch register (an index, 0-7) changing to value, or to anything."""
+        self.registers.setdefault(register, dict())[value] = action
+        self.changed()
+
+    def on_execute(self, address: int, action: int = BREAK):
+        self.executes[address] = action
+        self.changed()
+
+    def clear(self):
+        self.reads[:] = bytes(MEMORY_SIZE)
+        self.writes[:] = bytes(MEMORY_SIZE)
+        self.registers.clear()
+        self.executes.clear()
+        self.changed()
+
+    def changed(self):
+        self.watching_reads = any(self.reads)
+        self.watching_writes = any(self.writes)
+        self.active = bool(
+            self.watching_reads
+            or self.watching_writes
+            or self.registers
+            or self.executes
+        )
+        # Decoded entries are rebuilt with (or without) the checks
+        self.machine.invalidate_code()
+
+    def hit(self, action: int, hit: Hit, resume: int):
+        self.hits.append(hit)
+        if self.report is not None:
+            self.report(hit)
+        if action == BREAK:
+            raise WatchpointHit(hit, resume)
+
+    def wrap(self, address: int, entry: Tuple) -> Tuple:
+        """The decoded entry at address, checked for any watchpoint it can hit."""
+        handler = entry[0]
+        op_code = self.machine.stream[address]
+        if op_code == 15 and self.watching_reads:
+            handler = self.watch_read(address, handler)
+        elif op_code == 16 and self.watching_writes:
+            handler = self.watch_write(address, handler)
+        if op_code in (17, 19, 20) and self.registers:
+            # Calls to the confirmation routine are answered natively, writing r0/r1,
+            # and the hacks triggered by in/out set r7 -- none of it in the operands
+            handler = self.watch_registers(address, handler, tuple(self.registers))
+        elif OPERANDS[op_code].startswith("r") and entry[2] in self.registers:
+            handler = self.watch_registers(address, handler, (entry[2],))
+        routine = self.machine.confirmation_routine
+        if address in self.executes or (op_code == 17 and routine in self.executes):
+            handler = self.watch_execute(address, handler, op_code == 17)
+
+        if handler is entry[0]:
+            return entry
+        return (handler, *entry[1:])
+
+    def watch_read(self, address: int, handler: Handler) -> Handler:
+        reads = self.reads
+        stream = self.machine.stream
+
+        def rmem(entry):
+            _, _, _, b_source, b = entry
+            target = b_source[b]
+            following = handler(entry)
+            if reads[target]:
+                hit = Hit("read", address, target, stream[target])
+                self.hit(reads[target], hit, following)
+            return following
+
+        return rmem
+
+    def watch_write(self, address: int, handler: Handler) -> Handler:
+        writes = self.writes
+
+        def wmem(entry):
+            _, _, a_source, a, b_source, b = entry
+            target = a_source[a]
+            value = b_source[b]
+            following = handler(entry)
+            if writes[target]:
+                hit = Hit("write", address, target, value)
+                self.hit(writes[target], hit, following)
+            return following
+
+        return wmem
+
+    def watch_registers(
+        self, address: int, handler: Handler, indexes: Tuple[int, ...]
+    ) -> Handler:
+        """Check the registers at indexes for a watched change around handler."""
+        registers = self.machine.register_file
+        watched = self.registers
+
+        def changes(entry):
+            before = [registers[register] for register in indexes]
+            following = handler(entry)
+            for register, value in zip(indexes, before):
+                after = registers[register]
+                if after == value:
+                    continue
+                values = watched.get(register, {})
+                action = max(values.get(after, 0), values.get(None, 0))
+                if action:
+                    hit = Hit("register", address, register, after)
+                    self.hit(action, hit, following)
+            return following
+
+        return changes
+
+    def watch_execute(self, address: int, handler: Handler, call: bool) -> Handler:
+        """Check address, and for a call the confirmation routine it may be making,
+        for an execute watch before handler runs."""
+        executes = self.executes
+        routine = self.machine.confirmation_routine
+
+        def execute(entry):
+            if self.skip == address:
+                # Just broke here -- this time carry on
+                self.skip = None
+                return handler(entry)
+
+            targets = [address]
+            if call and entry[2][entry[3]] == routine:
+                targets.append(routine)
+            found = [
+                (executes[target], Hit("execute", address, target, 0))
+                for target in targets
+                if executes.get(target)
+            ]
+            if found:
+                # Record every hit before breaking on any of them
+                for _, hit in found[:-1]:
+                    self.hit(LOG, hit, address)
+                self.hit(max(action for action, _ in found), found[-1][1], address)
+            return handler(entry)
+
+        return execute
+
+
+def add_watch(watchpoints: Watchpoints, spec: str, action: int = LOG):
+    """Set a watchpoint written as read:START[-STOP], write:START[-STOP],
+    reg:R[=VALUE] or exec:ADDRESS -- STOP is exclusive."""
+    kind, _, where = spec.partition(":")
+    try:
+        if kind in ("read", "write"):
+            start, _, stop = where.partition("-")
+            method = watchpoints.on_read if kind == "read" else watchpoints.on_write
+            method(int(start), int(stop) if stop else None, action)
+        elif kind == "reg":
+            register, _, value = where.partition("=")
+            watchpoints.on_register(
+                int(register), int(value) if value else None, action
+            )
+        elif kind == "exec":
+            watchpoints.on_execute(int(where), action)
+        else:
+            raise ValueError(f"Unknown kind of watchpoint '{kind}'")
+    except ValueError as error:
+        raise ValueError(f"Bad watchpoint '{spec}': {error}") from None